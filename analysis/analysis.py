@@ -1,11 +1,37 @@
+import os
+import sys
+
 import pandas as pd
 import matplotlib.pyplot as plt
 
-# Đọc file kết quả
-df = pd.read_csv('results/exp_results.csv')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.results_store import ResultsStore
+
+METRICS = ['mse_mean', 'cos_mean', 'update_time', 'mem_norm_change']
+
+# Nguồn kết quả: đối số dòng lệnh, mặc định store SQLite của exp_runner (nếu có) rồi tới CSV cũ
+if len(sys.argv) > 1:
+    path = sys.argv[1]
+elif os.path.exists('results/exp_results.sqlite'):
+    path = 'results/exp_results.sqlite'
+else:
+    path = 'results/exp_results.csv'
+
+# Chỉ đọc các cột cần dùng; với store, phép gom nhóm chạy ngay trong SQLite
+if path.endswith('.csv'):
+    df = pd.read_csv(path, usecols=['updater'] + METRICS)
+    grouped = df.groupby('updater')[METRICS].mean().reset_index()
+else:
+    store = ResultsStore(path, key_fields=())
+    grouped = store.query_df(group_by=['updater'], agg={m: 'avg' for m in METRICS}, order_by=['updater'])
+    grouped = grouped.rename(columns={f'{m}_avg': m for m in METRICS})
+    df = store.query_df(columns=['updater'] + METRICS)
+    store.close()
 
 # Thống kê trung bình của mỗi chỉ số theo updater
-grouped = df.groupby('updater').mean().reset_index()
 print(grouped[['updater', 'mse_mean', 'cos_mean', 'update_time', 'mem_norm_change']])
 
 # Vẽ boxplot so sánh MSE giữa hai updater
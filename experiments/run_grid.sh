@@ -1,59 +1,46 @@
 """
-Simple bash script to run a grid of experiments and collect results into CSV files (results/).
+Simple bash script to run a grid of experiments and collect results into the results store (results/).
 Usage: bash experiments/run_grid.sh
 """
 
 mkdir -p results
-python3 - << 'PY'
-import subprocess, itertools, json, os
+SOCK=results/worker.sock
 
-mem_sizes = [32, 64]
-dims = [64]
-windows = [20, 50]
-steps_list = [4, 8]
-lrs = [0.01, 0.005]
-regs = [1e-3]
-updaters = ['omega', 'delta']
-seeds = [0,1,2]
+# Dùng pool worker lâu dài (src/worker_pool.py): torch chỉ được import một lần mỗi worker, mọi config
+# của grid (và của các lần chạy script sau, nếu pool còn sống) dùng lại cùng các process đó.
+STARTED=0
+if ! python3 -m src.worker_pool ping --socket $SOCK; then
+    python3 -m src.worker_pool serve --socket $SOCK > results/worker_pool.log 2>&1 &
+    POOL_PID=$!
+    STARTED=1
+    until python3 -m src.worker_pool ping --socket $SOCK; do
+        kill -0 $POOL_PID 2>/dev/null || { echo "worker pool failed to start" >&2; exit 1; }
+        sleep 0.2
+    done
+fi
 
-os.makedirs('results', exist_ok=True)
-rows = []
-for mem_size, dim, window, steps, lr, reg, updater in itertools.product(mem_sizes, dims, windows, steps_list, lrs, regs, updaters):
-    for seed in seeds:
-        cmd = [
-            'python3', 'src/train.py',
-            '--mem_size', str(mem_size),
-            '--dim', str(dim),
-            '--window', str(window),
-            '--steps', str(steps),
-            '--lr', str(lr),
-            '--reg', str(reg),
-            '--updater', updater,
-            '--seed', str(seed)
-        ]
-        print('Running:', ' '.join(cmd))
-        proc = subprocess.run(cmd, capture_output=True, text=True)
-        out = proc.stdout + proc.stderr
-        # try to parse printed Metrics: line
-        metrics = {}
-        for line in out.splitlines():
-            if line.strip().startswith('Metrics:'):
-                try:
-                    metrics_text = line.split('Metrics:')[1].strip()
-                    # eval as python dict
-                    metrics = eval(metrics_text)
-                except Exception as e:
-                    print('Could not parse metrics:', e)
-        row = dict(mem_size=mem_size, dim=dim, window=window, steps=steps, lr=lr, reg=reg, updater=updater, seed=seed)
-        row.update(metrics)
-        rows.append(row)
-        # save incremental
-        import csv
-        keys = rows[0].keys()
-        with open('results/grid_results.csv', 'w', newline='') as f:
-            dict_writer = csv.DictWriter(f, keys)
-            dict_writer.writeheader()
-            dict_writer.writerows(rows)
-PY
+# Mỗi config là một dòng JSON; kết quả được append vào store SQLite, các config đã có được bỏ qua.
+for mem in 32 64; do
+ for dim in 64; do
+  for window in 20 50; do
+   for steps in 4 8; do
+    for lr in 0.01 0.005; do
+     for reg in 1e-3; do
+      for updater in Omega Delta; do
+       for seed in 0 1 2; do
+        echo "{\"mem_size\": $mem, \"dim\": $dim, \"window\": $window, \"steps\": $steps, \"lr\": $lr, \"reg\": $reg, \"seed\": $seed, \"updater\": \"$updater\"}"
+       done
+      done
+     done
+    done
+   done
+  done
+ done
+done | python3 -m src.worker_pool run --socket $SOCK --out results/grid_results.sqlite > /dev/null
 
-echo "Grid run complete. Results saved to results/grid_results.csv"
\ No newline at end of file
+# KEEP_POOL=1 giữ pool cho các script chạy sau
+if [ "$STARTED" = 1 ] && [ -z "$KEEP_POOL" ]; then
+    python3 -m src.worker_pool stop --socket $SOCK
+fi
+
+echo "Grid run complete. Results saved to results/grid_results.sqlite"
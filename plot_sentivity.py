@@ -4,7 +4,8 @@ import matplotlib.pyplot as plt
 from statistics import mean
 from collections import defaultdict
 # import train_model đúng chỗ (tùy file của bạn)
-from src.train import train_model
+from src.train import train_model, train_model_batched, train_model_multiwindow
+from src.scheduler import DecisionLog, rung_budgets, successive_halving
 
 # -------------------
 # CONFIG (tùy chỉnh)
@@ -18,6 +19,18 @@ NS = [50, 100, 200, 500, 1000, 2000, 5000]  # dải n để test
 BASE_WINDOW = 10
 BASE_LR = 0.01
 BASE_REG = 1e-3
+# chạy tất cả seed của một cấu hình cùng lúc bằng train_model_batched (metrics giống train_model tới làm tròn fp32)
+BATCHED = True
+# generate_data prefix-stable: một lần chạy tới max(NS) cho metrics của mọi n (qua checkpoints)
+DATA_VERSION = 3
+# window dùng để sinh dữ liệu cho mọi run; cố định thì sweep window của Omega chạy mọi window
+# trong một lần duyệt (train_model_multiwindow), nhưng plot khi đó chỉ còn là ảnh hưởng của window
+# lên Omega (Delta bỏ qua window nên bị bỏ khỏi sweep này). None: mỗi window sinh dữ liệu riêng như cũ.
+DATA_WINDOW = None
+# successive halving trên các giá trị được vary: chạy tới n nhỏ với ít seed trước, chỉ ~1/ETA giá trị
+# tốt nhất được chạy tiếp tới n lớn hơn với thêm seed; quyết định ghi vào OUTDIR/decisions_vary_<param>.jsonl
+ADAPTIVE = False
+ETA = 3
 
 OUTDIR = "results/plots"
 os.makedirs(OUTDIR, exist_ok=True)
@@ -25,40 +38,125 @@ os.makedirs(OUTDIR, exist_ok=True)
 # -------------------
 # helper chạy experiment
 # -------------------
-def run_once(n, updater, window, lr, reg, seed):
+def run_once(ns, updater, window, lr, reg, seed, stop_nonfinite=False):
     """
-    Gọi train_model theo API: train_model(mem_size, dim, window, steps, lr, reg, seed, updater_type)
-    Trả về mse_mean, cos_mean
+    Gọi train_model một lần tới max(ns), lấy metrics tại mỗi n qua checkpoints.
+    stop_nonfinite: dừng sớm khi run phân kỳ (các n sau điểm dừng nhận nan).
+    Trả về {n: (mse_mean, cos_mean)}
     """
     # if your train_model signature is different, adapt here
-    mse_mean, cos_mean, update_time, mem_norm = train_model(mem_size=MEM_SIZE,
-                                                           dim=DIM,
-                                                           window=window,
-                                                           steps=n,   # treat steps = n
-                                                           lr=lr,
-                                                           reg=reg,
-                                                           seed=seed,
-                                                           updater_type=updater)
-    return mse_mean, cos_mean
+    out = train_model(mem_size=MEM_SIZE,
+                      dim=DIM,
+                      window=window,
+                      steps=max(ns),   # treat steps = n
+                      lr=lr,
+                      reg=reg,
+                      seed=seed,
+                      updater_type=updater,
+                      checkpoints=ns,
+                      data_version=DATA_VERSION,
+                      data_window=DATA_WINDOW,
+                      stop_nonfinite=stop_nonfinite)
+    return {n: (m[0], m[1]) for n, m in zip(sorted(ns), out)}
+
+def run_seeds(ns, updater, window, lr, reg, seeds):
+    """
+    Chạy mọi seed của một cấu hình trong một lần train_model_batched tới max(ns).
+    Trả về {n: list (mse_mean, cos_mean) theo thứ tự seeds}
+    """
+    out = train_model_batched(mem_size=MEM_SIZE, dim=DIM, window=window, steps=max(ns),
+                              lrs=[lr] * len(seeds), regs=[reg] * len(seeds), seeds=list(seeds),
+                              updater_type=updater, checkpoints=ns, data_version=DATA_VERSION,
+                              data_window=DATA_WINDOW)
+    return {n: [(m[0], m[1]) for m in per_cp] for n, per_cp in zip(sorted(ns), out)}
+
+def run_windows(ns, windows, reg, seeds):
+    """
+    Omega cho mọi window trong một lần duyệt dữ liệu mỗi seed (cần DATA_WINDOW cố định).
+    Trả về {window: {n: list (mse_mean, cos_mean) theo thứ tự seeds}}
+    """
+    per_seed = [train_model_multiwindow(mem_size=MEM_SIZE, dim=DIM, windows=windows, steps=max(ns), reg=reg,
+                                        seed=seed, data_window=DATA_WINDOW, checkpoints=ns,
+                                        data_version=DATA_VERSION) for seed in seeds]
+    return {w: {n: [(r[w][k][0], r[w][k][1]) for r in per_seed] for k, n in enumerate(sorted(ns))}
+            for w in windows}
+
+def run_adaptive(updater, vary_name, vary_values, ns, seeds, fixed_params, log):
+    """
+    Successive halving trên vary_values (src.scheduler): các rung là những n trong ns cách nhau
+    khoảng ETA lần; mỗi rung chạy các giá trị còn lại tới n đó (checkpoints) với một phần seeds,
+    điểm là mse trung bình theo seed tại n đó, và chỉ ~1/ETA giá trị tốt nhất lên rung sau.
+    Mọi run dùng run_once(stop_nonfinite=True), không qua BATCHED, để run phân kỳ dừng sớm.
+    Trả về {v: {n: list (mse_mean, cos_mean) theo thứ tự seeds}} của rung cao nhất v đạt tới
+    (giá trị bị loại sớm chỉ có các n nhỏ và ít seed hơn).
+    """
+    ns = sorted(ns)
+    budgets = sorted({max(n for n in ns if n <= b) for b in rung_budgets(ns[0], ns[-1], ETA)})
+    curves = {}
+
+    def evaluate(arms, budget, rung_seeds):
+        scores = []
+        for arm in arms:
+            params = fixed_params.copy()
+            params[vary_name] = arm[vary_name]
+            rung_ns = [n for n in ns if n <= budget]
+            # luôn từng seed qua run_once kể cả khi BATCHED: train_model_batched không dừng sớm
+            # run phân kỳ, còn ở đây giá trị phân kỳ phải bị loại mà không tốn hết budget
+            per_seed = [run_once(ns=rung_ns, updater=updater, window=params["window"], lr=params["lr"],
+                                 reg=params["reg"], seed=seed, stop_nonfinite=True) for seed in rung_seeds]
+            per_n = {n: [r[n] for r in per_seed] for n in rung_ns}
+            curves[arm[vary_name]] = per_n
+            scores.append([mse for mse, _ in per_n[budget]])
+        return scores
+
+    arms = [{"updater": updater, vary_name: v} for v in vary_values]
+    successive_halving(arms, evaluate, budgets, list(seeds), ETA, log)
+    return curves
 
 def collect_for_param(vary_name, vary_values, ns=NS, seeds=SEEDS, updaters=("Omega","Delta"),
-                      fixed_params=None):
+                      fixed_params=None, adaptive=ADAPTIVE):
     """
     vary_name: 'window' or 'lr' or 'reg'
     vary_values: list of values to test for that param
     fixed_params: dict with keys 'window','lr','reg' giving baseline values
+    adaptive: chọn vary_values bằng successive halving (run_adaptive) thay vì chạy mọi n và mọi seed
+        cho mọi giá trị; các giá trị bị loại có ít điểm hơn trên plot. Sweep window của Omega qua
+        run_windows đã là một lần duyệt cho mọi window nên không đổi.
+    Với DATA_WINDOW cố định, sweep window bỏ Delta: Delta chỉ thấy window qua dữ liệu, nên mọi
+    window cho cùng một đường.
     Returns nested dict: results[updater][vary_val][n] = list of mse across seeds
     """
     if fixed_params is None:
         fixed_params = {"window": BASE_WINDOW, "lr": BASE_LR, "reg": BASE_REG}
+    if vary_name == "window" and DATA_WINDOW is not None and "Delta" in updaters:
+        print(f"DATA_WINDOW={DATA_WINDOW}: Delta không phụ thuộc window, bỏ Delta khỏi sweep window")
+        updaters = tuple(u for u in updaters if u != "Delta")
     results = {u: {v: {n: [] for n in ns} for v in vary_values} for u in updaters}
+    shared = None
+    if vary_name == "window" and "Omega" in updaters and DATA_WINDOW is not None:
+        shared = run_windows(ns=ns, windows=vary_values, reg=fixed_params["reg"], seeds=seeds)
+    curves = {}
+    if adaptive:
+        log = DecisionLog(os.path.join(OUTDIR, f"decisions_vary_{vary_name}.jsonl"))
+        curves = {u: run_adaptive(u, vary_name, vary_values, ns, seeds, fixed_params, log)
+                  for u in updaters if not (shared is not None and u == "Omega")}
     for v in vary_values:
-        for n in ns:
-            for seed in seeds:
-                params = fixed_params.copy()
-                params[vary_name] = v
-                for updater in updaters:
-                    mse, cos = run_once(n=n, updater=updater, window=params["window"], lr=params["lr"], reg=params["reg"], seed=seed)
+        params = fixed_params.copy()
+        params[vary_name] = v
+        for updater in updaters:
+            if shared is not None and updater == "Omega":
+                per_n = shared[v]
+            elif updater in curves:
+                per_n = curves[updater][v]
+            elif BATCHED:
+                per_n = run_seeds(ns=ns, updater=updater, window=params["window"], lr=params["lr"],
+                                  reg=params["reg"], seeds=seeds)
+            else:
+                per_seed = [run_once(ns=ns, updater=updater, window=params["window"], lr=params["lr"],
+                                     reg=params["reg"], seed=seed) for seed in seeds]
+                per_n = {n: [r[n] for r in per_seed] for n in ns}
+            for n in ns:
+                for seed, (mse, cos) in zip(seeds, per_n.get(n, [])):
                     results[updater][v][n].append({"mse": mse, "cos": cos})
                     print(f"done updater={updater} {vary_name}={v} n={n} seed={seed} mse={mse:.4e} cos={cos:.4f}")
     return results
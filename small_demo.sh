@@ -92,7 +92,7 @@ head -n 8 results/exp_results.csv || true
 # 6) Run analysis (plot)
 echo "Running analysis script to produce plots..."
 if [ -f "analysis/analysis.py" ]; then
-  python analysis/analysis.py
+  python analysis/analysis.py results/exp_results.csv
   echo "Analysis finished. Check generated plots (mse_comparison.png etc.)"
   ls -l analysis/*.png || true
 else
@@ -0,0 +1,198 @@
+"""
+Micro/macro benchmarks for the updaters, data generation and evaluation.
+
+Run from the project root:
+    python -m src.bench --out results/bench.json
+    python -m src.bench --out results/bench_new.json --baseline results/bench.json
+
+Each case is warmed up, then timed `repeat` times with perf_counter_ns; the JSON keeps
+median / quartiles / IQR per case, and the peak RSS of the whole run in "meta" (ru_maxrss only
+grows, so it says nothing about a single case). With --baseline, cases whose
+median got slower than baseline * (1 + threshold) are reported and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from itertools import product
+
+import torch
+
+from src.data import generate_data
+from src.eval import eval_kv_reconstruction
+from src.updaters import DeltaUpdater, OmegaUpdater
+from src.models.delta_updater import DeltaUpdater as ModelDeltaUpdater
+from src.models.omega_updater import OmegaUpdater as ModelOmegaUpdater
+
+FULL_GRID = dict(mem_sizes=[20, 64], dims=[10, 64], windows=[5, 20, 50], regs=[0.0, 1e-3])
+QUICK_GRID = dict(mem_sizes=[20], dims=[10], windows=[5], regs=[0.0, 1e-3])
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB (ru_maxrss is bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _quantile(sorted_xs, q):
+    pos = (len(sorted_xs) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_xs) - 1)
+    return sorted_xs[lo] + (sorted_xs[hi] - sorted_xs[lo]) * (pos - lo)
+
+
+def summarize(samples):
+    xs = sorted(samples)
+    q1, med, q3 = _quantile(xs, 0.25), _quantile(xs, 0.5), _quantile(xs, 0.75)
+    return {"median": med, "q1": q1, "q3": q3, "iqr": q3 - q1, "min": xs[0], "max": xs[-1], "n": len(xs)}
+
+
+def measure(fn, warmup=5, repeat=50):
+    """Call fn() `warmup` times untimed, then `repeat` timed times; returns seconds per call."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - start) * 1e-9)
+    return samples
+
+
+def _record(results, name, params, samples, unit="s", **extra):
+    entry = {"name": name, "params": params, "unit": unit}
+    entry.update(summarize(samples))
+    entry.update(extra)
+    results.append(entry)
+    print(f"{name:28s} {json.dumps(params, sort_keys=True):70s} median={entry['median']:.3e}{unit} "
+          f"iqr={entry['iqr']:.1e}")
+
+
+def bench_updaters(results, grid, warmup, repeat):
+    """Per-update latency of src.updaters and src.models updaters."""
+    for mem_size, dim, window, reg in product(grid["mem_sizes"], grid["dims"], grid["windows"], grid["regs"]):
+        g = torch.Generator().manual_seed(0)
+        xs = torch.randn(warmup + repeat, dim, generator=g)
+        ys = torch.randn(warmup + repeat, mem_size, generator=g)
+        memory = torch.zeros(mem_size, dim)
+        params = dict(mem_size=mem_size, dim=dim, window=window, reg=reg)
+        variants = [("updaters.Delta", DeltaUpdater(lr=0.01, reg=reg)),
+                    ("updaters.Delta.inplace", DeltaUpdater(lr=0.01, reg=reg, inplace=True)),
+                    ("updaters.Omega", OmegaUpdater(window=window, reg=reg))]
+        if reg > 0:
+            variants.append(("updaters.Omega.incremental", OmegaUpdater(window=window, reg=reg, incremental=True)))
+        for name, updater in variants:
+            # Omega có trạng thái: đổ đầy cửa sổ trước để đo ở trạng thái ổn định
+            for i in range(window):
+                updater.update(memory, xs[i % len(xs)], ys[i % len(ys)])
+            it = iter(range(10 ** 9))
+
+            def step():
+                i = next(it) % len(xs)
+                updater.update(memory, xs[i], ys[i])
+            _record(results, name, params, measure(step, warmup, repeat))
+
+        # src.models: memory (dim x dim), mỗi lần update nhận cả cửa sổ kv_pairs
+        keys = torch.randn(window, dim, generator=g)
+        vals = torch.randn(window, dim, generator=g)
+        kv_pairs = [(keys[i], vals[i]) for i in range(window)]
+        model_params = dict(dim=dim, window=window)
+        if mem_size == grid["mem_sizes"][0] and reg == grid["regs"][0]:
+            for name, updater in [("models.Delta", ModelDeltaUpdater(mem_size, dim, lr=0.01)),
+                                  ("models.Delta.inplace", ModelDeltaUpdater(mem_size, dim, lr=0.01, inplace=True)),
+                                  ("models.Omega", ModelOmegaUpdater(mem_size, dim))]:
+                _record(results, name, model_params, measure(lambda: updater.update(kv_pairs), warmup, repeat))
+
+
+def bench_data(results, steps, dim, mem_size, window, warmup, repeat):
+    """generate_data throughput per dependency mode and generator version."""
+    for dependency, version in product(["ar", "mix", "patterns"], [1, 2]):
+        params = dict(dependency=dependency, version=version, steps=steps, dim=dim, mem_size=mem_size, window=window)
+        samples = measure(lambda: generate_data(dim=dim, steps=steps, mem_size=mem_size, dependency=dependency,
+                                                window=window, seed=0, version=version),
+                          warmup=max(1, warmup // 5), repeat=max(3, repeat // 10))
+        med = summarize(samples)["median"]
+        _record(results, "generate_data", params, samples, steps_per_s=steps / med)
+
+
+def bench_eval(results, mem_sizes, dim, n_pairs, warmup, repeat):
+    """Latency of eval_kv_reconstruction over n_pairs probes."""
+    for mem_size in mem_sizes:
+        g = torch.Generator().manual_seed(0)
+        memory = torch.randn(mem_size, dim, generator=g)
+        kv_pairs = [(torch.randn(dim, generator=g), torch.randn(dim, generator=g)) for _ in range(n_pairs)]
+        params = dict(mem_size=mem_size, dim=dim, n_pairs=n_pairs)
+        _record(results, "eval_kv_reconstruction", params,
+                measure(lambda: eval_kv_reconstruction(memory, kv_pairs), max(1, warmup // 5), max(3, repeat // 10)))
+
+
+def _case_key(entry):
+    return entry["name"], json.dumps(entry["params"], sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    """Return the cases whose median regressed by more than `threshold` (relative) vs baseline."""
+    base = {_case_key(e): e for e in baseline["results"]}
+    regressions = []
+    for entry in results:
+        ref = base.get(_case_key(entry))
+        if ref is None or ref["median"] <= 0:
+            continue
+        ratio = entry["median"] / ref["median"]
+        if ratio > 1.0 + threshold:
+            regressions.append({"name": entry["name"], "params": entry["params"],
+                                "baseline": ref["median"], "current": entry["median"], "ratio": ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark updaters, data generation and evaluation")
+    parser.add_argument("--out", default=os.path.join("results", "bench.json"))
+    parser.add_argument("--baseline", default=None, help="earlier bench JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown of the median")
+    parser.add_argument("--only", nargs="+", choices=["updaters", "data", "eval"], default=["updaters", "data", "eval"])
+    parser.add_argument("--quick", action="store_true", help="small grid for smoke runs")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    args = parser.parse_args(argv)
+
+    torch.set_num_threads(args.threads)
+    grid = QUICK_GRID if args.quick else FULL_GRID
+    results = []
+    if "updaters" in args.only:
+        bench_updaters(results, grid, args.warmup, args.repeat)
+    if "data" in args.only:
+        bench_data(results, steps=1000 if args.quick else 5000, dim=64, mem_size=64, window=10,
+                   warmup=args.warmup, repeat=args.repeat)
+    if "eval" in args.only:
+        bench_eval(results, mem_sizes=[64] if args.quick else [64, 1024], dim=64, n_pairs=200,
+                   warmup=args.warmup, repeat=args.repeat)
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "torch": torch.__version__, "platform": platform.platform(), "threads": args.threads,
+                 "peak_rss_kb": peak_rss_kb()},
+        "results": results,
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(results, baseline, args.threshold)
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['name']} {json.dumps(r['params'], sort_keys=True)}: "
+                  f"{r['baseline']:.3e}s -> {r['current']:.3e}s (x{r['ratio']:.2f})")
+        status = 1 if report["regressions"] else 0
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Saved", args.out)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -24,8 +24,68 @@ def generate_synthetic_data(mem_size, dim, steps, seed=None):
     return keys, values
 
 # src/data.py
+import queue
+import threading
+
 import numpy as np
 import torch
+from numpy.lib.stride_tricks import sliding_window_view
+
+# số bước sinh mỗi lần trong stream_data; là một phần định nghĩa của stream (đổi giá trị = đổi dữ liệu)
+STREAM_BLOCK = 4096
+
+def _ar_scan(k0, noise, alpha, block=4096):
+    """
+    k_t = alpha * k_{t-1} + noise_{t-1} cho cả chuỗi, không lặp theo từng bước:
+    trong mỗi block dùng scan nhân đôi (log2(block) phép cộng dịch chuyển, tính ở float64),
+    giữa các block chỉ mang theo k cuối cùng.
+    """
+    steps = noise.shape[0] + 1
+    keys = np.empty((steps, k0.shape[0]), dtype=np.float32)
+    keys[0] = k0
+    prev = k0.astype(np.float64)
+    for start in range(0, steps - 1, block):
+        k = noise[start:start + block].astype(np.float64)
+        shift, coef = 1, alpha
+        while shift < k.shape[0] and coef != 0.0:
+            k[shift:] = k[shift:] + coef * k[:-shift]
+            shift, coef = shift * 2, coef * coef
+        k += (alpha ** np.arange(1, k.shape[0] + 1))[:, None] * prev
+        keys[1 + start:1 + start + k.shape[0]] = k
+        prev = k[-1]
+    return keys
+
+def _mix_keys(z, w, noise, noise_scale):
+    """keys[t] = sum_i w[i] * z[t + W - 1 - i] + noise_scale * noise[t], cộng dồn theo đúng thứ tự i."""
+    steps, max_window = noise.shape[0], w.shape[0]
+    mix = np.zeros((steps, z.shape[1]), dtype=np.float32)
+    for i in range(max_window):
+        mix += w[i] * z[max_window - 1 - i:max_window - 1 - i + steps]
+    return (mix + noise_scale * noise).astype(np.float32)
+
+def _pattern_index(current, switch_pre, new_pre, switch_post, new_post):
+    """
+    Chỉ số pattern được phát ở mỗi bước, tính bằng forward-fill thay vì vòng lặp:
+    slot 0 là giá trị ban đầu, slot 2t+1 là lần đổi trước khi phát bước t, slot 2t+2 là lần đổi sau đó.
+    """
+    steps = switch_pre.shape[0]
+    vals = np.empty(2 * steps + 1, dtype=np.int64)
+    vals[0] = current
+    vals[1::2] = new_pre
+    vals[2::2] = new_post
+    has = np.ones(2 * steps + 1, dtype=bool)
+    has[1::2] = switch_pre
+    has[2::2] = switch_post
+    last = np.where(has, np.arange(2 * steps + 1), 0)
+    np.maximum.accumulate(last, out=last)
+    return vals[last[1::2]]
+
+def _numpy_dtype(dtype):
+    if dtype == torch.float32:
+        return np.float32
+    if dtype == torch.float64:
+        return np.float64
+    raise ValueError(f"backend 'numpy' chỉ hỗ trợ float32/float64, không hỗ trợ {dtype}")
 
 def generate_data(dim: int,
                   steps: int,
@@ -35,14 +95,17 @@ def generate_data(dim: int,
                   alpha: float = 0.9,
                   n_patterns: int = 10,
                   noise_scale: float = 0.01,
-                  seed: int = 0):
+                  seed: int = 0,
+                  version: int = 1,
+                  dtype: torch.dtype = torch.float32,
+                  backend: str = "torch"):
     """
     Generate synthetic key-value sequences where keys are D-dimensional vectors
     with temporal dependencies and values are mem_size-dimensional targets.
 
     Returns:
-       keys: torch.Tensor shape (steps, dim), dtype=torch.float32
-       values: torch.Tensor shape (steps, mem_size), dtype=torch.float32
+       keys: torch.Tensor shape (steps, dim), dtype=dtype
+       values: torch.Tensor shape (steps, mem_size), dtype=dtype
 
     Parameters:
        dependency:
@@ -52,20 +115,55 @@ def generate_data(dim: int,
        window:
          - window length used both to generate keys (for "mix") and to build values
            (values will depend on the last `window` keys by default).
+       version:
+         - 1: stream gốc, bit-identical với các lần chạy trước cho cùng seed. Nhiễu được rút
+           một lần cho cả chuỗi và "mix" được vector hoá (không đổi thứ tự RNG/phép cộng),
+           còn đệ quy "ar", vòng lặp "patterns" và tích value từng hàng giữ nguyên để không đổi kết quả.
+         - 2: vector hoá hoàn toàn: "ar" bằng scan (float64), "patterns" rút các biến ngẫu nhiên
+           theo khối rồi forward-fill, values bằng một GEMM cho mỗi vị trí trong window.
+           "ar"/"mix" dùng đúng các số ngẫu nhiên của version 1 (chỉ khác sai số làm tròn),
+           "patterns" là một stream ngẫu nhiên mới.
+         - 3: prefix-stable: bằng stream_data ghép lại, nên generate_data(steps=n) đúng bằng
+           n bước đầu của generate_data(steps=N) với mọi n <= N (W_big và các tham số được rút
+           trước mọi bước). Một lần chạy dài có thể phục vụ mọi n (xem checkpoints của train_model).
+       dtype:
+         - dtype của tensor trả về (storage dtype của src.precision). Dữ liệu luôn được sinh ở
+           float32 rồi mới ép kiểu, nên cùng seed cho cùng giá trị (đã làm tròn) ở mọi dtype.
+       backend:
+         - "torch": trả về torch.Tensor (mặc định); "numpy": trả về đúng các giá trị đó dưới dạng
+           np.ndarray (dtype float32/float64 tương ứng), không qua torch (src.numpy_backend).
     """
+    if version not in (1, 2, 3):
+        raise ValueError("Unknown version: choose 1, 2 or 3")
+    if backend not in ("torch", "numpy"):
+        raise ValueError("Unknown backend: choose 'torch' or 'numpy'")
+    if version == 3:
+        chunks = list(stream_data(dim, mem_size, dependency=dependency, window=window, alpha=alpha,
+                                  n_patterns=n_patterns, noise_scale=noise_scale, seed=seed,
+                                  chunk_size=max(1, steps), steps=steps, dtype=dtype))
+        # chunk_size = steps: đúng một chunk (hoặc không có gì khi steps = 0)
+        if not chunks:
+            keys_t, values_t = torch.empty(0, dim, dtype=dtype), torch.empty(0, mem_size, dtype=dtype)
+        else:
+            keys_t, values_t = chunks[0]
+        return (keys_t.numpy(), values_t.numpy()) if backend == "numpy" else (keys_t, values_t)
     rng = np.random.RandomState(seed)
     dim_value = mem_size
     max_window = max(1, window)
 
     # ---- Generate keys (shape: steps x dim) ----
     if dependency == "ar":
-        keys = np.zeros((steps, dim), dtype=np.float32)
-        keys[0] = rng.normal(scale=1.0, size=(dim,))
+        k0 = rng.normal(scale=1.0, size=(dim,))
         # keep variance stable: scale noise by sqrt(1-alpha^2)
         noise_scale_ar = np.sqrt(max(0.0, 1.0 - alpha ** 2))
-        for t in range(1, steps):
-            noise = rng.normal(scale=noise_scale_ar, size=(dim,))
-            keys[t] = alpha * keys[t-1] + noise
+        noise = rng.normal(scale=noise_scale_ar, size=(steps - 1, dim))
+        if version == 1:
+            keys = np.zeros((steps, dim), dtype=np.float32)
+            keys[0] = k0
+            for t in range(1, steps):
+                keys[t] = alpha * keys[t-1] + noise[t-1]
+        else:
+            keys = _ar_scan(k0, noise, alpha)
 
     elif dependency == "mix":
         # create base noise stream z_t (we'll index z[t] as current, z[t-1] as previous)
@@ -73,27 +171,30 @@ def generate_data(dim: int,
         # weights decaying for the past window (w[0] corresponds to most recent z[t])
         w = np.array([np.exp(-i / (max_window / 2.0)) for i in range(max_window)], dtype=np.float32)
         w = w / (w.sum() + 1e-12)
-        keys = np.zeros((steps, dim), dtype=np.float32)
-        for t in range(steps):
-            mix = np.zeros(dim, dtype=np.float32)
-            # use past values z[t - i], but offset index so we don't go negative
-            for i in range(max_window):
-                mix += w[i] * z[t + max_window - 1 - i]   # z[...] aligned so first steps have values
-            keys[t] = mix + noise_scale * rng.normal(size=(dim,))
+        # z[...] aligned so first steps have values
+        keys = _mix_keys(z, w, rng.normal(size=(steps, dim)), noise_scale)
 
     elif dependency == "patterns":
         base = rng.normal(size=(n_patterns, dim)).astype(np.float32)
         q, _ = np.linalg.qr(base.T)
         patterns = q.T[:n_patterns]
-        keys = np.zeros((steps, dim), dtype=np.float32)
         current = rng.randint(n_patterns)
         persistence = max(1, max_window // 2)
-        for t in range(steps):
-            if rng.rand() < 0.1:
-                current = rng.randint(n_patterns)
-            keys[t] = patterns[current] + noise_scale * rng.normal(size=(dim,))
-            if (t % persistence) == 0 and rng.rand() < 0.2:
-                current = rng.randint(n_patterns)
+        if version == 1:
+            keys = np.zeros((steps, dim), dtype=np.float32)
+            for t in range(steps):
+                if rng.rand() < 0.1:
+                    current = rng.randint(n_patterns)
+                keys[t] = patterns[current] + noise_scale * rng.normal(size=(dim,))
+                if (t % persistence) == 0 and rng.rand() < 0.2:
+                    current = rng.randint(n_patterns)
+        else:
+            switch_pre = rng.rand(steps) < 0.1
+            new_pre = rng.randint(n_patterns, size=steps)
+            switch_post = ((np.arange(steps) % persistence) == 0) & (rng.rand(steps) < 0.2)
+            new_post = rng.randint(n_patterns, size=steps)
+            idx = _pattern_index(current, switch_pre, new_pre, switch_post, new_post)
+            keys = (patterns[idx] + noise_scale * rng.normal(size=(steps, dim))).astype(np.float32)
     else:
         raise ValueError("Unknown dependency type: choose 'ar','mix' or 'patterns'")
 
@@ -103,18 +204,187 @@ def generate_data(dim: int,
 
     # We'll map concat(window * dim) -> mem_size with a random linear transform + small noise.
     W_big = rng.normal(scale=0.05, size=(max_window * dim, dim_value)).astype(np.float32)
-    values = np.zeros((steps, dim_value), dtype=np.float32)
-    for t in range(steps):
-        window_vec = padded[t : t + max_window].reshape(-1)  # length = max_window * dim
-        values[t] = window_vec.dot(W_big) + 0.01 * rng.normal(size=(dim_value,))
+    value_noise = 0.01 * rng.normal(size=(steps, dim_value))
+    if version == 1:
+        values = np.zeros((steps, dim_value), dtype=np.float32)
+        windows = sliding_window_view(padded, (max_window, dim))[:, 0]  # (steps, max_window, dim), view
+        for t in range(steps):
+            window_vec = windows[t].reshape(-1)  # length = max_window * dim
+            values[t] = window_vec.dot(W_big) + value_noise[t]
+    else:
+        # concat(window) @ W_big = sum_i padded[t+i] @ W_big[i*dim:(i+1)*dim]
+        acc = np.zeros((steps, dim_value), dtype=np.float32)
+        for i in range(max_window):
+            acc += padded[i:i + steps] @ W_big[i * dim:(i + 1) * dim]
+        values = (acc + value_noise).astype(np.float32)
+
+    if backend == "numpy":
+        np_dtype = _numpy_dtype(dtype)
+        return (keys.astype(np.float32, copy=False).astype(np_dtype, copy=False),
+                values.astype(np.float32, copy=False).astype(np_dtype, copy=False))
 
     # convert to torch tensors for direct use in training
-    keys_t = torch.from_numpy(keys).to(dtype=torch.float32)
-    values_t = torch.from_numpy(values).to(dtype=torch.float32)
+    keys_t = torch.from_numpy(keys).to(dtype=torch.float32).to(dtype=dtype)
+    values_t = torch.from_numpy(values).to(dtype=torch.float32).to(dtype=dtype)
 
     return keys_t, values_t
 
 
+
+def _stream_blocks(rng, dim, mem_size, dependency, window, alpha, n_patterns, noise_scale):
+    """
+    Sinh vô hạn các block STREAM_BLOCK bước (numpy float32), mang theo trạng thái giữa các block:
+    key trước đó ("ar"), max_window - 1 giá trị z gần nhất ("mix"), pattern hiện tại và vị trí
+    trong chu kỳ persistence ("patterns"), và max_window - 1 key gần nhất để tính values.
+    Mỗi block rút số ngẫu nhiên theo thứ tự cố định (key rồi value noise) nên dữ liệu chỉ phụ thuộc seed.
+    """
+    max_window = max(1, window)
+    if dependency == "ar":
+        prev = rng.normal(size=(dim,)).astype(np.float32)
+        noise_scale_ar = np.sqrt(max(0.0, 1.0 - alpha ** 2))
+    elif dependency == "mix":
+        w = np.array([np.exp(-i / (max_window / 2.0)) for i in range(max_window)], dtype=np.float32)
+        w = w / (w.sum() + 1e-12)
+        z_hist = rng.normal(size=(max_window - 1, dim)).astype(np.float32)
+    elif dependency == "patterns":
+        if n_patterns > dim:
+            raise ValueError("patterns cần n_patterns <= dim (các pattern trực giao)")
+        base = rng.normal(size=(n_patterns, dim)).astype(np.float32)
+        q, _ = np.linalg.qr(base.T)
+        patterns = q.T[:n_patterns]
+        current = int(rng.integers(n_patterns))
+        persistence = max(1, max_window // 2)
+    else:
+        raise ValueError("Unknown dependency type: choose 'ar','mix' or 'patterns'")
+    W_big = rng.normal(scale=0.05, size=(max_window * dim, mem_size)).astype(np.float32)
+    key_hist = np.zeros((max_window - 1, dim), dtype=np.float32)
+
+    n = STREAM_BLOCK
+    t0 = 0
+    while True:
+        if dependency == "ar":
+            if t0 == 0:
+                # k_0 là trạng thái đầu, block đầu chỉ cần n - 1 bước nhiễu
+                keys = _ar_scan(prev, rng.normal(scale=noise_scale_ar, size=(n - 1, dim)), alpha)
+            else:
+                keys = _ar_scan(prev, rng.normal(scale=noise_scale_ar, size=(n, dim)), alpha)[1:]
+            prev = keys[-1]
+        elif dependency == "mix":
+            z = np.vstack([z_hist, rng.normal(size=(n, dim)).astype(np.float32)])
+            keys = _mix_keys(z, w, rng.normal(size=(n, dim)), noise_scale)
+            z_hist = z[n:]
+        else:
+            # số nguyên được suy ra từ số thực đều để mỗi bước tiêu thụ đúng 4 số ngẫu nhiên
+            u = rng.random((n, 4))
+            switch_pre = u[:, 0] < 0.1
+            new_pre = np.minimum((u[:, 1] * n_patterns).astype(np.int64), n_patterns - 1)
+            switch_post = ((t0 + np.arange(n)) % persistence == 0) & (u[:, 2] < 0.2)
+            new_post = np.minimum((u[:, 3] * n_patterns).astype(np.int64), n_patterns - 1)
+            idx = _pattern_index(current, switch_pre, new_pre, switch_post, new_post)
+            current = int(new_post[-1]) if switch_post[-1] else int(idx[-1])
+            keys = (patterns[idx] + noise_scale * rng.normal(size=(n, dim))).astype(np.float32)
+        padded = np.vstack([key_hist, keys])
+        acc = np.zeros((n, mem_size), dtype=np.float32)
+        for i in range(max_window):
+            acc += padded[i:i + n] @ W_big[i * dim:(i + 1) * dim]
+        values = (acc + 0.01 * rng.normal(size=(n, mem_size))).astype(np.float32)
+        key_hist = padded[n:]
+        t0 += n
+        yield keys, values
+
+
+def stream_data(dim: int,
+                mem_size: int,
+                dependency: str = "ar",
+                window: int = 5,
+                alpha: float = 0.9,
+                n_patterns: int = 10,
+                noise_scale: float = 0.01,
+                seed: int = 0,
+                chunk_size: int = STREAM_BLOCK,
+                steps: int = None,
+                dtype: torch.dtype = torch.float32):
+    """
+    Streaming version of generate_data: yields (keys, values) chunks of chunk_size steps
+    (the last one may be shorter), forever when steps is None.
+
+    Cùng mô hình sinh với generate_data (ar / mix / patterns, values phụ thuộc window key gần nhất),
+    nhưng là một stream ngẫu nhiên riêng (np.random.Generator): dữ liệu được sinh theo block
+    STREAM_BLOCK bước rồi cắt lại thành chunk, nên kết quả không phụ thuộc chunk_size và bộ nhớ
+    chỉ cỡ O((STREAM_BLOCK + chunk_size) * (dim + mem_size)) bất kể số bước.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    rng = np.random.default_rng(seed)
+    blocks = _stream_blocks(rng, dim, mem_size, dependency, window, alpha, n_patterns, noise_scale)
+    keys, values = [], []
+    have = emitted = 0
+    for kb, vb in blocks:
+        keys.append(kb)
+        values.append(vb)
+        have += kb.shape[0]
+        while have >= chunk_size or (steps is not None and emitted + have >= steps):
+            n = chunk_size if steps is None else min(chunk_size, steps - emitted)
+            if n <= 0:
+                return
+            k = np.concatenate(keys) if len(keys) > 1 else keys[0]
+            v = np.concatenate(values) if len(values) > 1 else values[0]
+            yield torch.from_numpy(k[:n]).to(dtype=dtype), torch.from_numpy(v[:n]).to(dtype=dtype)
+            keys, values = [k[n:]], [v[n:]]
+            have -= n
+            emitted += n
+
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def prefetch(chunks, depth=2):
+    """
+    Iterate `chunks` in a background thread, keeping at most `depth` items ready, so data
+    generation (numpy nhả GIL trong các kernel của nó) chạy song song với vòng lặp train.
+    Lỗi của iterator nguồn được ném lại ở phía đọc; dừng đọc sớm thì thread nền cũng dừng.
+    """
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for item in chunks:
+                if not put(item):
+                    return
+        except BaseException as exc:
+            put(_Failure(exc))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=worker, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
+
 # quick local test
 if __name__ == "__main__":
     ks, vs = generate_data(dim=64, steps=1000, mem_size=128, dependency="mix", window=8, seed=42)
@@ -0,0 +1,119 @@
+"""
+On-disk, content-addressed cache for generate_data outputs.
+
+Each dataset is stored once under <root>/<sha256>/ as raw float32 files (keys.f32,
+values.f32) plus meta.json. The hash covers the generator parameters and the source
+of src/data.py, so editing the generator invalidates old entries automatically.
+Hits are memory-mapped copy-on-write and wrapped with torch.from_numpy, so every
+process reading the same dataset shares the page cache instead of holding a copy.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import torch
+
+from src import data as data_module
+from src.data import generate_data
+
+DEFAULT_ROOT = os.environ.get("KV_DATASET_CACHE", os.path.join("results", "cache", "datasets"))
+
+
+def _code_version():
+    with open(data_module.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class DatasetCache:
+    def __init__(self, root: str = DEFAULT_ROOT, max_bytes: int = 2 * 1024 ** 3):
+        """
+        root: thư mục chứa cache (dùng chung giữa các process).
+        max_bytes: giới hạn tổng dung lượng; vượt quá thì xoá các entry ít dùng nhất (LRU).
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._code_version = _code_version()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, **params) -> str:
+        payload = json.dumps({"params": params, "code": self._code_version}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, **params):
+        """Return (keys, values) as zero-copy tensors over the cached files, or None on a miss."""
+        entry = os.path.join(self.root, self.key(**params))
+        try:
+            with open(os.path.join(entry, "meta.json")) as f:
+                meta = json.load(f)
+            keys = np.memmap(os.path.join(entry, "keys.f32"), dtype=np.float32, mode="c",
+                             shape=tuple(meta["keys_shape"]))
+            values = np.memmap(os.path.join(entry, "values.f32"), dtype=np.float32, mode="c",
+                               shape=tuple(meta["values_shape"]))
+        except (OSError, ValueError, KeyError):
+            return None
+        # đánh dấu lần dùng gần nhất cho LRU
+        os.utime(os.path.join(entry, "meta.json"))
+        return torch.from_numpy(keys), torch.from_numpy(values)
+
+    def put(self, keys: torch.Tensor, values: torch.Tensor, **params):
+        """Store a generated dataset; concurrent writers of the same key are harmless."""
+        name = self.key(**params)
+        entry = os.path.join(self.root, name)
+        if os.path.isdir(entry):
+            return
+        tmp = tempfile.mkdtemp(prefix=f".tmp-{name[:16]}-", dir=self.root)
+        try:
+            keys.numpy().astype(np.float32, copy=False).tofile(os.path.join(tmp, "keys.f32"))
+            values.numpy().astype(np.float32, copy=False).tofile(os.path.join(tmp, "values.f32"))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"params": params, "keys_shape": list(keys.shape),
+                           "values_shape": list(values.shape)}, f, sort_keys=True)
+            # rename là atomic: process khác chỉ thấy entry hoàn chỉnh hoặc không thấy gì
+            os.rename(tmp, entry)
+        except OSError:
+            # process khác đã ghi xong cùng key trước
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict(keep=name)
+
+    def get_or_generate(self, **params):
+        """generate_data(**params) through the cache."""
+        hit = self.get(**params)
+        if hit is not None:
+            return hit
+        keys, values = generate_data(**params)
+        self.put(keys, values, **params)
+        return self.get(**params) or (keys, values)
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                last_used = os.path.getmtime(os.path.join(path, "meta.json"))
+            except OSError:
+                continue
+            entries.append((last_used, name, size))
+            total += size
+        for _, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            # đổi tên trước khi xoá để reader không bao giờ thấy entry dở dang;
+            # các mmap đang mở vẫn hợp lệ sau khi file bị unlink
+            trash = os.path.join(self.root, f".trash-{name}-{os.getpid()}")
+            try:
+                os.rename(os.path.join(self.root, name), trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
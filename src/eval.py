@@ -2,10 +2,14 @@
 Evaluation helpers: reconstruct value from memory given a key and compute MSE & cosine sim.
 """
 import torch
-import torch.nn as nn
 import torch.nn.functional as F
 import math
 
+from src.precision import get_precision
+
+# giới hạn bộ nhớ cho ma trận logits/attention (chunk x M) của mỗi chunk
+MAX_CHUNK_BYTES = 64 * 1024 ** 2
+
 
 def reconstruct_value_from_memory(memory: torch.Tensor, key: torch.Tensor) -> torch.Tensor:
     """memory: (M, D), key: (D,) -> recon (D,)
@@ -18,17 +22,65 @@ def reconstruct_value_from_memory(memory: torch.Tensor, key: torch.Tensor) -> to
     return recon.squeeze(0)
 
 
-def eval_kv_reconstruction(memory: torch.Tensor, kv_pairs) -> dict:
+def _chunk_rows(memory: torch.Tensor, chunk_size=None) -> int:
+    if chunk_size:
+        return chunk_size
+    return max(1, MAX_CHUNK_BYTES // (memory.shape[0] * memory.element_size()))
+
+
+def reconstruct_values_from_memory(memory: torch.Tensor, keys: torch.Tensor, chunk_size=None,
+                                   accum_dtype=None) -> torch.Tensor:
+    """memory: (M, D), keys: (N, D) -> recon (N, D)
+    Batched reconstruct_value_from_memory: mỗi chunk các key là một GEMM cho logits, một softmax
+    và một GEMM cho readout. chunk_size mặc định được chọn để logits (chunk x M) nằm trong
+    MAX_CHUNK_BYTES. accum_dtype (vd. torch.float64) để tính logits/softmax/readout ở độ chính xác cao hơn.
+    """
+    mem = memory.to(accum_dtype) if accum_dtype is not None else memory
+    scale = 1.0 / math.sqrt(mem.shape[1])
+    rows = _chunk_rows(mem, chunk_size)
+    recon = torch.empty(keys.shape[0], mem.shape[1], dtype=mem.dtype, device=mem.device)
+    for start in range(0, keys.shape[0], rows):
+        k = keys[start:start + rows].to(mem.dtype)
+        attn = F.softmax((k @ mem.T) * scale, dim=-1)  # (chunk, M)
+        torch.matmul(attn, mem, out=recon[start:start + rows])
+    return recon
+
+
+def eval_kv_reconstruction_batched(memory: torch.Tensor, keys: torch.Tensor, values: torch.Tensor,
+                                   chunk_size=None, fp64=False, precision=None, index=None) -> dict:
+    """keys: (N, D), values: (N, D)
+    Returns dict with per-pair "mse"/"cos" tensors (N,) and their means "mse_mean"/"cos_mean".
+    fp64: tính toàn bộ (readout và metrics) ở float64.
+    precision: tên hoặc src.precision.Precision; readout và metrics tính ở accum dtype của nó
+        (vd. memory bf16 được đọc ở float32). fp64=True được ưu tiên hơn.
+    index: src.retrieval.IVFIndex dựng trên memory; nếu có, readout chỉ softmax trên top-k dòng
+        ứng viên của index (xấp xỉ, cho memory rất lớn), metrics vẫn tính ở accum dtype.
+    """
+    accum_dtype = None
+    if fp64:
+        accum_dtype = torch.float64
+    elif precision is not None:
+        accum_dtype = get_precision(precision).accum
+    if index is not None:
+        recon = index.reconstruct(keys)
+        recon = recon.to(accum_dtype) if accum_dtype is not None else recon
+    else:
+        recon = reconstruct_values_from_memory(memory, keys, chunk_size=chunk_size, accum_dtype=accum_dtype)
+    values = values.to(recon.dtype)
+    mse = ((recon - values) ** 2).mean(dim=1)
+    cos = F.cosine_similarity(recon, values, dim=1)
+    return {"mse": mse, "cos": cos,
+            "mse_mean": mse.double().mean().item(), "cos_mean": cos.double().mean().item()}
+
+
+def eval_kv_reconstruction(memory: torch.Tensor, kv_pairs, precision=None, index=None) -> dict:
     """kv_pairs: list of (key_tensor, value_tensor, pos)
+    precision, index: xem eval_kv_reconstruction_batched.
     Returns dict with mean_mse and mean_cosine
     """
-    mse_loss = nn.MSELoss()
-    cos = nn.CosineSimilarity(dim=0)
-    mses = []
-    coses = []
-    for k, v in kv_pairs:
-        recon = reconstruct_value_from_memory(memory, k)
-        mses.append(float(mse_loss(recon, v)))
-        coses.append(float(cos(recon, v)))
-    return {"mse_mean": float(sum(mses) / len(mses)), "cos_mean": float(sum(coses) / len(coses))}
-
+    if not kv_pairs:
+        raise ValueError("kv_pairs is empty")
+    keys = torch.stack([kv[0] for kv in kv_pairs])
+    values = torch.stack([kv[1] for kv in kv_pairs])
+    out = eval_kv_reconstruction_batched(memory, keys, values, precision=precision, index=index)
+    return {"mse_mean": out["mse_mean"], "cos_mean": out["cos_mean"]}
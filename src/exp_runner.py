@@ -6,42 +6,436 @@ ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
-from train import train_model  # hoặc train_model tùy tên hàm bạn export
+import argparse
 import csv
+import io
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from itertools import product
 
-def run_experiments():
-    # Lưới siêu tham số (có thể điều chỉnh)
-    mem_sizes = [20, 50]
-    dims = [10]
-    windows = [5, 10]
-    steps_list = [1000]
-    lrs = [0.01, 0.1]
-    regs = [0.0, 0.1]
-    seeds = [0, 1]
-    updaters = ['Delta', 'Omega']
-    os.makedirs('results', exist_ok=True)
-    result_file = os.path.join('results', 'exp_results.csv')
-    with open(result_file, mode='w', newline='') as f:
-        writer = csv.writer(f)
-        # Ghi header
-        writer.writerow(['mem_size', 'dim', 'window', 'steps', 'lr', 'reg', 
-                         'seed', 'updater', 'mse_mean', 'cos_mean', 
-                         'update_time', 'mem_norm_change'])
-        # Chạy thử nghiệm với tất cả tổ hợp cấu hình
-        for mem_size in mem_sizes:
-            for dim in dims:
-                for window in windows:
-                    for steps in steps_list:
-                        for lr in lrs:
-                            for reg in regs:
-                                for seed in seeds:
-                                    for updater in updaters:
-                                        mse_mean, cos_mean, update_time, mem_norm_change = train_model(
-                                            mem_size, dim, window, steps, lr, reg, seed, updater
-                                        )
-                                        writer.writerow([mem_size, dim, window, steps, lr, reg, seed, updater,
-                                                         mse_mean, cos_mean, update_time, mem_norm_change])
+from src.train import train_model, train_model_batched
+from src.datasets.cache import DatasetCache
+from src.profiling import PhaseProfiler, profile_columns
+from src.recorder import LATENCY_COLUMNS, StepRecorder
+from src.precision import PRECISIONS
+from src.results_store import ResultsStore
+from src.scheduler import DecisionLog, budget_usage, hyperband, rung_budgets, successive_halving
+
+CONFIG_FIELDS = ['mem_size', 'dim', 'window', 'steps', 'lr', 'reg',
+                 'seed', 'updater', 'precision']
+FIELDS = CONFIG_FIELDS + ['mse_mean', 'cos_mean',
+                          'update_time', 'mem_norm_change']
+
+# Lưới siêu tham số mặc định (có thể điều chỉnh qua CLI)
+DEFAULT_GRID = dict(
+    mem_sizes=[20, 50],
+    dims=[10],
+    windows=[5, 10],
+    steps_list=[1000],
+    lrs=[0.01, 0.1],
+    regs=[0.0, 0.1],
+    seeds=[0, 1],
+    updaters=['Delta', 'Omega'],
+    precisions=['fp32'],
+)
+
+def config_key(mem_size, dim, window, steps, lr, reg, seed, updater, precision):
+    """Khoá chuẩn hoá của một cấu hình, dùng để bỏ qua các run đã có trong CSV khi chạy lại."""
+    return (int(mem_size), int(dim), int(window), int(steps), float(lr), float(reg), int(seed), str(updater),
+            str(precision))
+
+def expand_grid(mem_sizes, dims, windows, steps_list, lrs, regs, seeds, updaters, precisions=('fp32',),
+                batched=False, done=()):
+    """
+    Trải lưới thành danh sách task; mỗi task là list các config (dict).
+    batched=False: mỗi task một config. batched=True: gom các config chỉ khác lr/reg/seed
+    thành một task để chạy bằng train_model_batched.
+    Các config có trong `done` bị bỏ qua.
+    """
+    tasks = []
+    for mem_size, dim, window, steps, updater, precision in product(mem_sizes, dims, windows, steps_list,
+                                                                    updaters, precisions):
+        group = []
+        for lr, reg, seed in product(lrs, regs, seeds):
+            if config_key(mem_size, dim, window, steps, lr, reg, seed, updater, precision) in done:
+                continue
+            group.append(dict(mem_size=mem_size, dim=dim, window=window, steps=steps,
+                              lr=lr, reg=reg, seed=seed, updater=updater, precision=precision))
+        if batched and group:
+            tasks.append(group)
+        else:
+            tasks.extend([cfg] for cfg in group)
+    return tasks
+
+_worker_cache = None
+
+def _init_worker(threads, use_cache):
+    # Cố định số thread intra-op của torch để các worker không tranh nhau core
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    global _worker_cache
+    _worker_cache = DatasetCache() if use_cache else None
+
+def result_fields(profile=None, record=None):
+    """Header của CSV: FIELDS, thêm các cột phase_* khi bật profile và update_p* khi bật record."""
+    return FIELDS + (profile_columns() if profile else []) + (LATENCY_COLUMNS if record else [])
+
+def _trace_name(cfg, ext='.json'):
+    return '_'.join(f"{k}{cfg[k]}" for k in CONFIG_FIELDS) + ext
+
+def run_task(task, data_cache=None, train_kwargs=None, profile=None, record=None):
+    """
+    Chạy một task (list config) và trả về các dòng kết quả theo thứ tự result_fields(profile, record).
+    train_kwargs: tham số bổ sung cho train_model (vd. deferred_metrics=True).
+    profile: None hoặc dict(allocs=bool, trace_dir=str|None); đo thời gian từng phase bằng
+        PhaseProfiler và thêm các cột phase_* (để trống với task batched).
+    record: None hoặc dict(trace_dir=str|None, trace_every=int); histogram độ trễ từng update
+        (StepRecorder) cho các cột update_p50/p90/p99/max, và trace JSONL mỗi trace_every bước
+        vào trace_dir (để trống với task batched).
+    """
+    if data_cache is None:
+        data_cache = _worker_cache
+    first = task[0]
+    extra = [[''] * len(profile_columns())] * len(task) if profile else [[]] * len(task)
+    lat_extra = [[''] * len(LATENCY_COLUMNS)] * len(task) if record else [[]] * len(task)
+    if len(task) > 1:
+        metrics = train_model_batched(first['mem_size'], first['dim'], first['window'], first['steps'],
+                                      [c['lr'] for c in task], [c['reg'] for c in task],
+                                      [c['seed'] for c in task], first['updater'], data_cache=data_cache,
+                                      precision=first['precision'])
+    else:
+        prof = None
+        if profile:
+            trace_dir = profile.get('trace_dir')
+            prof = PhaseProfiler(track_allocs=profile.get('allocs', False),
+                                 trace_path=os.path.join(trace_dir, _trace_name(first)) if trace_dir else None)
+        rec = None
+        if record:
+            trace_dir = record.get('trace_dir')
+            rec = StepRecorder(trace_path=os.path.join(trace_dir, _trace_name(first, '.jsonl')) if trace_dir else None,
+                               trace_every=record.get('trace_every', 1))
+        try:
+            metrics = [train_model(first['mem_size'], first['dim'], first['window'], first['steps'],
+                                   first['lr'], first['reg'], first['seed'], first['updater'],
+                                   data_cache=data_cache, profiler=prof, precision=first['precision'],
+                                   recorder=rec, **(train_kwargs or {}))]
+        finally:
+            if rec is not None:
+                rec.close()
+        if prof is not None:
+            extra = [list(prof.columns().values())]
+        if rec is not None:
+            lat_extra = [list(rec.columns().values())]
+    return [[c[f] for f in CONFIG_FIELDS] + list(m) + x + lx
+            for c, m, x, lx in zip(task, metrics, extra, lat_extra)]
+
+def read_done(result_file):
+    """
+    Đọc các config đã hoàn thành trong CSV. Nếu lần chạy trước bị dừng giữa lúc ghi,
+    dòng cuối chưa trọn vẹn được cắt bỏ để lần append tiếp theo không làm hỏng file.
+    """
+    if not os.path.exists(result_file):
+        return set()
+    with open(result_file, 'rb+') as f:
+        content = f.read()
+        if content and not content.endswith(b'\n'):
+            f.truncate(content.rfind(b'\n') + 1)
+    done = set()
+    with open(result_file, newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                done.add(config_key(*(row[k] for k in CONFIG_FIELDS)))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return done
+
+def append_rows(f, rows):
+    """Ghi các dòng bằng một lần write rồi fsync, để file luôn kết thúc ở ranh giới dòng."""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    f.write(buf.getvalue())
+    f.flush()
+    os.fsync(f.fileno())
+
+DEFAULT_OUT = os.path.join('results', 'exp_results.sqlite')
+
+# Cột được thêm sau và giá trị của chúng ở các dòng CSV cũ không có cột đó (vd. trước khi có precision)
+CSV_DEFAULTS = {'precision': 'fp32'}
+
+def migrate_csv(path, fields):
+    """
+    Đưa CSV kết quả cũ về header `fields` khi header cũ chỉ thiếu các cột trong CSV_DEFAULTS
+    (các cột còn lại cùng thứ tự): ghi lại file với giá trị mặc định cho cột thiếu.
+    Returns các cột đã thêm ([] nếu header đã khớp); header khác theo cách khác thì raise ValueError.
+    """
+    with open(path, newline='') as f:
+        header = next(csv.reader(f), [])
+    if header == fields:
+        return []
+    missing = [k for k in fields if k not in header]
+    if [k for k in fields if k in header] != header or any(k not in CSV_DEFAULTS for k in missing):
+        raise ValueError(f"{path} has different columns; use another --out or --no_resume")
+    read_done(path)  # cắt dòng cuối dở dang trước khi ghi lại
+    tmp = path + '.tmp'
+    with open(path, newline='') as src, open(tmp, 'w', newline='') as dst:
+        writer = csv.writer(dst)
+        writer.writerow(fields)
+        for row in csv.DictReader(src):
+            writer.writerow([row[k] if k in row else CSV_DEFAULTS[k] for k in fields])
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp, path)
+    return missing
+
+class _CsvSink:
+    """Ghi kết quả ra CSV phẳng (định dạng cũ); khi resume, header cũ chỉ thiếu cột mới được migrate_csv."""
+    def __init__(self, path, fields, resume):
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            added = migrate_csv(path, fields)
+            if added:
+                print(f"{path}: added columns {added} to its old rows")
+        self.done = read_done(path)
+        self.f = open(path, mode='a', newline='')
+        if self.f.tell() == 0:
+            # Ghi header
+            append_rows(self.f, [fields])
+
+    def append(self, rows):
+        append_rows(self.f, rows)
+
+    def close(self):
+        self.f.close()
+
+class _StoreSink:
+    """Ghi kết quả vào ResultsStore (SQLite): mỗi lần append là một transaction, trùng config thì bỏ qua."""
+    def __init__(self, path, fields, resume):
+        self.fields = fields
+        self.store = ResultsStore(path, key_fields=CONFIG_FIELDS)
+        if not resume:
+            self.store.clear()
+        self.done = {config_key(*k) for k in self.store.done()}
+
+    def append(self, rows):
+        self.store.add(dict(zip(self.fields, r)) for r in rows)
+
+    def close(self):
+        self.store.close()
+
+def open_sink(out, fields, resume=True):
+    """Đích ghi kết quả theo đuôi file: .csv -> CSV phẳng, còn lại -> ResultsStore (SQLite)."""
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    if out.endswith('.csv'):
+        return _CsvSink(out, fields, resume)
+    return _StoreSink(out, fields, resume)
+
+def run_experiments(out=DEFAULT_OUT, batched=False, use_cache=True,
+                    workers=None, threads_per_worker=1, resume=True, train_kwargs=None, profile=None,
+                    record=None, **grid):
+    """
+    out: file kết quả; '.csv' ghi CSV phẳng như trước, đuôi khác (mặc định .sqlite) ghi vào
+        src.results_store.ResultsStore (append-only, khử trùng theo config_hash, truy vấn có index).
+    batched: nếu True, các stream chỉ khác nhau ở lr/reg/seed được chạy cùng lúc bằng
+        train_model_batched (update_time khi đó là thời gian của batch chia đều cho mỗi stream).
+    use_cache: sinh mỗi bộ (mem_size, dim, window, steps, seed) một lần và dùng lại qua
+        DatasetCache (memory-mapped, dùng chung giữa các process) cho mọi lr/reg/updater.
+    workers: số process chạy song song (mặc định: số core / threads_per_worker); 1 = chạy tuần tự.
+    resume: giữ kết quả cũ và bỏ qua các config đã có; False thì xoá kết quả cũ.
+    train_kwargs: tham số bổ sung truyền cho train_model ở mỗi task không batched.
+    profile: dict(allocs=bool, trace_dir=str|None) để ghi thêm các cột phase_* (xem run_task).
+    record: dict(trace_dir=str|None, trace_every=int) để ghi thêm các cột update_p* và trace JSONL
+        (xem run_task).
+    grid: ghi đè các khoá của DEFAULT_GRID (mem_sizes, dims, ...).
+    """
+    params = dict(DEFAULT_GRID)
+    params.update({k: v for k, v in grid.items() if v is not None})
+    fields = result_fields(profile, record)
+    if profile and profile.get('trace_dir'):
+        os.makedirs(profile['trace_dir'], exist_ok=True)
+    if record and record.get('trace_dir'):
+        os.makedirs(record['trace_dir'], exist_ok=True)
+    sink = open_sink(out, fields, resume)
+    try:
+        tasks = expand_grid(batched=batched, done=sink.done, **params)
+        print(f"{len(sink.done)} configs already in {out}, {sum(len(t) for t in tasks)} to run")
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+        if workers == 1 or len(tasks) <= 1:
+            _init_worker(threads_per_worker, use_cache)
+            for task in tasks:
+                sink.append(run_task(task, train_kwargs=train_kwargs, profile=profile, record=record))
+            return
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(threads_per_worker, use_cache)) as pool:
+            futures = [pool.submit(run_task, task, None, train_kwargs, profile, record) for task in tasks]
+            # Ghi kết quả ngay khi từng task xong (theo thứ tự hoàn thành)
+            for fut in as_completed(futures):
+                sink.append(fut.result())
+    finally:
+        sink.close()
+
+def adaptive_arms(params, **fixed):
+    """
+    Các arm (updater, window, lr, reg) của run_adaptive, mỗi arm kèm fixed (mem_size, dim, precision).
+    Omega không dùng lr nên lr của nó gộp về params['lrs'][0]: không chạy trùng một arm cho mỗi lr.
+    """
+    arms, seen = [], set()
+    for updater, window, lr, reg in product(params['updaters'], params['windows'], params['lrs'], params['regs']):
+        if updater == 'Omega':
+            lr = params['lrs'][0]
+        key = (updater, window, lr, reg)
+        if key not in seen:
+            seen.add(key)
+            arms.append(dict(fixed, window=window, lr=lr, reg=reg, updater=updater))
+    return arms
+
+def run_adaptive(out=DEFAULT_OUT, eta=3, min_steps=None, use_hyperband=False, decision_log=None,
+                 use_cache=True, workers=None, threads_per_worker=1, resume=True, train_kwargs=None,
+                 profile=None, record=None, **grid):
+    """
+    Sweep thích nghi bằng successive halving (src.scheduler) thay cho chạy đủ cả lưới.
+    Với mỗi (mem_size, dim, precision), các arm (updater, window, lr, reg) chạy trước ở budget
+    steps nhỏ với ít seed; chỉ ceil(1/eta) arm có mse_mean trung bình tốt nhất lên rung sau
+    (steps gấp eta, nhiều seed hơn), tới max(steps_list) với mọi seed. Mọi run dùng
+    train_model(stop_nonfinite=True): run phân kỳ dừng sớm và arm đó bị loại ngay.
+    min_steps: budget của rung đầu (mặc định max(steps_list) // eta**2, tức 3 rung).
+    use_hyperband: chia arm cho các bracket của scheduler.hyperband thay vì một lần successive halving.
+    decision_log: JSONL ghi điểm và quyết định (promote/stop/diverged/final) của mọi arm ở mọi rung
+        (mặc định <out>_decisions.jsonl).
+    Mọi run (cả ở rung ngắn) được ghi vào out như một config bình thường, với steps là budget của
+    rung; config đã có trong out vẫn được chạy lại để lấy điểm nhưng không bị ghi trùng.
+    Các tham số còn lại như run_experiments (không có batched). Returns the DecisionLog.
+    """
+    params = dict(DEFAULT_GRID)
+    params.update({k: v for k, v in grid.items() if v is not None})
+    max_steps = max(params['steps_list'])
+    budgets = rung_budgets(min_steps or max(1, max_steps // eta ** 2), max_steps, eta)
+    seeds = list(params['seeds'])
+    fields = result_fields(profile, record)
+    mse_col, norm_col = fields.index('mse_mean'), fields.index('mem_norm_change')
+    kwargs = dict(train_kwargs or {})
+    # stop_nonfinite chỉ có ở vòng lặp từng bước; với chunk/offline/fused run phân kỳ chạy hết budget
+    # và vẫn bị loại qua mem_norm_change không hữu hạn
+    kwargs['stop_nonfinite'] = not any(kwargs.get(k) for k in ('chunk_size', 'offline', 'fused', 'data'))
+    log = DecisionLog(decision_log or os.path.splitext(out)[0] + '_decisions.jsonl')
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    sink = open_sink(out, fields, resume)
+    pool = None
+    try:
+        if workers == 1:
+            _init_worker(threads_per_worker, use_cache)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(threads_per_worker, use_cache))
+
+        def evaluate(arms, steps, rung_seeds):
+            configs = [dict(arm, steps=steps, seed=seed) for arm in arms for seed in rung_seeds]
+            if pool is None:
+                rows = [row for cfg in configs for row in run_task([cfg], None, kwargs, profile, record)]
+            else:
+                futures = [pool.submit(run_task, [cfg], None, kwargs, profile, record) for cfg in configs]
+                rows = [row for fut in futures for row in fut.result()]
+            new = [r for r in rows if config_key(*r[:len(CONFIG_FIELDS)]) not in sink.done]
+            if new:
+                sink.append(new)
+                sink.done.update(config_key(*r[:len(CONFIG_FIELDS)]) for r in new)
+            # điểm của một seed: mse_mean, hoặc nan nếu run phân kỳ (memory không hữu hạn)
+            scores = [r[mse_col] if math.isfinite(r[norm_col]) else math.nan for r in rows]
+            n = len(rung_seeds)
+            return [scores[i * n:(i + 1) * n] for i in range(len(arms))]
+
+        search = hyperband if use_hyperband else successive_halving
+        n_arms = 0
+        for mem_size, dim, precision in product(params['mem_sizes'], params['dims'], params['precisions']):
+            arms = adaptive_arms(params, mem_size=mem_size, dim=dim, precision=precision)
+            n_arms += len(arms)
+            best = search(arms, evaluate, budgets, seeds, eta, log)
+            for arm, score in best[:3]:
+                print(f"best {arm} mse_mean={score:.4e}")
+        spent, full = budget_usage(log, n_arms, max_steps, len(seeds))
+        print(f"rungs {budgets}: ran {spent} of {full} step-seeds of the full grid ({spent / max(full, 1):.0%}); "
+              f"decisions in {log.path}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        sink.close()
+    return log
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Omega/Delta experiment grid")
+    parser.add_argument('--out', '--out_csv', dest='out', default=DEFAULT_OUT,
+                        help="results file: .sqlite (ResultsStore) or .csv (flat CSV)")
+    parser.add_argument('--mem_sizes', type=int, nargs='+')
+    parser.add_argument('--dims', type=int, nargs='+')
+    parser.add_argument('--windows', type=int, nargs='+')
+    parser.add_argument('--steps_list', type=int, nargs='+')
+    parser.add_argument('--lrs', type=float, nargs='+')
+    parser.add_argument('--regs', type=float, nargs='+')
+    parser.add_argument('--seeds', type=int, nargs='+')
+    parser.add_argument('--updaters', nargs='+')
+    parser.add_argument('--precisions', nargs='+', choices=sorted(PRECISIONS))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threads_per_worker', type=int, default=1)
+    parser.add_argument('--batched', action='store_true')
+    parser.add_argument('--no_cache', action='store_true')
+    parser.add_argument('--no_resume', action='store_true', help="discard existing results instead of resuming")
+    parser.add_argument('--deferred_metrics', action='store_true',
+                        help="compute mse/cos in one vectorized pass after the loop")
+    parser.add_argument('--fused', choices=['auto', 'script', 'compile', 'eager'], default=None,
+                        help="run each step as one compiled predict+metrics+update kernel (src/fused.py)")
+    parser.add_argument('--backend', choices=['auto', 'torch', 'numpy'], default='torch',
+                        help="array backend of the step loop; 'auto' uses NumPy for tiny shapes (src/numpy_backend.py), "
+                             "metrics equal to torch's up to float32 rounding only")
+    parser.add_argument('--profile', action='store_true', help="add per-phase timing columns (phase_*)")
+    parser.add_argument('--profile_allocs', action='store_true',
+                        help="also count torch allocations per phase (runs under torch.profiler)")
+    parser.add_argument('--trace_dir', default=None, help="export one Chrome trace per config into this dir")
+    parser.add_argument('--latency', action='store_true',
+                        help="add per-update latency quantile columns (update_p50/p90/p99/max)")
+    parser.add_argument('--step_trace_dir', default=None,
+                        help="stream mse/cos/latency of every --trace_every-th step to one JSONL per config")
+    parser.add_argument('--trace_every', type=int, default=1)
+    parser.add_argument('--adaptive', action='store_true',
+                        help="successive halving: short runs first, only the best 1/eta go on to more steps/seeds")
+    parser.add_argument('--hyperband', action='store_true', help="adaptive sweep with Hyperband brackets")
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--min_steps', type=int, default=None, help="budget of the first rung (adaptive)")
+    parser.add_argument('--decision_log', default=None, help="JSONL of adaptive decisions (default <out>_decisions.jsonl)")
+    args = parser.parse_args()
+    if (args.adaptive or args.hyperband) and args.batched:
+        parser.error("--adaptive/--hyperband cannot be combined with --batched")
+    if (args.adaptive or args.hyperband) and args.fused:
+        # run phân kỳ chỉ dừng sớm (stop_nonfinite) ở vòng lặp từng bước
+        parser.error("--adaptive/--hyperband cannot be combined with --fused")
+    if (args.latency or args.step_trace_dir) and args.fused:
+        # StepRecorder đo từng update, vòng lặp fused chạy cả chunk trong một kernel
+        parser.error("--latency/--step_trace_dir cannot be combined with --fused")
+    grid = {k: getattr(args, k) for k in DEFAULT_GRID}
+    profile = None
+    if args.profile or args.profile_allocs or args.trace_dir:
+        profile = {'allocs': args.profile_allocs, 'trace_dir': args.trace_dir}
+    record = None
+    if args.latency or args.step_trace_dir:
+        record = {'trace_dir': args.step_trace_dir, 'trace_every': args.trace_every}
+    train_kwargs = {'deferred_metrics': args.deferred_metrics, 'fused': args.fused, 'backend': args.backend}
+    if args.adaptive or args.hyperband:
+        run_adaptive(out=args.out, eta=args.eta, min_steps=args.min_steps, use_hyperband=args.hyperband,
+                     decision_log=args.decision_log, use_cache=not args.no_cache, workers=args.workers,
+                     threads_per_worker=args.threads_per_worker, resume=not args.no_resume,
+                     train_kwargs=train_kwargs, profile=profile, record=record, **grid)
+        return
+    run_experiments(out=args.out, batched=args.batched, use_cache=not args.no_cache,
+                    workers=args.workers, threads_per_worker=args.threads_per_worker,
+                    resume=not args.no_resume, train_kwargs=train_kwargs,
+                    profile=profile, record=record, **grid)
 
 if __name__ == '__main__':
-    run_experiments()
+    main()
@@ -0,0 +1,207 @@
+"""
+Fused training steps: predict + per-step metrics + Delta/Omega update in one kernel.
+
+    scan = get_scan('Delta', mem_size, dim, dtype=torch.float32, backend='auto')
+    memory, acc = scan.delta(memory, keys, values, lr, reg, acc)   # acc = [sum mse, sum cos] (float64)
+
+Backends, tried in this order by 'auto':
+    script:  torch.jit.script of the whole scan over a chunk of steps, so the step loop runs in the
+             TorchScript interpreter instead of Python (~2x faster than the plain loop at 20x10).
+    compile: torch.compile (inductor, dynamic=False) of one step; the step loop stays in Python but
+             each step is a single compiled call. One compiled artifact per (updater, shape, dtype).
+             Guard checks on every call eat most of the gain at tiny shapes, hence second.
+    eager:   the same step functions without compilation (always available).
+A backend that fails to build or to run its warm-up call (no C++ compiler, unsupported op, ...)
+is marked unavailable for that updater for the rest of the process and the next one is used,
+with one warning.
+
+Per-step metrics are accumulated in a float64 tensor instead of calling .item() each step; the
+sums are the same float64 additions of the same per-step values as train_model's loop, so Delta
+with script/eager matches it exactly (inductor may reorder arithmetic: compile agrees up to
+rounding). Omega keeps
+its window in a fixed (dim, window) / (mem_size, window) ring: for reg > 0 the unused columns are
+zeros, which do not change X X^T or Y X^T, so every step has the same shape. For reg = 0 the
+first window-1 steps use the filled prefix of the ring (the min-norm solution of a zero-padded X
+is not stable in float32). The formulation (primal / dual / lstsq / pinv) is picked per shape by
+updaters.choose_solver; the step solves with torch.linalg.solve rather than Cholesky because a
+Cholesky failure check would be a data-dependent branch that torch.compile cannot trace. Once
+the ring wraps its column order differs from the deque order of OmegaUpdater, so Omega results
+agree with the unfused loop up to rounding.
+"""
+import warnings
+import torch
+from src.updaters import choose_solver
+
+BACKENDS = ('script', 'compile', 'eager')
+
+_KERNELS = {}
+_UNAVAILABLE = set()
+
+
+def _metrics(y_pred, y, acc):
+    # giống vòng lặp train_model: mse, cosine (bằng 0 khi một trong hai norm bằng 0)
+    mse = ((y_pred - y) ** 2).mean()
+    norm_pred = torch.norm(y_pred)
+    norm_y = torch.norm(y)
+    cos = torch.where((norm_pred > 0) & (norm_y > 0), torch.dot(y_pred, y) / (norm_pred * norm_y),
+                      torch.zeros_like(norm_pred))
+    return acc + torch.stack([mse, cos]).double()
+
+
+def delta_step(memory, x, y, lr, reg, acc):
+    y_pred = torch.mv(memory, x)
+    acc = _metrics(y_pred, y, acc)
+    grad = torch.outer(y_pred - y, x) + reg * memory
+    return memory - lr * grad, acc
+
+
+def omega_step(memory, ring_x, ring_y, pos, x, y, reg, solver: str, acc):
+    y_pred = torch.mv(memory, x)
+    acc = _metrics(y_pred, y, acc)
+    ring_x.index_copy_(1, pos, x.unsqueeze(1))
+    ring_y.index_copy_(1, pos, y.unsqueeze(1))
+    if solver == 'lstsq':
+        return torch.linalg.lstsq(ring_x.t(), ring_y.t()).solution.t(), acc
+    if solver == 'pinv':
+        return ring_y @ torch.linalg.pinv(ring_x), acc
+    if solver == 'dual':
+        G = ring_x.t() @ ring_x
+        I = torch.eye(G.size(0), dtype=G.dtype, device=G.device)
+        return (ring_x @ torch.linalg.solve(G + reg * I, ring_y.t())).t(), acc
+    G = ring_x @ ring_x.t()
+    I = torch.eye(G.size(0), dtype=G.dtype, device=G.device)
+    return torch.linalg.solve(G + reg * I, ring_x @ ring_y.t()).t(), acc
+
+
+def delta_scan(memory, keys, values, lr, reg, acc):
+    for i in range(keys.shape[0]):
+        memory, acc = delta_step(memory, keys[i], values[i], lr, reg, acc)
+    return memory, acc
+
+
+def omega_scan(memory, ring_x, ring_y, count: int, keys, values, reg, solver: str, acc):
+    """count: số mẫu đã ghi vào ring trước chunk này."""
+    window = ring_x.shape[1]
+    slots = torch.arange(window).unsqueeze(1)
+    for i in range(keys.shape[0]):
+        if solver in ('primal', 'dual') or count >= window:
+            memory, acc = omega_step(memory, ring_x, ring_y, slots[count % window], keys[i], values[i],
+                                     reg, solver, acc)
+        else:
+            n = count + 1
+            memory, acc = omega_step(memory, ring_x[:, :n], ring_y[:, :n], slots[count], keys[i], values[i],
+                                     reg, solver, acc)
+        count += 1
+    return memory, acc
+
+
+class FusedScan:
+    """Scan over a chunk of steps with one backend; built by get_scan (cached per shape)."""
+
+    def __init__(self, backend, delta=None, omega=None):
+        self.backend = backend
+        self._delta = delta
+        self._omega = omega
+
+    # lr, reg được truyền dưới dạng tensor 0 chiều: torch.compile chuyên biệt hoá theo giá trị của
+    # float Python, nên mỗi lr/reg mới sẽ phải biên dịch lại
+
+    def delta(self, memory, keys, values, lr, reg, acc):
+        lr = torch.tensor(lr, dtype=memory.dtype)
+        reg = torch.tensor(reg, dtype=memory.dtype)
+        return self._delta(memory, keys, values, lr, reg, acc)
+
+    def omega(self, memory, ring_x, ring_y, count, keys, values, reg, acc):
+        (dim, window), mem_size = ring_x.shape, ring_y.shape[0]
+        solver = choose_solver(dim, window, mem_size, reg > 0)
+        reg = torch.tensor(reg, dtype=memory.dtype)
+        return self._omega(memory, ring_x, ring_y, int(count), keys, values, reg, solver, acc)
+
+
+def _compiled_scan(updater_type):
+    step = torch.compile(delta_step if updater_type == 'Delta' else omega_step, dynamic=False, fullgraph=True)
+    if updater_type == 'Delta':
+        def scan(memory, keys, values, lr, reg, acc):
+            for i in range(keys.shape[0]):
+                memory, acc = step(memory, keys[i], values[i], lr, reg, acc)
+            return memory, acc
+        return FusedScan('compile', delta=scan)
+
+    def scan(memory, ring_x, ring_y, count, keys, values, reg, solver, acc):
+        window = ring_x.shape[1]
+        slots = torch.arange(window).unsqueeze(1)
+        for i in range(keys.shape[0]):
+            if solver in ('primal', 'dual') or count >= window:
+                memory, acc = step(memory, ring_x, ring_y, slots[count % window], keys[i], values[i],
+                                   reg, solver, acc)
+            else:
+                # các bước đầu (reg = 0) có shape thay đổi: chạy eager thay vì biên dịch lại mỗi bước
+                n = count + 1
+                memory, acc = omega_step(memory, ring_x[:, :n], ring_y[:, :n], slots[count], keys[i], values[i],
+                                         reg, solver, acc)
+            count += 1
+        return memory, acc
+    return FusedScan('compile', omega=scan)
+
+
+def _build(backend, updater_type):
+    if backend == 'compile':
+        return _compiled_scan(updater_type)
+    if backend == 'script':
+        with warnings.catch_warnings():
+            # torch.jit.script báo FutureWarning ở các bản torch mới nhưng vẫn chạy được
+            warnings.simplefilter('ignore', FutureWarning)
+            if updater_type == 'Delta':
+                return FusedScan('script', delta=torch.jit.script(delta_scan))
+            return FusedScan('script', omega=torch.jit.script(omega_scan))
+    if updater_type == 'Delta':
+        return FusedScan('eager', delta=delta_scan)
+    return FusedScan('eager', omega=omega_scan)
+
+
+def _warm_up(scan, updater_type, mem_size, dim, window, reg, dtype):
+    # một bước trên dữ liệu giả cùng shape: lỗi biên dịch (lười với torch.compile) lộ ra ở đây,
+    # không phải giữa lúc train
+    memory = torch.zeros(mem_size, dim, dtype=dtype)
+    keys = torch.ones(1, dim, dtype=dtype)
+    values = torch.ones(1, mem_size, dtype=dtype)
+    acc = torch.zeros(2, dtype=torch.float64)
+    if updater_type == 'Delta':
+        scan.delta(memory, keys, values, 0.01, reg, acc)
+    else:
+        count = 0 if reg > 0 else window
+        scan.omega(memory, torch.zeros(dim, window, dtype=dtype), torch.zeros(mem_size, window, dtype=dtype),
+                   count, keys, values, reg, acc)
+
+
+def get_scan(updater_type, mem_size, dim, window=None, reg=0.0, dtype=torch.float32, backend='auto'):
+    """
+    Fused scan for updater_type ('Delta' or 'Omega') at this shape, cached per
+    (updater, backend, mem_size, dim, window, reg > 0, dtype).
+    backend: 'auto' (script -> compile -> eager) or a backend name to try first; a backend that
+        cannot be built falls through to the others in 'auto' order.
+    """
+    if updater_type not in ('Delta', 'Omega'):
+        raise ValueError("Unknown updater type")
+    if backend == 'auto':
+        backend = BACKENDS[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown fused backend {backend!r}: choose 'auto' or one of {list(BACKENDS)}")
+    window = window if updater_type == 'Omega' else None
+    for name in (backend,) + tuple(b for b in BACKENDS if b != backend):
+        if (name, updater_type) in _UNAVAILABLE:
+            continue
+        key = (updater_type, name, mem_size, dim, window, reg > 0, dtype)
+        if key in _KERNELS:
+            return _KERNELS[key]
+        try:
+            scan = _build(name, updater_type)
+            _warm_up(scan, updater_type, mem_size, dim, window, reg, dtype)
+        except Exception as exc:
+            if name == 'eager':
+                raise
+            _UNAVAILABLE.add((name, updater_type))
+            warnings.warn(f"fused backend {name!r} unavailable ({type(exc).__name__}: {exc}); falling back")
+            continue
+        _KERNELS[key] = scan
+        return scan
@@ -0,0 +1,120 @@
+"""
+Factorized memory M = U @ V^T with bounded rank.
+
+    memory = LowRankMemory.zeros(mem_size, dim, max_rank=32)
+    y_pred = memory @ x                 # U (V^T x), never forms the (mem_size, dim) matrix
+    memory.add_rank1_(e, x, alpha=-lr)  # appends a column to U and V
+
+Factors live in preallocated (mem_size, 2*max_rank) / (dim, 2*max_rank) buffers. When the
+buffers fill up the factorization is recompressed to max_rank with QR + SVD of the small core,
+so memory use and the amortized per-step cost are O(max_rank * (mem_size + dim)). The QR/SVD run
+in at least float32 (torch.linalg has no bf16 kernels) and the factors are cast back to their dtype.
+Truncation is exact while the true rank stays <= max_rank (e.g. Omega with window <= max_rank);
+for Delta, whose memory is a sum of one rank-1 term per step, it is a best rank-max_rank
+approximation taken at each recompression.
+"""
+import torch
+
+
+class LowRankMemory:
+    def __init__(self, U, V, max_rank=None):
+        """
+        U: (mem_size, r), V: (dim, r) -> memory = U @ V^T.
+        max_rank: hạng tối đa sau khi nén (mặc định r); r > max_rank thì nén ngay.
+        """
+        if U.dim() != 2 or V.dim() != 2 or U.shape[1] != V.shape[1]:
+            raise ValueError("U và V phải là ma trận có cùng số cột")
+        r = U.shape[1]
+        self.max_rank = max_rank or max(1, r)
+        cap = max(2 * self.max_rank, r)
+        self._U = U.new_zeros(U.shape[0], cap)
+        self._V = V.new_zeros(V.shape[0], cap)
+        self._U[:, :r] = U
+        self._V[:, :r] = V
+        self._r = r
+        if r > self.max_rank:
+            self.compress()
+
+    @classmethod
+    def zeros(cls, mem_size, dim, max_rank, dtype=torch.float32, device=None):
+        """Memory bằng 0 (hạng 0)."""
+        return cls(torch.zeros(mem_size, 0, dtype=dtype, device=device),
+                   torch.zeros(dim, 0, dtype=dtype, device=device), max_rank)
+
+    @property
+    def U(self):
+        return self._U[:, :self._r]
+
+    @property
+    def V(self):
+        return self._V[:, :self._r]
+
+    @property
+    def rank(self):
+        return self._r
+
+    @property
+    def shape(self):
+        return torch.Size((self._U.shape[0], self._V.shape[0]))
+
+    @property
+    def dtype(self):
+        return self._U.dtype
+
+    def matvec(self, x, out=None, dtype=None):
+        """
+        memory @ x for x of shape (dim,) or (dim, n), in O(r * (mem_size + dim)).
+        dtype: dtype tính toán (vd. compute dtype của precision); mặc định dtype của các factor.
+        """
+        U, V = self.U, self.V
+        if dtype is not None and dtype != U.dtype:
+            U, V, x = U.to(dtype), V.to(dtype), x.to(dtype)
+        coef = V.t() @ x
+        if out is None:
+            return U @ coef
+        return torch.matmul(U, coef, out=out)
+
+    def __matmul__(self, x):
+        return self.matvec(x)
+
+    def scale_(self, a):
+        """memory <- a * memory."""
+        self.U.mul_(a)
+        return self
+
+    def add_rank1_(self, u, v, alpha=1.0):
+        """memory <- memory + alpha * u v^T; nén lại khi buffer đầy."""
+        if self._r == self._U.shape[1]:
+            self.compress()
+        self._U[:, self._r] = u
+        self._U[:, self._r].mul_(alpha)
+        self._V[:, self._r] = v
+        self._r += 1
+        return self
+
+    def compress(self, rank=None):
+        """
+        Re-factorize to at most `rank` (default max_rank) columns:
+        U = Qu Ru, V = Qv Rv, SVD của lõi Ru Rv^T = P S Q^T, giữ các giá trị kỳ dị lớn nhất.
+        """
+        rank = rank or self.max_rank
+        if self._r == 0:
+            return self
+        work = torch.promote_types(self.dtype, torch.float32)
+        Qu, Ru = torch.linalg.qr(self.U.to(work))
+        Qv, Rv = torch.linalg.qr(self.V.to(work))
+        P, S, Qh = torch.linalg.svd(Ru @ Rv.t(), full_matrices=False)
+        k = min(rank, S.shape[0])
+        U = Qu @ (P[:, :k] * S[:k])
+        V = Qv @ Qh[:k].t()
+        self._U[:, :k] = U
+        self._V[:, :k] = V
+        self._r = k
+        return self
+
+    def norm(self):
+        """Frobenius norm: ||U V^T||_F^2 = trace((U^T U)(V^T V))."""
+        return torch.sqrt(((self.U.t() @ self.U) * (self.V.t() @ self.V)).sum().clamp(min=0))
+
+    def to_dense(self):
+        return self.U @ self.V.t()
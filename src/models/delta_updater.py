@@ -1,25 +1,48 @@
 import torch
+from src.updaters import delta_chunk
 
 class DeltaUpdater:
-    def __init__(self, mem_size: int, dim: int, lr: float = 0.01):
+    def __init__(self, mem_size: int, dim: int, lr: float = 0.01, inplace: bool = False):
         """
         Khởi tạo DeltaUpdater:
         - self.memory: ma trận bộ nhớ (dim x dim), ban đầu zeros.
         - lr: learning rate cho quy tắc Delta.
+        - inplace: dùng addr_ với buffer dự đoán cấp phát sẵn thay vì tạo outer product mới mỗi cặp.
         """
         self.mem_size = mem_size
         self.dim = dim
         self.lr = lr
+        self.inplace = inplace
         self.memory = torch.zeros(dim, dim)
+        self._pred = torch.empty(dim)
 
-    def update(self, kv_pairs):
+    def update(self, kv_pairs, chunk_size=None):
         """
         Cập nhật memory theo luật Delta, lần lượt với mỗi (k, v).
+        chunk_size: nếu đặt, xử lý chunk_size cặp một lần bằng delta_chunk (kết quả như
+            cập nhật từng cặp, nhưng chỉ tốn vài phép nhân ma trận mỗi chunk).
         Trả về self.memory sau cập nhật.
         """
         if not kv_pairs:
             return self.memory
 
+        if chunk_size:
+            K = torch.stack([k for k, v in kv_pairs])
+            V = torch.stack([v for k, v in kv_pairs])
+            for start in range(0, K.shape[0], chunk_size):
+                new_memory, _ = delta_chunk(self.memory, K[start:start + chunk_size],
+                                            V[start:start + chunk_size], self.lr)
+                self.memory.copy_(new_memory)
+            return self.memory
+
+        if self.inplace:
+            for k, v in kv_pairs:
+                # memory += lr * (v - M k) k^T  <=>  addr_(M k - v, k, alpha=-lr)
+                torch.mv(self.memory, k, out=self._pred)
+                self._pred.sub_(v)
+                self.memory.addr_(self._pred, k, alpha=-self.lr)
+            return self.memory
+
         for k, v in kv_pairs:
             # Tính dự đoán và lỗi cho cặp hiện tại
             pred = self.memory @ k   # (dim,)
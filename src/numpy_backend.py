@@ -0,0 +1,129 @@
+"""
+NumPy backend for tiny memory shapes.
+
+At the grid's usual shapes (mem_size 20-50, dim 10) one update is a handful of operations on a
+few hundred floats, and torch's per-op dispatch costs more than the arithmetic. This backend
+runs train_model's step loop on NumPy arrays instead: the data comes from generate_data as the
+NumPy arrays it is built from, the updaters below work on preallocated buffers, and metrics are
+computed once at the end with train.stream_metrics, as with deferred_metrics=True.
+
+    train_model(..., backend='auto')    # 'numpy' when select_backend says so, else 'torch'
+
+train_model's default stays backend='torch': the two backends agree only up to rounding (below),
+so a results file should hold the rows of one backend only.
+
+The data are the same values, the metrics the same reductions (stream_metrics), and Delta does
+the same elementwise float32 operations in the same order as DeltaUpdater. Only the BLAS differs:
+NumPy's sgemv sums a matvec in another order than torch's, so predictions and metrics agree with
+the torch loop up to float32 rounding (~1e-9 relative on mse_mean / cos_mean at the grid shapes).
+Omega solves the same formulation as OmegaUpdater (updaters.choose_solver) through LAPACK's LU / SVD
+in NumPy (Cholesky solves need scipy, which is not a dependency), also equal up to rounding.
+"""
+from collections import deque
+
+import numpy as np
+
+from src.updaters import SOLVERS, choose_solver
+
+BACKENDS = ('torch', 'numpy')
+# mem_size * dim tối đa cho 'auto'. Đo trên 1 CPU (500 bước, window 5): nhanh ~4x ở 20x10,
+# ~2.5x ở 128x128, chỉ còn ~1.3x ở 256x256, nơi torch đa luồng có thể thắng -> giữ torch từ đó
+SMALL_SHAPE_LIMIT = 128 * 128
+
+
+def select_backend(backend, mem_size, dim):
+    """
+    backend: None / 'auto' (NumPy khi mem_size * dim <= SMALL_SHAPE_LIMIT), 'torch' hoặc 'numpy'.
+    Returns 'torch' or 'numpy'.
+    """
+    if backend in (None, 'auto'):
+        return 'numpy' if mem_size * dim <= SMALL_SHAPE_LIMIT else 'torch'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}: choose 'auto' or one of {list(BACKENDS)}")
+    return backend
+
+
+def ridge_solve(X, Y, reg, solver=None):
+    """updaters.ridge_solve on NumPy arrays: W = Y X^T (X X^T + reg*I)^-1, reg = 0: Y pinv(X)."""
+    dim, n = X.shape
+    if solver is None:
+        solver = choose_solver(dim, n, Y.shape[0], reg > 0)
+    if solver in ('lstsq', 'pinv'):
+        if reg > 0:
+            raise ValueError(f"solver {solver!r} chỉ dùng cho reg = 0")
+        if solver == 'pinv':
+            return Y @ np.linalg.pinv(X)
+        return np.linalg.lstsq(X.T, Y.T, rcond=None)[0].T
+    if reg <= 0:
+        raise ValueError(f"solver {solver!r} cần reg > 0")
+    if solver == 'dual':
+        G = X.T @ X
+        G.flat[::n + 1] += reg
+        return (X @ np.linalg.solve(G, Y.T)).T
+    if solver != 'primal':
+        raise ValueError(f"Unknown solver {solver!r}: choose one of {list(SOLVERS)}")
+    G = X @ X.T
+    G.flat[::dim + 1] += reg
+    return np.linalg.solve(G, X @ Y.T).T
+
+
+class NumpyDeltaUpdater:
+    def __init__(self, lr=0.01, reg=0.0):
+        self.lr = lr
+        self.reg = reg
+        self._error = None
+        self._grad = None
+        self._decay = None
+
+    def update(self, memory, x, y):
+        """
+        Như DeltaUpdater.update nhưng ghi đè lên memory (mảng NumPy) và dùng lại các buffer
+        cấp phát sẵn; từng phép tính giống hệt memory - lr * (outer(Mx - y, x) + reg * M).
+        """
+        if self._grad is None or self._grad.shape != memory.shape or self._grad.dtype != memory.dtype:
+            self._error = np.empty(memory.shape[0], dtype=memory.dtype)
+            self._grad = np.empty_like(memory)
+            self._decay = np.empty_like(memory)
+        np.dot(memory, x, out=self._error)
+        self._error -= y
+        np.outer(self._error, x, out=self._grad)
+        if self.reg:
+            np.multiply(memory, self.reg, out=self._decay)
+            self._grad += self._decay
+        self._grad *= self.lr
+        memory -= self._grad
+        return memory
+
+
+class NumpyOmegaUpdater:
+    def __init__(self, window=10, reg=0.0, solver=None):
+        if solver is not None and solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver!r}: choose one of {list(SOLVERS)}")
+        self.window = window
+        self.reg = reg
+        self.solver = solver
+        self.buffer_x = deque(maxlen=window)
+        self.buffer_y = deque(maxlen=window)
+
+    def update(self, memory, x, y):
+        """Như OmegaUpdater.update: giải lại cửa sổ (cùng thứ tự cột), memory không được dùng."""
+        self.buffer_x.append(x)
+        self.buffer_y.append(y)
+        X = np.stack(self.buffer_x, axis=1)  # dim x N
+        Y = np.stack(self.buffer_y, axis=1)  # mem_size x N
+        return ridge_solve(X, Y, self.reg, self.solver).astype(memory.dtype, copy=False)
+
+
+def make_updater(updater_type, window, lr, reg, updater_kwargs=None):
+    """NumPy counterpart of train.make_updater; updater_kwargs chỉ nhận 'solver' (Omega)."""
+    updater_kwargs = updater_kwargs or {}
+    if updater_type == 'Delta':
+        if updater_kwargs:
+            raise ValueError(f"numpy backend: DeltaUpdater không nhận {sorted(updater_kwargs)}")
+        return NumpyDeltaUpdater(lr=lr, reg=reg)
+    elif updater_type == 'Omega':
+        extra = set(updater_kwargs) - {'solver'}
+        if extra:
+            raise ValueError(f"numpy backend: OmegaUpdater chỉ nhận 'solver', không nhận {sorted(extra)}")
+        return NumpyOmegaUpdater(window=window, reg=reg, **updater_kwargs)
+    raise ValueError("Unknown updater type")
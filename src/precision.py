@@ -0,0 +1,42 @@
+"""
+Precision policies: which dtype tensors are stored in, computed in, and accumulated in.
+
+    storage: memory matrix and keys/values tensors
+    compute: per-step arithmetic of the updaters (predict, Delta update)
+    accum:   reductions and solves (Omega Gram/solve, metrics, attention readout);
+             never below float32 because torch.linalg has no bf16 kernels
+"""
+import torch
+
+
+class Precision:
+    def __init__(self, name, storage, compute, accum):
+        self.name = name
+        self.storage = storage
+        self.compute = compute
+        self.accum = accum
+
+    def __repr__(self):
+        return f"Precision({self.name!r}, storage={self.storage}, compute={self.compute}, accum={self.accum})"
+
+
+PRECISIONS = {
+    "fp32": Precision("fp32", torch.float32, torch.float32, torch.float32),
+    "fp64": Precision("fp64", torch.float64, torch.float64, torch.float64),
+    # bf16 cho memory lớn: nhẹ băng thông, cộng dồn/giải hệ ở fp32
+    "bf16": Precision("bf16", torch.bfloat16, torch.bfloat16, torch.float32),
+    # lưu bf16 nhưng tính từng bước ở fp32
+    "bf16_fp32": Precision("bf16_fp32", torch.bfloat16, torch.float32, torch.float32),
+}
+
+
+def get_precision(precision=None):
+    """Accept a preset name, a Precision, or None (fp32, the historical default)."""
+    if precision is None:
+        return PRECISIONS["fp32"]
+    if isinstance(precision, Precision):
+        return precision
+    try:
+        return PRECISIONS[precision]
+    except KeyError:
+        raise ValueError(f"Unknown precision {precision!r}: choose one of {sorted(PRECISIONS)}")
@@ -0,0 +1,127 @@
+"""
+Opt-in phase instrumentation for train_model.
+
+    prof = PhaseProfiler(track_allocs=True, trace_path="results/trace.json")
+    train_model(..., profiler=prof)
+    prof.columns()  # {'phase_generate_time': ..., 'phase_update_allocs': ..., ...}
+
+Phases are timed with perf_counter_ns. Allocation counters and the Chrome trace need a
+torch.profiler session, so they are only collected when track_allocs or trace_path is set;
+they count torch CPU allocations only (numpy buffers made by generate_data are not seen).
+Without a profiler, train_model uses NULL_PROFILER whose phase() is a shared no-op context.
+"""
+from collections import defaultdict
+from contextlib import nullcontext
+import time
+
+import torch
+
+PHASES = ("generate", "predict", "metrics", "update")
+COLUMN_SUFFIXES = ("time", "calls", "alloc_bytes", "allocs")
+
+
+def profile_columns(phases=PHASES):
+    """CSV column names produced by PhaseProfiler.columns() for the given phases."""
+    return [f"phase_{p}_{s}" for p in phases for s in COLUMN_SUFFIXES]
+
+
+class _Phase:
+    __slots__ = ("prof", "name", "start", "record")
+
+    def __init__(self, prof, name):
+        self.prof = prof
+        self.name = name
+        self.record = None
+
+    def __enter__(self):
+        if self.prof._session is not None:
+            self.record = torch.profiler.record_function(f"phase::{self.name}")
+            self.record.__enter__()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.prof.times_ns[self.name] += time.perf_counter_ns() - self.start
+        self.prof.calls[self.name] += 1
+        if self.record is not None:
+            self.record.__exit__(*exc)
+        return False
+
+
+class PhaseProfiler:
+    def __init__(self, track_allocs=False, trace_path=None):
+        """
+        track_allocs: đếm số lần cấp phát và số byte cấp phát của từng phase (qua torch.profiler).
+        trace_path: nếu đặt, xuất Chrome trace (mở bằng chrome://tracing hoặc Perfetto).
+        """
+        self.track_allocs = track_allocs or trace_path is not None
+        self.trace_path = trace_path
+        self.times_ns = defaultdict(int)
+        self.calls = defaultdict(int)
+        self.alloc_bytes = defaultdict(int)
+        self.allocs = defaultdict(int)
+        self._session = None
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def run(self):
+        """Context manager around a whole run; opens the torch.profiler session if needed."""
+        return _ProfiledRun(self) if self.track_allocs else nullcontext()
+
+    def _collect(self, session):
+        # cấp phát gộp của một phase = tổng self_cpu_memory_usage dương của các op con
+        def walk(evt, phase):
+            for child in evt.cpu_children:
+                if child.self_cpu_memory_usage > 0:
+                    self.alloc_bytes[phase] += child.self_cpu_memory_usage
+                    self.allocs[phase] += 1
+                walk(child, phase)
+
+        for evt in session.events():
+            if evt.name.startswith("phase::"):
+                walk(evt, evt.name[len("phase::"):])
+        if self.trace_path:
+            session.export_chrome_trace(self.trace_path)
+
+    def columns(self, phases=PHASES):
+        """Flat dict of per-phase metrics, suitable as extra CSV columns."""
+        out = {}
+        for p in phases:
+            out[f"phase_{p}_time"] = self.times_ns[p] * 1e-9
+            out[f"phase_{p}_calls"] = self.calls[p]
+            out[f"phase_{p}_alloc_bytes"] = self.alloc_bytes[p] if self.track_allocs else ""
+            out[f"phase_{p}_allocs"] = self.allocs[p] if self.track_allocs else ""
+        return out
+
+
+class _ProfiledRun:
+    def __init__(self, prof):
+        self.prof = prof
+
+    def __enter__(self):
+        session = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], profile_memory=True)
+        session.__enter__()
+        self.prof._session = session
+        return self.prof
+
+    def __exit__(self, *exc):
+        session = self.prof._session
+        self.prof._session = None
+        session.__exit__(*exc)
+        self.prof._collect(session)
+        return False
+
+
+class _NullProfiler:
+    """Stand-in used when profiling is disabled: every hook is a shared no-op."""
+    _ctx = nullcontext()
+
+    def phase(self, name):
+        return self._ctx
+
+    def run(self):
+        return self._ctx
+
+
+NULL_PROFILER = _NullProfiler()
@@ -0,0 +1,168 @@
+"""
+Per-update latency histogram and an optional streaming trace of the learning curve.
+
+    rec = StepRecorder(trace_path="results/traces/run.jsonl", trace_every=10)
+    train_model(..., recorder=rec)
+    rec.columns()   # {'update_p50': ..., 'update_p90': ..., 'update_p99': ..., 'update_max': ...}
+
+Latencies go into a LatencyHistogram: log-spaced buckets (BUCKETS_PER_OCTAVE per doubling, so a
+quantile is reported as its bucket's upper edge, at most ~4.4% high), O(1) per record (~1 us) and
+constant memory however long the run.
+The trace holds one JSON line {"step", "mse", "cos", "latency_s"} for every trace_every-th step.
+Rows are buffered in the training thread and handed over in batches to a TraceWriter thread,
+which does the JSON encoding and the file writes, so the loop itself only appends a tuple.
+"""
+import json
+import math
+import os
+import queue
+import threading
+
+BUCKETS_PER_OCTAVE = 16
+MIN_LATENCY_S = 1e-9
+LATENCY_COLUMNS = ["update_p50", "update_p90", "update_p99", "update_max"]
+TRACE_FIELDS = ("step", "mse", "cos", "latency_s")
+
+
+class LatencyHistogram:
+    def __init__(self, buckets_per_octave=BUCKETS_PER_OCTAVE, min_value=MIN_LATENCY_S):
+        self.scale = buckets_per_octave / math.log(2)
+        self.min_value = min_value
+        self.counts = []
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds):
+        i = int(math.log(max(seconds, self.min_value) / self.min_value) * self.scale)
+        if i >= len(self.counts):
+            self.counts.extend([0] * (i + 1 - len(self.counts)))
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Cận trên của bucket chứa quantile q, kẹp trong [min, max] đã quan sát (None nếu rỗng)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c:
+                upper = self.min_value * math.exp((i + 1) / self.scale)
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def summary(self, prefix="update"):
+        return {f"{prefix}_p50": self.quantile(0.5), f"{prefix}_p90": self.quantile(0.9),
+                f"{prefix}_p99": self.quantile(0.99), f"{prefix}_max": self.max if self.count else None}
+
+
+class TraceWriter:
+    """Append rows (tuples of `fields`) to a JSONL file from a background thread."""
+
+    def __init__(self, path, fields=TRACE_FIELDS, batch_size=1024):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.fields = fields
+        self.batch_size = batch_size
+        self._buf = []
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, row):
+        self._buf.append(row)
+        if len(self._buf) >= self.batch_size:
+            self._queue.put(self._buf)
+            self._buf = []
+
+    def _run(self):
+        try:
+            with open(self.path, "w") as f:
+                while True:
+                    batch = self._queue.get()
+                    if batch is None:
+                        return
+                    f.write("".join(json.dumps(dict(zip(self.fields, row))) + "\n" for row in batch))
+        except Exception as exc:
+            self._error = exc
+            # xả hàng đợi để write()/close() không bị treo
+            while self._queue.get() is not None:
+                pass
+
+    def close(self):
+        if self._thread is None:
+            return
+        if self._buf:
+            self._queue.put(self._buf)
+            self._buf = []
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            raise self._error
+
+
+class StepRecorder:
+    def __init__(self, trace_path=None, trace_every=1):
+        """
+        trace_path: file JSONL nhận một dòng mỗi trace_every bước (None: chỉ giữ histogram).
+        """
+        if trace_every < 1:
+            raise ValueError("trace_every phải >= 1")
+        self.latency = LatencyHistogram()
+        self.trace_every = trace_every
+        self.writer = TraceWriter(trace_path) if trace_path else None
+        self._pending = []
+
+    def step(self, i, seconds, mse=None, cos=None):
+        """
+        Bước i (đếm từ 0) mất `seconds` cho update. mse/cos None (deferred_metrics): dòng trace được
+        giữ lại tới khi fill_metrics() nhận metrics của cả chuỗi.
+        """
+        self.latency.record(seconds)
+        if self.writer is not None and (i + 1) % self.trace_every == 0:
+            if mse is None:
+                self._pending.append((i, seconds))
+            else:
+                self.writer.write((i + 1, mse, cos, seconds))
+
+    def fill_metrics(self, mse, cos):
+        """mse, cos: per-step sequences (indexable by step) for rows recorded without metrics."""
+        for i, seconds in self._pending:
+            self.writer.write((i + 1, float(mse[i]), float(cos[i]), seconds))
+        self._pending = []
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def columns(self):
+        """Flat dict of latency quantiles (seconds), suitable as extra CSV columns."""
+        return self.latency.summary()
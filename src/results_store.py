@@ -0,0 +1,191 @@
+"""
+Append-only experiment results store on SQLite (stdlib, no server).
+
+    store = ResultsStore("results/exp_results.sqlite", key_fields=CONFIG_FIELDS)
+    store.add(rows)                                    # list of dicts, one transaction
+    store.query(columns=["updater", "mse_mean"], where={"window": [5, 10]})
+    store.query(group_by=["updater"], agg={"mse_mean": "avg", "update_time": "max"})
+
+Each row is keyed by config_hash = sha256 of its key_fields, so re-adding a config that is
+already stored is a no-op (INSERT OR IGNORE). Columns are created on first use (ALTER TABLE
+ADD COLUMN), so adding metrics such as the phase_* profile columns needs no migration. Every key
+field gets an index, and filters, grouping and aggregates run inside SQLite. A query reads only
+the columns it asks for.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+TABLE = "results"
+AGGREGATES = {"avg", "min", "max", "sum", "count"}
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _ident(name):
+    if not _IDENT.match(name):
+        raise ValueError(f"Invalid column name {name!r}")
+    return f'"{name}"'
+
+
+def _sql_type(value):
+    if isinstance(value, bool) or isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    return "TEXT"
+
+
+def parse_value(text):
+    """CSV string -> int, float or str (chuỗi rỗng thành None)."""
+    if text is None or text == "":
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+class ResultsStore:
+    def __init__(self, path, key_fields):
+        """
+        path: file SQLite (tạo mới nếu chưa có).
+        key_fields: các cột xác định một cấu hình; config_hash được tính trên chúng và mỗi cột có index.
+        """
+        self.path = path
+        self.key_fields = list(key_fields)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} (config_hash TEXT PRIMARY KEY)")
+        self._columns = self._read_columns()
+
+    def _read_columns(self):
+        return [r[1] for r in self.conn.execute(f"PRAGMA table_info({TABLE})")]
+
+    def columns(self):
+        return list(self._columns)
+
+    def config_hash(self, row):
+        payload = json.dumps([[k, row[k]] for k in self.key_fields])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _ensure_columns(self, row):
+        for name, value in row.items():
+            if name in self._columns:
+                continue
+            self.conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN {_ident(name)} {_sql_type(value)}")
+            if name in self.key_fields:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {_ident('idx_' + name)} ON {TABLE} ({_ident(name)})")
+            self._columns.append(name)
+
+    def add(self, rows):
+        """Insert rows (dicts) in one transaction; rows whose config is already stored are skipped.
+        Returns the number of rows actually inserted."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        inserted = 0
+        with self.conn:
+            for row in rows:
+                self._ensure_columns(row)
+            # gom các dòng cùng tập cột để dùng executemany
+            groups = {}
+            for row in rows:
+                groups.setdefault(tuple(row), []).append(row)
+            for names, group in groups.items():
+                cols = ", ".join(["config_hash"] + [_ident(n) for n in names])
+                marks = ", ".join("?" * (len(names) + 1))
+                cur = self.conn.executemany(
+                    f"INSERT OR IGNORE INTO {TABLE} ({cols}) VALUES ({marks})",
+                    [[self.config_hash(r)] + [r[n] for n in names] for r in group])
+                inserted += cur.rowcount
+        return inserted
+
+    def __len__(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+    def _where(self, where):
+        clauses, params = [], []
+        for name, value in (where or {}).items():
+            if isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append(f"{_ident(name)} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            elif value is None:
+                clauses.append(f"{_ident(name)} IS NULL")
+            else:
+                clauses.append(f"{_ident(name)} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def query(self, columns=None, where=None, group_by=None, agg=None, order_by=None):
+        """
+        columns: cột cần đọc (mặc định: group_by nếu có, ngược lại mọi cột trừ config_hash).
+        where: {cột: giá trị | list giá trị}.
+        group_by + agg: {cột: 'avg'|'min'|'max'|'sum'|'count'} -> cột kết quả '<cột>_<agg>'.
+        Returns list of dicts.
+        """
+        group_by = list(group_by or [])
+        if columns is None:
+            columns = group_by if (group_by or agg) else [c for c in self._columns if c != "config_hash"]
+        select = [_ident(c) for c in columns]
+        names = list(columns)
+        for name, fn in (agg or {}).items():
+            if fn not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate {fn!r}: choose one of {sorted(AGGREGATES)}")
+            select.append(f"{fn.upper()}({_ident(name)})")
+            names.append(f"{name}_{fn}")
+        if not select:
+            return []
+        missing = [c for c in list(columns) + list(agg or {}) + group_by + list(where or {})
+                   if c not in self._columns]
+        if missing:
+            # cột chưa từng được ghi: chưa có dòng nào thoả mãn
+            return []
+        sql = f"SELECT {', '.join(select)} FROM {TABLE}"
+        where_sql, params = self._where(where)
+        sql += where_sql
+        if group_by:
+            sql += " GROUP BY " + ", ".join(_ident(c) for c in group_by)
+        if order_by:
+            sql += " ORDER BY " + ", ".join(_ident(c) for c in order_by)
+        return [dict(zip(names, r)) for r in self.conn.execute(sql, params)]
+
+    def query_df(self, **kwargs):
+        """query() as a pandas DataFrame (pandas is optional, imported on use)."""
+        import pandas as pd
+        return pd.DataFrame(self.query(**kwargs))
+
+    def done(self):
+        """Set of key_fields tuples already stored (đọc riêng các cột khoá)."""
+        if any(k not in self._columns for k in self.key_fields):
+            return set()
+        cols = ", ".join(_ident(k) for k in self.key_fields)
+        return set(self.conn.execute(f"SELECT {cols} FROM {TABLE}"))
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {TABLE}")
+
+    def import_csv(self, csv_path, batch=10000):
+        """Append the rows of an existing results CSV (strings converted by parse_value)."""
+        total = 0
+        with open(csv_path, newline="") as f:
+            buf = []
+            for row in csv.DictReader(f):
+                buf.append({k: parse_value(v) for k, v in row.items() if k})
+                if len(buf) >= batch:
+                    total += self.add(buf)
+                    buf = []
+            total += self.add(buf)
+        return total
+
+    def close(self):
+        self.conn.close()
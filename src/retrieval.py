@@ -0,0 +1,247 @@
+"""
+Approximate top-k attention readout over large memories with an IVF (inverted file) index.
+
+    index = IVFIndex(memory, n_probe=8, k=32)   # k-means over the memory rows, one inverted list each
+    recon = index.reconstruct(keys)             # softmax over the k best candidate rows only
+    index.refresh(memory)                       # after updater steps: reassign rows, keep centroids
+    index.rebuild(memory)                       # or re-cluster from scratch
+
+Exact readout (src.eval.reconstruct_values_from_memory) scores every one of the M rows per key,
+O(M * D). Here a key is first scored against the n_lists centroids, the n_probe best lists are
+scanned (about n_probe * M / n_lists rows), and the softmax / weighted sum run over the top-k of
+those rows. Rows outside the top-k get zero weight, so the result is an approximation whose
+quality report() / `python -m src.retrieval` measure against the exact path (recall of the exact
+top-k rows and error of the readout) together with the speed-up, to choose k and n_probe.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+
+from src.eval import reconstruct_values_from_memory
+
+
+def kmeans(rows, n_clusters, n_iter=10, sample=256, seed=0):
+    """
+    Lloyd k-means trên tối đa sample * n_clusters dòng lấy ngẫu nhiên (như faiss).
+    Returns centroids (n_clusters, D). Cụm rỗng được gieo lại bằng một dòng ngẫu nhiên.
+    """
+    g = torch.Generator().manual_seed(seed)
+    M = rows.shape[0]
+    if M > sample * n_clusters:
+        rows = rows[torch.randperm(M, generator=g)[:sample * n_clusters]]
+    centroids = rows[torch.randperm(rows.shape[0], generator=g)[:n_clusters]].clone()
+    for _ in range(n_iter):
+        assign = _nearest(rows, centroids)
+        sums = torch.zeros_like(centroids).index_add_(0, assign, rows)
+        counts = torch.bincount(assign, minlength=n_clusters)
+        empty = counts == 0
+        centroids = sums / counts.clamp(min=1).unsqueeze(1).to(rows.dtype)
+        if empty.any():
+            centroids[empty] = rows[torch.randint(rows.shape[0], (int(empty.sum()),), generator=g)]
+    return centroids
+
+
+def _nearest(rows, centroids, chunk=65536):
+    # argmin ||x - c||^2 = argmin (||c||^2 - 2 x.c), theo chunk để (chunk x n_lists) không quá lớn
+    c_norm = (centroids * centroids).sum(dim=1)
+    out = torch.empty(rows.shape[0], dtype=torch.long)
+    for s in range(0, rows.shape[0], chunk):
+        out[s:s + chunk] = torch.argmin(c_norm - 2 * rows[s:s + chunk] @ centroids.T, dim=1)
+    return out
+
+
+class IVFIndex:
+    def __init__(self, memory, n_lists=None, n_probe=8, k=32, n_iter=10, seed=0):
+        """
+        memory: (M, D) các dòng được đánh chỉ mục (cũng là values của readout).
+        n_lists: số cụm / inverted list (mặc định ~sqrt(M)); n_probe: số list quét mỗi key;
+        k: số dòng ứng viên tốt nhất đưa vào softmax.
+        """
+        self.n_probe = n_probe
+        self.k = k
+        self.n_iter = n_iter
+        self.seed = seed
+        self._n_lists = n_lists
+        self.rebuild(memory)
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    def rebuild(self, memory=None):
+        """Chạy lại k-means trên memory (mặc định memory hiện tại) và dựng lại các list."""
+        memory = self.memory if memory is None else memory
+        M = memory.shape[0]
+        n_lists = min(M, self._n_lists or max(1, int(round(math.sqrt(M)))))
+        self.centroids = kmeans(memory, n_lists, self.n_iter, seed=self.seed)
+        self._set_lists(memory, _nearest(memory, self.centroids))
+        return self
+
+    def refresh(self, memory, rows=None, recenter=False):
+        """
+        Cập nhật index sau các bước updater mà không chạy lại k-means.
+        rows: chỉ số các dòng đã đổi (mặc định: mọi dòng, như sau một bước Delta/Omega);
+            các dòng khác giữ list cũ.
+        recenter: đặt mỗi centroid về trung bình các dòng của nó trước khi gán lại (một bước Lloyd),
+            để centroid theo kịp memory trôi dần.
+        """
+        if memory.shape != self.memory.shape:
+            raise ValueError("refresh cần memory cùng shape; dùng rebuild() khi số dòng thay đổi")
+        if recenter:
+            sums = torch.zeros_like(self.centroids).index_add_(0, self.assign, memory)
+            counts = torch.bincount(self.assign, minlength=self.n_lists)
+            keep = counts > 0
+            self.centroids[keep] = sums[keep] / counts[keep].unsqueeze(1).to(memory.dtype)
+        assign = self.assign.clone()
+        if rows is None or recenter:
+            assign = _nearest(memory, self.centroids)
+        else:
+            rows = torch.as_tensor(rows, dtype=torch.long)
+            assign[rows] = _nearest(memory[rows], self.centroids)
+        self._set_lists(memory, assign)
+        return self
+
+    def _set_lists(self, memory, assign):
+        # index giữ bản sao các dòng, sắp theo list để mỗi list là một đoạn liên tục (một GEMM khi
+        # quét); memory bị sửa tại chỗ chỉ được thấy sau refresh()/rebuild()
+        self.assign = assign
+        self.order = torch.argsort(assign, stable=True)
+        counts = torch.bincount(assign, minlength=self.n_lists)
+        self.offsets = torch.cat([counts.new_zeros(1), torch.cumsum(counts, 0)]).tolist()
+        # thêm một dòng 0 ở cuối làm ô đệm cho các chỗ thiếu ứng viên
+        self._rows = torch.cat([memory, memory.new_zeros(1, memory.shape[1])])
+        self.memory = self._rows[:-1]
+        self._sorted = self.memory[self.order]
+
+    def search(self, keys, k=None, n_probe=None, query_chunk=4096):
+        """
+        keys: (N, D) -> (scores (N, k) của key.row, chỉ số dòng (N, k)); ô thiếu ứng viên có
+        score -inf và chỉ số M.
+        Các key được gom theo list chúng probe, nên mỗi list chỉ cần một GEMM (keys x dòng của list)
+        rồi lấy top-k cục bộ; top-k cuối cùng chọn trong n_probe * k ứng viên của mỗi key.
+        """
+        k = k or self.k
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        keys = keys.to(self.memory.dtype)
+        M = self.memory.shape[0]
+        scores = keys.new_empty(keys.shape[0], k)
+        ids = torch.empty(keys.shape[0], k, dtype=torch.long)
+        for s in range(0, keys.shape[0], query_chunk):
+            q = keys[s:s + query_chunk]
+            n = q.shape[0]
+            probes = torch.topk(q @ self.centroids.T.to(q.dtype), n_probe, dim=1).indices  # (n, n_probe)
+            cand_sc = q.new_full((n, n_probe, k), float('-inf'))
+            cand_id = torch.full((n, n_probe, k), M, dtype=torch.long)
+            flat = probes.reshape(-1)
+            by_list = torch.argsort(flat, stable=True)
+            bounds = torch.searchsorted(flat[by_list], torch.arange(self.n_lists + 1)).tolist()
+            for l in range(self.n_lists):
+                lo, hi = self.offsets[l], self.offsets[l + 1]
+                if bounds[l] == bounds[l + 1] or lo == hi:
+                    continue
+                hit = by_list[bounds[l]:bounds[l + 1]]
+                qi, slot = hit // n_probe, hit % n_probe
+                sc = q[qi] @ self._sorted[lo:hi].T                                   # (hits, len)
+                kk = min(k, hi - lo)
+                top = torch.topk(sc, kk, dim=1)
+                cand_sc[qi, slot, :kk] = top.values
+                cand_id[qi, slot, :kk] = self.order[lo + top.indices]
+            top = torch.topk(cand_sc.reshape(n, -1), k, dim=1)
+            scores[s:s + n] = top.values
+            ids[s:s + n] = cand_id.reshape(n, -1).gather(1, top.indices)
+        return scores, ids
+
+    def reconstruct(self, keys, k=None, n_probe=None):
+        """keys: (N, D) -> recon (N, D) = softmax(top-k logits / sqrt(D)) @ các dòng tương ứng."""
+        scores, ids = self.search(keys, k, n_probe)
+        D = self.memory.shape[1]
+        # ô đệm (score -inf) có trọng số 0; key chỉ probe trúng list rỗng cho recon bằng 0
+        attn = torch.nan_to_num(F.softmax(scores / math.sqrt(D), dim=1))
+        return torch.bmm(attn.unsqueeze(1), self._rows[ids]).squeeze(1)
+
+
+def report(memory, keys, ks=(8, 32, 128), n_probes=(1, 4, 16), n_lists=None, repeat=3):
+    """
+    So sánh IVFIndex với readout chính xác trên cùng các keys, với mỗi (k, n_probe):
+    recall (tỉ lệ top-k chính xác theo logits được tìm thấy), mse/cos của recon so với recon chính xác,
+    thời gian (median của repeat lần) và speedup. Returns list of dicts (dòng đầu là 'exact').
+    """
+    def timed(fn):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = fn()
+            samples.append(time.perf_counter() - start)
+        return out, sorted(samples)[len(samples) // 2]
+
+    build_start = time.perf_counter()
+    index = IVFIndex(memory, n_lists=n_lists)
+    build_s = time.perf_counter() - build_start
+    exact, exact_s = timed(lambda: reconstruct_values_from_memory(memory, keys))
+    rows = [{"k": None, "n_probe": None, "recall": 1.0, "mse": 0.0, "cos": 1.0, "time_s": exact_s,
+             "speedup": 1.0, "method": "exact"}]
+    for k in ks:
+        true_top = _exact_topk(memory, keys, k)
+        for n_probe in n_probes:
+            approx, t = timed(lambda: index.reconstruct(keys, k, n_probe))
+            ids = index.search(keys, k, n_probe)[1]
+            hits = (ids.unsqueeze(2) == true_top.unsqueeze(1)).any(dim=1).double().mean().item()
+            rows.append({"k": k, "n_probe": n_probe, "recall": hits,
+                         "mse": ((approx - exact) ** 2).mean().item(),
+                         "cos": F.cosine_similarity(approx, exact, dim=1).double().mean().item(),
+                         "time_s": t, "speedup": exact_s / t, "method": "ivf"})
+    for r in rows:
+        r.update(n_lists=index.n_lists, build_s=build_s)
+    return rows
+
+
+def _exact_topk(memory, keys, k, chunk=1024):
+    out = []
+    for s in range(0, keys.shape[0], chunk):
+        out.append(torch.topk(keys[s:s + chunk].to(memory.dtype) @ memory.T, min(k, memory.shape[0]), dim=1).indices)
+    return torch.cat(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall / accuracy vs speed of IVF top-k readout against the exact path")
+    parser.add_argument("--mem_size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--n_queries", type=int, default=1000)
+    parser.add_argument("--n_lists", type=int, default=None)
+    parser.add_argument("--ks", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--n_probes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--clusters", type=int, default=256,
+                        help="synthetic memory rows are drawn around this many centres (0 = plain Gaussian)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join("results", "retrieval_report.json"))
+    args = parser.parse_args(argv)
+
+    g = torch.Generator().manual_seed(args.seed)
+    if args.clusters:
+        centres = torch.randn(args.clusters, args.dim, generator=g) * 2
+        memory = centres[torch.randint(args.clusters, (args.mem_size,), generator=g)]
+        memory = memory + torch.randn(args.mem_size, args.dim, generator=g)
+    else:
+        memory = torch.randn(args.mem_size, args.dim, generator=g)
+    # key là dòng memory có nhiễu, như khi đọc lại một cặp đã ghi
+    probe = torch.randint(args.mem_size, (args.n_queries,), generator=g)
+    keys = memory[probe] + 0.1 * torch.randn(args.n_queries, args.dim, generator=g)
+    rows = report(memory, keys, args.ks, args.n_probes, args.n_lists)
+    for r in rows:
+        print(f"{r['method']:5s} k={r['k']!s:>4} n_probe={r['n_probe']!s:>3} recall={r['recall']:.3f} "
+              f"mse={r['mse']:.2e} cos={r['cos']:.4f} time={r['time_s']:.3e}s speedup=x{r['speedup']:.1f}")
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"params": vars(args), "results": rows}, f, indent=2)
+    print("Saved", args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
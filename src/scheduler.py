@@ -0,0 +1,115 @@
+"""
+Adaptive sweeps: successive halving and Hyperband over a fixed grid of arms.
+
+    log = DecisionLog("results/exp_results_decisions.jsonl")
+    survivors = successive_halving(arms, evaluate, budgets=[111, 333, 1000], seeds=[0, 1, 2], eta=3, log=log)
+
+An arm is one point of the grid minus its budget and seed (a dict, e.g. updater/window/lr/reg).
+evaluate(arms, budget, seeds) runs every arm at that budget on those seeds and returns, per arm,
+the list of per-seed scores (lower is better; mse_mean in exp_runner). Rung i runs the surviving
+arms at budgets[i] with the first n_i seeds (n_i grows by eta per rung up to all seeds on the
+last rung), then keeps the best ceil(n / eta). An arm whose score is not finite on any seed
+(NaN/inf MSE or memory norm, e.g. a run stopped by train_model(stop_nonfinite=True)) is dropped
+at once. Every score and decision goes to the DecisionLog, so each row missing from the full
+budget can be traced to the rung, score and rank that stopped it.
+
+hyperband splits the arms round-robin over brackets that start at successively larger budgets
+(the most aggressive bracket starts at budgets[0], the last one runs its arms at the full
+budget only), as a hedge against a short budget misranking arms whose curves cross late.
+"""
+import json
+import math
+import os
+
+
+class DecisionLog:
+    """Bản ghi các quyết định (dict); ghi thêm từng dòng JSON vào path nếu có."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = []
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # mỗi lần sweep một log mới: log cũ không còn khớp với các quyết định lần này
+            open(path, "w").close()
+
+    def add(self, **entry):
+        self.entries.append(entry)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def rung_budgets(min_budget, max_budget, eta=3):
+    """[max / eta^k, ..., max / eta, max] với phần tử đầu >= min_budget (số nguyên, tăng dần)."""
+    if eta < 2:
+        raise ValueError("eta phải >= 2")
+    if not 1 <= min_budget <= max_budget:
+        raise ValueError("cần 1 <= min_budget <= max_budget")
+    budgets = [int(max_budget)]
+    while budgets[-1] // eta >= min_budget:
+        budgets.append(budgets[-1] // eta)
+    return budgets[::-1]
+
+
+def _seed_counts(n_rungs, n_seeds, eta):
+    # rung cuối dùng mọi seed, mỗi rung trước đó ít hơn eta lần (ít nhất 1)
+    return [max(1, math.ceil(n_seeds / eta ** (n_rungs - 1 - i))) for i in range(n_rungs)]
+
+
+def _score(values):
+    if not values or not all(math.isfinite(v) for v in values):
+        return math.nan
+    return sum(values) / len(values)
+
+
+def successive_halving(arms, evaluate, budgets, seeds, eta=3, log=None, bracket=0):
+    """
+    arms: list of arm dicts; budgets: increasing budgets, one per rung; seeds: all seeds.
+    Returns the arms that reached the last rung as (arm, score) sorted by score.
+    """
+    log = log if log is not None else DecisionLog()
+    alive = list(arms)
+    survivors = []
+    counts = _seed_counts(len(budgets), len(seeds), eta)
+    for rung, (budget, n_seeds) in enumerate(zip(budgets, counts)):
+        if not alive:
+            break
+        last = rung == len(budgets) - 1
+        rung_seeds = list(seeds[:n_seeds])
+        scores = [_score(list(v)) for v in evaluate(alive, budget, rung_seeds)]
+        finite = sorted((s, i) for i, s in enumerate(scores) if math.isfinite(s))
+        keep = len(finite) if last else max(1, math.ceil(len(finite) / eta))
+        rank = {i: r for r, (_, i) in enumerate(finite)}
+        for i, (arm, score) in enumerate(zip(alive, scores)):
+            if i not in rank:
+                decision = "diverged"
+            elif last:
+                decision = "final"
+            else:
+                decision = "promote" if rank[i] < keep else "stop"
+            log.add(bracket=bracket, rung=rung, budget=budget, n_seeds=n_seeds, arm=arm,
+                    score=score if math.isfinite(score) else None, rank=rank.get(i),
+                    n_alive=len(alive), n_kept=keep, decision=decision)
+        survivors = [(alive[i], s) for s, i in finite[:keep]]
+        alive = [arm for arm, _ in survivors]
+    return survivors
+
+
+def hyperband(arms, evaluate, budgets, seeds, eta=3, log=None):
+    """
+    Bracket b (b = 0 .. len(budgets)-1) chạy successive_halving trên budgets[b:] với các arm
+    arms[b::len(budgets)]. Returns the union of the brackets' survivors sorted by score.
+    """
+    log = log if log is not None else DecisionLog()
+    n = len(budgets)
+    survivors = []
+    for b in range(n):
+        survivors += successive_halving(arms[b::n], evaluate, budgets[b:], seeds, eta, log, bracket=b)
+    return sorted(survivors, key=lambda t: t[1])
+
+
+def budget_usage(log, n_arms, max_budget, n_seeds):
+    """(budget·seed đã chạy, budget·seed của lưới đầy đủ) từ các quyết định trong log."""
+    spent = sum(e["budget"] * e["n_seeds"] for e in log.entries)
+    return spent, n_arms * max_budget * n_seeds
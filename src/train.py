@@ -1,51 +1,585 @@
+import math
 import torch
 import time
+import numpy as np
 from src.data import generate_data
-from src.updaters import DeltaUpdater, OmegaUpdater
+from src.updaters import DeltaUpdater, OmegaUpdater, MultiWindowOmega, omega_offline, ridge_solve
+from src.profiling import NULL_PROFILER
+from src.precision import get_precision
+from src.lowrank import LowRankMemory
+from src.fused import get_scan
+from src import numpy_backend
 
-def train_model(mem_size, dim, window, steps, lr, reg, seed, updater_type):
+# vòng lặp deferred/NumPy không có mse từng bước: stop_nonfinite kiểm tra memory sau mỗi chừng này bước
+NONFINITE_CHECK_EVERY = 32
+
+def load_data(mem_size, dim, window, steps, seed, data_cache=None, dtype=torch.float32, version=1,
+              backend='torch'):
+    """
+    generate_data với tham số của train_model; dùng DatasetCache nếu được truyền vào.
+    Cache luôn lưu float32, nên dtype khác được ép kiểu sau khi đọc.
+    backend: 'torch' (tensor) hoặc 'numpy' (np.ndarray, cùng giá trị).
+    """
+    params = dict(mem_size=mem_size, dim=dim, steps=steps, seed=seed, window=window, alpha=0.95, version=version)
+    if data_cache is not None:
+        keys, values = data_cache.get_or_generate(**params)
+        keys, values = keys.to(dtype), values.to(dtype)
+        return (keys.numpy(), values.numpy()) if backend == 'numpy' else (keys, values)
+    return generate_data(dtype=dtype, backend=backend, **params)
+
+def make_updater(updater_type, window, lr, reg, updater_kwargs=None, precision=None):
+    """Khởi tạo đối tượng updater tương ứng với updater_type ('Delta' hoặc 'Omega')."""
+    updater_kwargs = updater_kwargs or {}
+    if updater_type == 'Delta':
+        return DeltaUpdater(lr=lr, reg=reg, precision=precision, **updater_kwargs)
+    elif updater_type == 'Omega':
+        return OmegaUpdater(window=window, reg=reg, precision=precision, **updater_kwargs)
+    raise ValueError("Unknown updater type")
+
+def step_metrics(preds, values, accum_dtype=None):
+    """
+    MSE và cosine của từng bước, vector hoá. preds, values: (steps, mem_size);
+    cosine = 0 ở những bước có norm bằng 0 (như vòng lặp gốc).
+    accum_dtype: dtype dùng để tính metrics (mặc định dtype của preds).
+    Returns (mse, cos) tensors of shape (steps,)
+    """
+    if accum_dtype is not None:
+        preds = preds.to(accum_dtype)
+        values = values.to(accum_dtype)
+    mse = ((preds - values) ** 2).mean(dim=1)
+    norm_pred = torch.norm(preds, dim=1)
+    norm_y = torch.norm(values, dim=1)
+    cos = (preds * values).sum(dim=1) / (norm_pred * norm_y)
+    cos = torch.where((norm_pred > 0) & (norm_y > 0), cos, torch.zeros_like(cos))
+    return mse, cos
+
+def stream_metrics(preds, values, accum_dtype=None):
+    """
+    MSE và cosine trung bình cho cả chuỗi dự đoán trong một lần tính vector hoá (xem step_metrics).
+    Returns (mse_mean, cos_mean) as python floats
+    """
+    mse, cos = step_metrics(preds, values, accum_dtype)
+    steps = preds.shape[0]
+    return mse.double().sum().item() / steps, cos.double().sum().item() / steps
+
+def train_model(mem_size, dim, window, steps, lr, reg, seed, updater_type, updater_kwargs=None,
+                data_cache=None, deferred_metrics=False, chunk_size=None, offline=False, profiler=None,
+                precision=None, rank=None, data=None, checkpoints=None, data_version=1, data_window=None,
+                fused=None, recorder=None, backend='torch', stop_nonfinite=False):
     """
     Train a memory model on synthetic key-value data using specified updater.
+    updater_kwargs: tham số bổ sung cho updater, ví dụ {'incremental': True} cho Omega.
+    data_cache: src.datasets.cache.DatasetCache tuỳ chọn, dùng lại dữ liệu đã sinh giữa các run.
+    deferred_metrics: vòng lặp chỉ ghi dự đoán vào buffer (steps, mem_size) có sẵn, không gọi
+        .item() ở mỗi bước; MSE/cosine được tính một lần ở cuối bằng stream_metrics và thời gian
+        cập nhật đo bằng perf_counter_ns.
+    chunk_size: chỉ cho Delta; xử lý chunk_size mẫu mỗi lần bằng DeltaUpdater.update_chunk
+        (cùng memory và dự đoán như từng bước), metrics tính như deferred_metrics.
+    offline: chỉ cho Omega; vì toàn bộ chuỗi đã biết trước, giải mọi cửa sổ cùng lúc bằng
+        omega_offline (chunk_size, nếu có, là số cửa sổ mỗi lần giải batched).
+        update_time khi đó là thời gian của lời giải offline.
+    profiler: src.profiling.PhaseProfiler tuỳ chọn; đo các phase generate/predict/metrics/update
+        (đọc kết quả bằng profiler.columns()). Mặc định không đo gì.
+    precision: tên preset ('fp32', 'fp64', 'bf16', 'bf16_fp32') hoặc src.precision.Precision.
+        Dữ liệu và memory lưu ở storage dtype, updater tính ở compute dtype, lời giải của Omega
+        và metrics ở accum dtype. Mặc định 'fp32' (như trước).
+    rank: nếu đặt, memory là src.lowrank.LowRankMemory (U V^T, hạng tối đa rank) thay cho ma trận
+        dày: dự đoán và cập nhật tốn O(rank * (mem_size + dim)) mỗi bước. Delta bị cắt về hạng
+        rank (xấp xỉ), Omega chính xác khi window <= rank. Không dùng cùng chunk_size/offline.
+    data: iterator tuỳ chọn các chunk (keys, values), vd. src.data.stream_data(...) (có thể bọc
+        bằng src.data.prefetch); khi đó không sinh dữ liệu trong hàm, chỉ giữ một chunk trong bộ nhớ
+        và dừng sau `steps` bước (steps=None: chạy hết iterator). Metrics tính theo từng chunk như
+        deferred_metrics; chunk_size (Delta) vẫn dùng update_chunk bên trong mỗi chunk.
+    checkpoints: list số bước n; chạy một lần tới max(checkpoints) (steps=None hoặc >= max) và
+        trả về metrics của n bước đầu tại mỗi checkpoint. Với data_version=3 (generate_data
+        prefix-stable) kết quả tại n đúng bằng một lần chạy riêng với steps=n.
+        Không dùng cùng offline hoặc data.
+    data_version: version của generate_data (1 mặc định; 3 là prefix-stable).
+    data_window: window dùng để sinh dữ liệu (mặc định bằng window của updater), để so sánh
+        các window của updater trên cùng một dữ liệu (xem train_model_multiwindow).
+    fused: None (vòng lặp thường) hoặc backend của src.fused: 'auto', 'compile', 'script', 'eager'.
+        Mỗi bước dự đoán + metrics + cập nhật chạy trong một kernel đã biên dịch (cache theo shape,
+        tự lùi về backend kế tiếp nếu không biên dịch được); metrics giống vòng lặp thường (Omega
+        sai khác làm tròn), update_time là thời gian của cả bước fused. Chỉ cho precision có
+        storage = compute = accum (fp32, fp64), không dùng cùng updater_kwargs, chunk_size,
+        offline, rank hoặc data.
+    recorder: src.recorder.StepRecorder tuỳ chọn; ghi độ trễ của từng lần update vào histogram
+        (đọc p50/p90/p99/max bằng recorder.columns()) và, nếu có trace_path, mse/cos/độ trễ của
+        mỗi trace_every bước ra JSONL. Chỉ cho vòng lặp từng bước (thường hoặc deferred_metrics);
+        train_model không đóng recorder (gọi recorder.close() sau khi xong).
+    backend: 'torch' (mặc định), 'numpy' hoặc 'auto' (src.numpy_backend). 'numpy' chạy vòng lặp
+        từng bước trên mảng NumPy với buffer cấp phát sẵn, tránh chi phí dispatch của torch ở shape nhỏ; metrics
+        tính ở cuối như deferred_metrics và giống đường torch tới sai số làm tròn float32 (BLAS của
+        NumPy cộng matvec theo thứ tự khác), nên chỉ dùng khi được yêu cầu: kết quả của hai backend
+        không trộn lẫn được dưới cùng một config_key. 'auto' chọn 'numpy' khi mem_size * dim <=
+        numpy_backend.SMALL_SHAPE_LIMIT và run dùng được nó: precision fp32/fp64, không rank,
+        chunk_size, offline, fused hoặc data, updater_kwargs chỉ có 'solver'. Các trường hợp còn lại
+        (và mọi shape lớn) chạy đường torch như trước.
+    stop_nonfinite: dừng run sớm khi MSE hoặc memory không còn hữu hạn (phân kỳ). Vòng lặp thường
+        kiểm tra mse mỗi bước, deferred_metrics / backend NumPy kiểm tra memory mỗi
+        NONFINITE_CHECK_EVERY bước. Metrics trả về là của các bước đã chạy (mse_mean hoặc
+        mem_norm_change khi đó không hữu hạn); checkpoint sau điểm dừng nhận (nan, nan, update_time, nan).
+        Chỉ cho vòng lặp từng bước (không cùng chunk_size, offline, fused hoặc data).
     Returns metrics: mse_mean, cos_mean, update_time, mem_norm_change
+        (với checkpoints: list các tuple như vậy, theo thứ tự checkpoint tăng dần)
     """
-    # Sinh dữ liệu tổng hợp
-    keys, values = generate_data(mem_size=mem_size, dim=dim, steps=steps, seed=seed, window=window, alpha=0.95)
+    cps = None
+    if checkpoints:
+        cps = sorted(set(int(n) for n in checkpoints))
+        if steps is None:
+            steps = cps[-1]
+        if cps[0] < 1 or cps[-1] > steps:
+            raise ValueError("checkpoints phải nằm trong [1, steps]")
+        if offline or data is not None:
+            raise ValueError("checkpoints không dùng được cùng offline hoặc data")
+        steps = cps[-1]
+    prof = profiler or NULL_PROFILER
+    with prof.run():
+        return _train(prof, mem_size, dim, window, steps, lr, reg, seed, updater_type, updater_kwargs,
+                      data_cache, deferred_metrics, chunk_size, offline, get_precision(precision), rank, data,
+                      cps, data_version, data_window or window, fused, recorder, backend, stop_nonfinite)
+
+def _use_numpy(backend, mem_size, dim, p, updater_kwargs, chunk_size, offline, rank, data, fused):
+    """Chạy run này bằng src.numpy_backend không (xem tham số backend của train_model)."""
+    if numpy_backend.select_backend(backend, mem_size, dim) != 'numpy':
+        return False
+    eligible = (p.storage == p.compute == p.accum and p.storage in (torch.float32, torch.float64)
+                and not (chunk_size or offline or rank or fused) and data is None
+                and set(updater_kwargs or ()) <= {'solver'})
+    if not eligible and backend == 'numpy':
+        raise ValueError("backend 'numpy' cần precision fp32/fp64 và không dùng được cùng rank, chunk_size, "
+                         "offline, fused, data hoặc updater_kwargs khác 'solver'")
+    return eligible
+
+def _train(prof, mem_size, dim, window, steps, lr, reg, seed, updater_type, updater_kwargs,
+           data_cache, deferred_metrics, chunk_size, offline, p, rank, data, cps, data_version, data_window,
+           fused=None, recorder=None, backend='torch', stop_nonfinite=False):
+    if recorder is not None and (chunk_size or offline or fused or data is not None):
+        raise ValueError("recorder chỉ dùng được với vòng lặp từng bước, không cùng chunk_size, "
+                         "offline, fused hoặc data")
+    if stop_nonfinite and (chunk_size or offline or fused or data is not None):
+        raise ValueError("stop_nonfinite chỉ dùng được với vòng lặp từng bước, không cùng chunk_size, "
+                         "offline, fused hoặc data")
+    if fused and (updater_kwargs or chunk_size or offline or rank or data is not None
+                  or not p.storage == p.compute == p.accum):
+        raise ValueError("fused cần precision fp32/fp64 và không dùng được cùng updater_kwargs, "
+                         "chunk_size, offline, rank hoặc data")
+    if _use_numpy(backend, mem_size, dim, p, updater_kwargs, chunk_size, offline, rank, data, fused):
+        with prof.phase('generate'):
+            keys, values = load_data(mem_size, dim, data_window, steps, seed, data_cache, dtype=p.storage,
+                                     version=data_version, backend='numpy')
+        updater = numpy_backend.make_updater(updater_type, window, lr, reg, updater_kwargs)
+        return _train_numpy(prof, keys, values, steps, updater, cps, recorder, p, stop_nonfinite)
+    if data is None:
+        # Sinh dữ liệu tổng hợp
+        with prof.phase('generate'):
+            keys, values = load_data(mem_size, dim, data_window, steps, seed, data_cache, dtype=p.storage,
+                                     version=data_version)
+    elif offline:
+        raise ValueError("offline cần toàn bộ chuỗi, không dùng được với data dạng stream")
+    cp_set = set(cps or ())
+    marks = {}
     torch.manual_seed(seed)
     # Khởi tạo memory (ma trận trọng số) ban đầu bằng 0
-    memory = torch.zeros(mem_size, dim)
-    # Khởi tạo đối tượng updater tương ứng
-    if updater_type == 'Delta':
-        updater = DeltaUpdater(lr=lr, reg=reg)
-    elif updater_type == 'Omega':
-        updater = OmegaUpdater(window=window, reg=reg)
+    if rank:
+        if chunk_size or offline:
+            raise ValueError("rank không dùng được cùng chunk_size hoặc offline")
+        memory = LowRankMemory.zeros(mem_size, dim, rank, dtype=p.storage)
     else:
-        raise ValueError("Unknown updater type")
+        memory = torch.zeros(mem_size, dim, dtype=p.storage)
+    # Khởi tạo đối tượng updater tương ứng
+    updater = make_updater(updater_type, window, lr, reg, updater_kwargs, precision=p)
+    if fused:
+        return _train_fused(prof, keys, values, steps, memory, updater_type, window, lr, reg, cps, fused)
+    if data is not None:
+        return _train_stream(prof, iter(data), steps, memory, updater, updater_type, chunk_size, p, rank)
+    if offline:
+        if updater_type != 'Omega':
+            raise ValueError("offline chỉ áp dụng cho updater Omega")
+        with prof.phase('update'):
+            start = time.perf_counter_ns()
+            preds, memory = omega_offline(keys[:steps], values[:steps], window, reg, chunk_size or 1024,
+                                          accum_dtype=p.accum)
+            total_ns = time.perf_counter_ns() - start
+        with prof.phase('metrics'):
+            mse_mean, cos_mean = stream_metrics(preds, values[:steps], p.accum)
+        return mse_mean, cos_mean, total_ns * 1e-9, memory.norm().item()
+    if chunk_size:
+        if updater_type != 'Delta':
+            raise ValueError("chunk_size chỉ áp dụng cho updater Delta")
+        preds = torch.empty(steps, mem_size, dtype=p.storage)
+        total_ns = 0
+        # ranh giới chunk được tách thêm tại các checkpoint để lấy memory đúng bước đó
+        bounds = sorted(set(range(0, steps, chunk_size)) | cp_set | {steps})
+        for s, e in zip(bounds[:-1], bounds[1:]):
+            with prof.phase('update'):
+                start = time.perf_counter_ns()
+                memory, preds[s:e] = updater.update_chunk(memory, keys[s:e], values[s:e])
+                total_ns += time.perf_counter_ns() - start
+            if e in cp_set:
+                marks[e] = (total_ns, memory.norm().item())
+        with prof.phase('metrics'):
+            if cps:
+                return _checkpoint_metrics(preds, values, cps, marks, p)
+            mse_mean, cos_mean = stream_metrics(preds, values[:steps], p.accum)
+        return mse_mean, cos_mean, total_ns * 1e-9, memory.norm().item()
+    if deferred_metrics:
+        preds = torch.empty(steps, mem_size, dtype=p.storage)
+        total_ns = 0
+        done = steps
+        for i in range(steps):
+            x = keys[i]
+            y = values[i]
+            with prof.phase('predict'):
+                if rank:
+                    memory.matvec(x, out=preds[i])
+                else:
+                    torch.mv(memory, x, out=preds[i])
+            with prof.phase('update'):
+                start = time.perf_counter_ns()
+                memory = updater.update(memory, x, y)
+                elapsed = time.perf_counter_ns() - start
+                total_ns += elapsed
+            if recorder is not None:
+                recorder.step(i, elapsed * 1e-9)
+            if i + 1 in cp_set:
+                marks[i + 1] = (total_ns, memory.norm().item())
+            if (stop_nonfinite and ((i + 1) % NONFINITE_CHECK_EVERY == 0 or i + 1 == steps)
+                    and not math.isfinite(memory.norm().item())):
+                done = i + 1
+                break
+        preds = preds[:done]
+        with prof.phase('metrics'):
+            if recorder is not None and recorder.writer is not None:
+                recorder.fill_metrics(*(m.tolist() for m in step_metrics(preds, values[:done], p.accum)))
+            if cps:
+                return _checkpoint_metrics(preds, values, cps, marks, p, total_ns)
+            mse_mean, cos_mean = stream_metrics(preds, values[:done], p.accum)
+        return mse_mean, cos_mean, total_ns * 1e-9, memory.norm().item()
     total_mse = 0.0
     total_cos = 0.0
     total_time = 0.0
+    done = steps
     # Vòng lặp huấn luyện qua các mẫu
     for i in range(steps):
         x = keys[i]    # (dim,)
         y = values[i]  # (mem_size,)
         # Dự đoán trước khi cập nhật
-        y_pred = memory @ x
-        # Tính MSE và cosine similarity
-        mse = ((y_pred - y) ** 2).mean().item()
-        # Cosine similarity, tránh chia cho 0
-        if torch.norm(y_pred).item() > 0 and torch.norm(y).item() > 0:
-            cos = torch.dot(y_pred, y) / (torch.norm(y_pred) * torch.norm(y))
-        else:
-            cos = torch.tensor(0.0)
-        total_mse += mse
-        total_cos += cos.item()
+        with prof.phase('predict'):
+            y_pred = memory @ x
+        with prof.phase('metrics'):
+            y_pred, y_acc = y_pred.to(p.accum), y.to(p.accum)
+            # Tính MSE và cosine similarity
+            mse = ((y_pred - y_acc) ** 2).mean().item()
+            # Cosine similarity, tránh chia cho 0
+            if torch.norm(y_pred).item() > 0 and torch.norm(y_acc).item() > 0:
+                cos = torch.dot(y_pred, y_acc) / (torch.norm(y_pred) * torch.norm(y_acc))
+            else:
+                cos = torch.tensor(0.0)
+            cos = cos.item()
+            total_mse += mse
+            total_cos += cos
+        if stop_nonfinite and not math.isfinite(mse):
+            # memory phân kỳ (mse của bước này đã được tính vào trung bình)
+            done = i + 1
+            break
         # Cập nhật bộ nhớ và đo thời gian
-        start = time.time()
-        memory = updater.update(memory, x, y)
-        end = time.time()
+        with prof.phase('update'):
+            start = time.perf_counter()
+            memory = updater.update(memory, x, y)
+            end = time.perf_counter()
         total_time += (end - start)
+        if recorder is not None:
+            recorder.step(i, end - start, mse, cos)
+        if i + 1 in cp_set:
+            marks[i + 1] = (total_mse / (i + 1), total_cos / (i + 1), total_time, memory.norm().item())
+    if cps:
+        return [marks.get(n, _aborted(total_time)) for n in cps]
     # Tính giá trị trung bình
-    mse_mean = total_mse / steps
-    cos_mean = total_cos / steps
+    mse_mean = total_mse / done
+    cos_mean = total_cos / done
     # Độ thay đổi norm của memory (do ban đầu memory=0)
-    mem_norm_change = torch.norm(memory).item()
+    mem_norm_change = memory.norm().item()
     return mse_mean, cos_mean, total_time, mem_norm_change
+
+
+def _train_fused(prof, keys, values, steps, memory, updater_type, window, lr, reg, cps, backend):
+    """Vòng lặp bằng src.fused: mỗi đoạn giữa hai checkpoint là một lần gọi scan."""
+    mem_size, dim = memory.shape
+    scan = get_scan(updater_type, mem_size, dim, window, reg, dtype=memory.dtype, backend=backend)
+    acc = torch.zeros(2, dtype=torch.float64)
+    if updater_type == 'Omega':
+        ring_x = torch.zeros(dim, window, dtype=memory.dtype)
+        ring_y = torch.zeros(mem_size, window, dtype=memory.dtype)
+    bounds = [0] + [n for n in (cps or ()) if n < steps] + [steps]
+    marks = {}
+    total_ns = 0
+    for s, e in zip(bounds[:-1], bounds[1:]):
+        # predict, metrics và update nằm chung trong một kernel nên chỉ có một phase
+        with prof.phase('update'):
+            start = time.perf_counter_ns()
+            if updater_type == 'Delta':
+                memory, acc = scan.delta(memory, keys[s:e], values[s:e], lr, reg, acc)
+            else:
+                memory, acc = scan.omega(memory, ring_x, ring_y, s, keys[s:e], values[s:e], reg, acc)
+            total_ns += time.perf_counter_ns() - start
+        mse_sum, cos_sum = acc.tolist()
+        marks[e] = (mse_sum / e, cos_sum / e, total_ns * 1e-9, memory.norm().item())
+    if cps:
+        return [marks[n] for n in cps]
+    return marks[steps]
+
+def _train_numpy(prof, keys, values, steps, updater, cps, recorder, p, stop_nonfinite=False):
+    """Vòng lặp trên mảng NumPy (src.numpy_backend); metrics tính ở cuối như deferred_metrics."""
+    mem_size, dim = values.shape[1], keys.shape[1]
+    memory = np.zeros((mem_size, dim), dtype=keys.dtype)
+    preds = np.empty((steps, mem_size), dtype=keys.dtype)
+    cp_set = set(cps or ())
+    marks = {}
+    total_ns = 0
+    done = steps
+    # torch không cảnh báo khi memory tràn số (lr lớn): NumPy cũng im lặng như vậy
+    with np.errstate(over='ignore', invalid='ignore'):
+        for i in range(steps):
+            x = keys[i]
+            with prof.phase('predict'):
+                np.dot(memory, x, out=preds[i])
+            with prof.phase('update'):
+                start = time.perf_counter_ns()
+                memory = updater.update(memory, x, values[i])
+                elapsed = time.perf_counter_ns() - start
+                total_ns += elapsed
+            if recorder is not None:
+                recorder.step(i, elapsed * 1e-9)
+            if i + 1 in cp_set:
+                # norm tính bằng torch (view, không copy) như đường torch
+                marks[i + 1] = (total_ns, torch.from_numpy(memory).norm().item())
+            if (stop_nonfinite and ((i + 1) % NONFINITE_CHECK_EVERY == 0 or i + 1 == steps)
+                    and not np.isfinite(memory).all()):
+                done = i + 1
+                break
+    preds, values = torch.from_numpy(preds[:done]), torch.from_numpy(values)
+    with prof.phase('metrics'):
+        if recorder is not None and recorder.writer is not None:
+            recorder.fill_metrics(*(m.tolist() for m in step_metrics(preds, values[:done], p.accum)))
+        if cps:
+            return _checkpoint_metrics(preds, values, cps, marks, p, total_ns)
+        mse_mean, cos_mean = stream_metrics(preds, values[:done], p.accum)
+    return mse_mean, cos_mean, total_ns * 1e-9, torch.from_numpy(memory).norm().item()
+
+def _aborted(update_time):
+    """Metrics của một checkpoint nằm sau điểm dừng của stop_nonfinite."""
+    return math.nan, math.nan, update_time, math.nan
+
+def _checkpoint_metrics(preds, values, cps, marks, p, total_ns=0):
+    """
+    Metrics của n bước đầu tại mỗi checkpoint n; marks[n] = (update ns, norm memory) ghi trong vòng lặp.
+    preds chỉ chứa các bước đã chạy: checkpoint sau điểm dừng của stop_nonfinite nhận _aborted(total_ns).
+    """
+    out = []
+    for n in cps:
+        if n > preds.shape[0]:
+            out.append(_aborted(total_ns * 1e-9))
+            continue
+        mse_mean, cos_mean = stream_metrics(preds[:n], values[:n], p.accum)
+        out.append((mse_mean, cos_mean, marks[n][0] * 1e-9, marks[n][1]))
+    return out
+
+
+def _train_stream(prof, chunks, steps, memory, updater, updater_type, chunk_size, p, rank):
+    """Vòng lặp train trên iterator các chunk; metrics cộng dồn theo chunk bằng stream_metrics."""
+    if chunk_size and updater_type != 'Delta':
+        raise ValueError("chunk_size chỉ áp dụng cho updater Delta")
+    total_mse = total_cos = 0.0
+    total_ns = 0
+    done = 0
+    preds = None
+    while steps is None or done < steps:
+        with prof.phase('generate'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        keys, values = chunk
+        if steps is not None:
+            keys, values = keys[:steps - done], values[:steps - done]
+        keys, values = keys.to(p.storage), values.to(p.storage)
+        n = keys.shape[0]
+        if preds is None or preds.shape[0] < n:
+            preds = torch.empty(n, values.shape[1], dtype=p.storage)
+        if chunk_size:
+            for s in range(0, n, chunk_size):
+                e = min(s + chunk_size, n)
+                with prof.phase('update'):
+                    start = time.perf_counter_ns()
+                    memory, preds[s:e] = updater.update_chunk(memory, keys[s:e], values[s:e])
+                    total_ns += time.perf_counter_ns() - start
+        else:
+            for i in range(n):
+                x = keys[i]
+                with prof.phase('predict'):
+                    if rank:
+                        memory.matvec(x, out=preds[i])
+                    else:
+                        torch.mv(memory, x, out=preds[i])
+                with prof.phase('update'):
+                    start = time.perf_counter_ns()
+                    memory = updater.update(memory, x, values[i])
+                    total_ns += time.perf_counter_ns() - start
+        with prof.phase('metrics'):
+            mse_mean, cos_mean = stream_metrics(preds[:n], values, p.accum)
+        total_mse += mse_mean * n
+        total_cos += cos_mean * n
+        done += n
+    if done == 0:
+        raise ValueError("data không có bước nào")
+    return total_mse / done, total_cos / done, total_ns * 1e-9, memory.norm().item()
+
+
+def train_model_multiwindow(mem_size, dim, windows, steps, reg, seed, data_window=None, data_cache=None,
+                            precision=None, checkpoints=None, data_version=1):
+    """
+    Omega với nhiều window trong một lần duyệt dữ liệu (src.updaters.MultiWindowOmega).
+    Mọi window dùng chung dữ liệu sinh với data_window (mặc định max(windows)); khác với
+    train_model(window=w) vốn sinh dữ liệu với chính window=w. Kết quả của mỗi window giống
+    train_model(..., 'Omega', data_window=data_window) (sai khác làm tròn).
+    checkpoints, data_version, precision: như train_model.
+    Returns {window: (mse_mean, cos_mean, update_time, mem_norm_change)}
+        (với checkpoints: {window: list các tuple theo checkpoint tăng dần});
+    update_time là thời gian của lời giải batched chia đều cho số window.
+    """
+    updater = MultiWindowOmega(windows, reg=reg, precision=precision)
+    windows = updater.windows
+    K = len(windows)
+    cps = sorted(set(int(n) for n in checkpoints)) if checkpoints else None
+    if cps:
+        if steps is None:
+            steps = cps[-1]
+        if cps[0] < 1 or cps[-1] > steps:
+            raise ValueError("checkpoints phải nằm trong [1, steps]")
+        steps = cps[-1]
+    p = get_precision(precision)
+    keys, values = load_data(mem_size, dim, data_window or windows[-1], steps, seed, data_cache,
+                             dtype=p.storage, version=data_version)
+    torch.manual_seed(seed)
+    memory = torch.zeros(K, mem_size, dim, dtype=p.storage)
+    preds = torch.empty(steps, K, mem_size, dtype=p.storage)
+    total_ns = 0
+    marks = {}
+    for i in range(steps):
+        x = keys[i]
+        torch.matmul(memory, x, out=preds[i])
+        start = time.perf_counter_ns()
+        memory = updater.update(x, values[i])
+        total_ns += time.perf_counter_ns() - start
+        if cps and i + 1 in cps:
+            marks[i + 1] = (total_ns, torch.norm(memory.flatten(1), dim=1).tolist())
+    if not cps:
+        cps_out = [steps]
+        marks[steps] = (total_ns, torch.norm(memory.flatten(1), dim=1).tolist())
+    else:
+        cps_out = cps
+    out = {}
+    for k, w in enumerate(windows):
+        rows = []
+        for n in cps_out:
+            mse_mean, cos_mean = stream_metrics(preds[:n, k], values[:n], p.accum)
+            rows.append((mse_mean, cos_mean, marks[n][0] * 1e-9 / K, marks[n][1][k]))
+        out[w] = rows if cps else rows[0]
+    return out
+
+
+def _stack_streams(mem_size, dim, window, steps, seeds, data_cache=None, dtype=torch.float32, version=1):
+    """Generate (hoặc dùng lại) dữ liệu cho mỗi seed và ghép thành (B, steps, ...)."""
+    cache = {}
+    for seed in seeds:
+        if seed not in cache:
+            cache[seed] = load_data(mem_size, dim, window, steps, seed, data_cache, dtype=dtype, version=version)
+    keys = torch.stack([cache[s][0] for s in seeds])    # (B, steps, dim)
+    values = torch.stack([cache[s][1] for s in seeds])  # (B, steps, mem_size)
+    return keys, values
+
+
+def train_model_batched(mem_size, dim, window, steps, lrs, regs, seeds, updater_type, data_cache=None,
+                        precision=None, checkpoints=None, data_version=1, data_window=None):
+    """
+    Chạy B stream độc lập cùng lúc (cùng mem_size, dim, window, steps; lr/reg/seed riêng).
+    lrs, regs, seeds: list độ dài B.
+    Memory có shape (B, mem_size, dim); Delta dùng baddbmm, Omega dùng ridge_solve batched (dạng giải
+    theo choose_solver: Cholesky primal / dual khi reg > 0, lstsq / pinv khi reg = 0).
+    precision: như train_model (lời giải của Omega và metrics ở accum dtype).
+    checkpoints, data_version, data_window: như train_model; với checkpoints trả về list (một phần tử mỗi
+        checkpoint, tăng dần) các list kết quả theo stream.
+    Returns list of (mse_mean, cos_mean, update_time, mem_norm_change), one per stream,
+    giống train_model (update_time là thời gian cập nhật của cả batch chia đều cho B stream).
+    """
+    B = len(seeds)
+    if not (len(lrs) == len(regs) == B):
+        raise ValueError("lrs, regs và seeds phải có cùng độ dài")
+    if updater_type not in ('Delta', 'Omega'):
+        raise ValueError("Unknown updater type")
+    cps = sorted(set(int(n) for n in checkpoints)) if checkpoints else None
+    if cps:
+        if steps is None:
+            steps = cps[-1]
+        if cps[0] < 1 or cps[-1] > steps:
+            raise ValueError("checkpoints phải nằm trong [1, steps]")
+        steps = cps[-1]
+    p = get_precision(precision)
+    keys, values = _stack_streams(mem_size, dim, data_window or window, steps, seeds, data_cache,
+                                  dtype=p.storage, version=data_version)
+    lr_b = torch.tensor(lrs, dtype=p.compute).view(B, 1, 1)
+    reg_b = torch.tensor(regs, dtype=p.compute).view(B, 1, 1)
+    memory = torch.zeros(B, mem_size, dim, dtype=p.storage)
+    if updater_type == 'Omega':
+        ring_x = torch.zeros(B, window, dim, dtype=p.accum)
+        ring_y = torch.zeros(B, window, mem_size, dtype=p.accum)
+        ridge = [b for b in range(B) if regs[b] > 0]
+        plain = [b for b in range(B) if not regs[b] > 0]
+        reg_a = reg_b.to(p.accum).view(B, 1)
+    total_mse = torch.zeros(B, dtype=torch.float64)
+    total_cos = torch.zeros(B, dtype=torch.float64)
+    total_time = 0.0
+    marks = []
+
+    def summary(n):
+        mse_mean = (total_mse / n).tolist()
+        cos_mean = (total_cos / n).tolist()
+        mem_norm_change = torch.norm(memory.flatten(1), dim=1).tolist()
+        per_stream_time = total_time / B
+        return [(mse_mean[b], cos_mean[b], per_stream_time, mem_norm_change[b]) for b in range(B)]
+
+    for i in range(steps):
+        x = keys[:, i].to(p.compute)    # (B, dim)
+        y = values[:, i].to(p.compute)  # (B, mem_size)
+        mem_c = memory.to(p.compute)
+        y_pred = torch.bmm(mem_c, x.unsqueeze(2)).squeeze(2)  # (B, mem_size)
+        pred_a, y_a = y_pred.to(p.accum), y.to(p.accum)
+        total_mse += ((pred_a - y_a) ** 2).mean(dim=1)
+        norm_pred = torch.norm(pred_a, dim=1)
+        norm_y = torch.norm(y_a, dim=1)
+        valid = (norm_pred > 0) & (norm_y > 0)
+        cos = (pred_a * y_a).sum(dim=1) / (norm_pred * norm_y)
+        total_cos += torch.where(valid, cos, torch.zeros_like(cos))
+        start = time.time()
+        if updater_type == 'Delta':
+            error = y_pred - y
+            grad = torch.baddbmm(reg_b * mem_c, error.unsqueeze(2), x.unsqueeze(1))
+            memory = (mem_c - lr_b * grad).to(p.storage)
+        else:
+            ring_x[:, i % window] = x
+            ring_y[:, i % window] = y
+            n = min(i + 1, window)
+            X = ring_x[:, :n]  # (B, N, dim)
+            Y = ring_y[:, :n]  # (B, N, mem_size)
+            memory = torch.empty(B, mem_size, dim, dtype=p.accum)
+            if ridge:
+                memory[ridge] = ridge_solve(X[ridge].transpose(1, 2), Y[ridge].transpose(1, 2), reg_a[ridge])
+            if plain:
+                memory[plain] = ridge_solve(X[plain].transpose(1, 2), Y[plain].transpose(1, 2), 0.0)
+            memory = memory.to(p.storage)
+        total_time += time.time() - start
+        if cps and i + 1 in cps:
+            marks.append(summary(i + 1))
+    if cps:
+        return marks
+    return summary(steps)
@@ -1,19 +1,160 @@
 # src/updaters.py
 import torch
 from collections import deque
+from functools import lru_cache
+from src.precision import get_precision
+from src.lowrank import LowRankMemory
+
+def delta_chunk(memory, X, Y, lr, reg=0.0):
+    """
+    Apply C consecutive Delta steps M <- M - lr * ((M x - y) x^T + reg * M) in closed form.
+    memory: (mem_size, dim), X: (C, dim), Y: (C, mem_size)
+    Returns (memory after the C steps, predictions (C, mem_size) made before each step).
+
+    Với a = 1 - lr*reg, sai số e_t = M_t x_t - y_t thoả hệ tam giác dưới (dạng WY/UT):
+        e_t + lr * sum_{s<t} a^(t-1-s) (x_s . x_t) e_s = a^t S x_t - y_t
+    (S là memory đầu chunk), và memory cuối chunk là a^C S - lr * sum_s a^(C-1-s) e_s x_s^T.
+    Vì vậy C bước tuần tự chỉ còn vài phép nhân ma trận và một lần giải tam giác.
+    """
+    C = X.shape[0]
+    a = 1.0 - lr * reg
+    t = torch.arange(C, dtype=memory.dtype, device=memory.device)
+    lag = t.unsqueeze(1) - t.unsqueeze(0) - 1  # lag[t, s] = t - 1 - s
+    decay = torch.pow(torch.tensor(a, dtype=memory.dtype), lag.clamp(min=0))
+    L = torch.tril(lr * decay * (X @ X.t()), diagonal=-1)
+    I = torch.eye(C, dtype=memory.dtype, device=memory.device)
+    rhs = torch.pow(torch.tensor(a, dtype=memory.dtype), t).unsqueeze(1) * (X @ memory.t()) - Y
+    E = torch.linalg.solve_triangular(I + L, rhs, upper=False, unitriangular=True)  # (C, mem_size)
+    tail = torch.pow(torch.tensor(a, dtype=memory.dtype), C - 1 - t).unsqueeze(1)
+    new_memory = (a ** C) * memory - lr * (E * tail).t() @ X
+    return new_memory, E + Y
+
+
+SOLVERS = ('primal', 'dual', 'lstsq', 'pinv')
+
+
+@lru_cache(maxsize=4096)
+def choose_solver(dim, n, mem_size, regularized):
+    """
+    Cheapest exact formulation of the window solution W = Y X^T (X X^T + reg*I)^-1
+    (X: dim x n, Y: mem_size x n), from flop estimates keyed on the shapes:
+        reg > 0, both by Cholesky:
+            primal (dim x dim): X X^T dim^2 n + dim^3/3 + X Y^T dim n mem + solve 2 dim^2 mem
+            dual (n x n):       X^T X n^2 dim + n^3/3 + solve 2 n^2 mem + X Z dim n mem
+        reg = 0, min-norm W = Y pinv(X):
+            lstsq (QR có pivot trên X^T, vế phải đệm tới max(n, dim) hàng): 4 dim n mem + 2 n^2 dim
+            pinv (SVD của X):   4 max(dim, n) k^2 + 22 k^3 + 2 dim n mem, k = min(dim, n)
+    Dual thắng khi cửa sổ ngắn hơn dim; với reg = 0 SVD chỉ rẻ hơn khi n nhỏ hơn hẳn dim.
+    """
+    if regularized:
+        primal = dim * dim * n + dim ** 3 / 3 + dim * n * mem_size + 2 * dim * dim * mem_size
+        dual = n * n * dim + n ** 3 / 3 + 2 * n * n * mem_size + dim * n * mem_size
+        return 'dual' if dual < primal else 'primal'
+    k = min(dim, n)
+    lstsq = 4 * dim * n * mem_size + 2 * n * n * dim
+    svd = 4 * max(dim, n) * k * k + 22 * k ** 3 + 2 * dim * n * mem_size
+    return 'pinv' if svd < lstsq else 'lstsq'
+
+
+def spd_solve(G, B):
+    """
+    Solve G Z = B for symmetric positive definite G (batched ok) by Cholesky; falls back to LU
+    (torch.linalg.solve) if rounding made G numerically indefinite (reg rất nhỏ so với ||X||^2).
+    """
+    L, info = torch.linalg.cholesky_ex(G)
+    if info.any():
+        return torch.linalg.solve(G, B)
+    return torch.cholesky_solve(B, L)
+
+
+def ridge_solve(X, Y, reg, solver=None):
+    """
+    W = Y X^T (X X^T + reg*I)^-1 = Y (X^T X + reg*I)^-1 X^T for X: (..., dim, n), Y: (..., mem_size, n)
+    (batched ok), without forming an inverse. reg = 0: W = Y pinv(X) (lstsq, min-norm).
+    reg: float, hoặc tensor (..., 1) một giá trị cho mỗi phần tử của batch (khi đó mọi giá trị cùng > 0
+        hoặc cùng = 0).
+    solver: 'primal' | 'dual' (reg > 0), 'lstsq' | 'pinv' (reg = 0); mặc định theo choose_solver.
+    """
+    dim, n = X.shape[-2:]
+    regularized = bool((reg > 0).all()) if torch.is_tensor(reg) else reg > 0
+    if solver is None:
+        solver = choose_solver(dim, n, Y.shape[-2], regularized)
+    Xt, Yt = X.transpose(-2, -1), Y.transpose(-2, -1)
+    if solver in ('lstsq', 'pinv'):
+        if regularized:
+            raise ValueError(f"solver {solver!r} chỉ dùng cho reg = 0")
+        if solver == 'pinv':
+            return Y @ torch.linalg.pinv(X)
+        # W X = Y  <=>  X^T W^T = Y^T; gelsy cho nghiệm chuẩn nhỏ nhất cả khi X suy biến
+        return torch.linalg.lstsq(Xt, Yt).solution.transpose(-2, -1)
+    if not regularized:
+        raise ValueError(f"solver {solver!r} cần reg > 0")
+    if solver == 'dual':
+        G = Xt @ X
+        G.diagonal(dim1=-2, dim2=-1).add_(reg)
+        return (X @ spd_solve(G, Yt)).transpose(-2, -1)
+    if solver != 'primal':
+        raise ValueError(f"Unknown solver {solver!r}: choose one of {list(SOLVERS)}")
+    G = X @ Xt
+    G.diagonal(dim1=-2, dim2=-1).add_(reg)
+    # W G = Y X^T  <=>  G W^T = X Y^T (G đối xứng)
+    return spd_solve(G, X @ Yt).transpose(-2, -1)
+
 
 class DeltaUpdater:
-    def __init__(self, lr=0.01, reg=0.0):
+    def __init__(self, lr=0.01, reg=0.0, inplace=False, precision=None):
+        """
+        inplace: nếu True, update() ghi đè lên chính tensor memory được truyền vào (addr_/mul_)
+            và dùng lại một buffer lỗi cấp phát sẵn, nên không cấp phát gì ở trạng thái ổn định.
+        precision: tên hoặc src.precision.Precision; nếu đặt, mỗi bước được tính ở compute dtype
+            (update_chunk ở accum dtype vì có giải hệ tam giác) và memory trả về ở storage dtype.
+            None giữ hành vi cũ: tính ở dtype của memory được truyền vào.
+        """
         self.lr = lr
         self.reg = reg
+        self.inplace = inplace
+        self.precision = get_precision(precision) if precision is not None else None
+        if inplace and self.precision is not None and self.precision.storage != self.precision.compute:
+            raise ValueError("inplace cần storage dtype và compute dtype giống nhau")
+        self._error = None
+        self._decay = None
+
+    def update_chunk(self, memory, X, Y):
+        """
+        Update memory with C samples at once; same result as C calls to update().
+        X: Tensor of shape (C, dim), Y: Tensor of shape (C, mem_size)
+        Returns (memory, predictions made before each of the C updates)
+        """
+        if isinstance(memory, LowRankMemory):
+            raise ValueError("update_chunk không hỗ trợ LowRankMemory")
+        p = self.precision
+        if p is None:
+            return delta_chunk(memory, X, Y, self.lr, self.reg)
+        memory, preds = delta_chunk(memory.to(p.accum), X.to(p.accum), Y.to(p.accum), self.lr, self.reg)
+        return memory.to(p.storage), preds.to(p.storage)
 
     def update(self, memory, x, y):
         """
         Update memory (weight matrix) with one sample (x, y) using SGD.
-        memory: Tensor of shape (mem_size, dim)
+        memory: Tensor of shape (mem_size, dim), hoặc LowRankMemory (được cập nhật tại chỗ
+            bằng một rank-1 append, không dựng ma trận dày)
         x: Tensor of shape (dim,)
         y: Tensor of shape (mem_size,)
         """
+        if isinstance(memory, LowRankMemory):
+            dtype = self.precision.compute if self.precision is not None else memory.dtype
+            return self._update_lowrank(memory, x.to(dtype), y.to(dtype))
+        p = self.precision
+        if p is not None:
+            x = x.to(p.compute)
+            y = y.to(p.compute)
+            if memory.dtype != p.compute:
+                return self._update(memory.to(p.compute), x, y).to(p.storage)
+        if self.inplace:
+            return self._update_inplace(memory, x, y)
+        return self._update(memory, x, y)
+
+    def _update(self, memory, x, y):
         # Dự đoán và gradient
         y_pred = memory @ x  # dự đoán kích thước mem_size
         error = y_pred - y
@@ -23,35 +164,287 @@ class DeltaUpdater:
         memory = memory - self.lr * grad
         return memory
 
+    def _update_lowrank(self, memory, x, y):
+        # M <- (1 - lr*reg) M - lr * (M x - y) x^T với M = U V^T: O(rank * (mem_size + dim));
+        # sai số tính ở dtype của x (compute dtype), factor mới được lưu ở storage dtype
+        error = memory.matvec(x, dtype=x.dtype) - y
+        if self.reg:
+            memory.scale_(1.0 - self.lr * self.reg)
+        return memory.add_rank1_(error, x, alpha=-self.lr)
+
+    def _update_inplace(self, memory, x, y):
+        # M <- (1 - lr*reg) M - lr * (M x - y) x^T, không tạo tensor mới
+        if self._error is None or self._error.shape[0] != memory.shape[0] or self._error.dtype != memory.dtype:
+            self._error = torch.empty(memory.shape[0], dtype=memory.dtype, device=memory.device)
+        torch.mv(memory, x, out=self._error)
+        self._error.sub_(y)
+        if self.reg:
+            # hệ số decay là tensor 0-chiều dựng sẵn để mul_ không phải bọc scalar thành tensor mới
+            if self._decay is None or self._decay.dtype != memory.dtype:
+                self._decay = torch.tensor(1.0 - self.lr * self.reg, dtype=memory.dtype, device=memory.device)
+            memory.mul_(self._decay)
+        memory.addr_(self._error, x, alpha=-self.lr)
+        return memory
+
 class OmegaUpdater:
-    def __init__(self, window=10, reg=0.0):
+    def __init__(self, window=10, reg=0.0, incremental=False, refresh_every=256, drift_tol=1e-4,
+                 precision=None, solver=None, drift_check_every=16):
+        """
+        incremental: nếu True (và reg > 0) dùng sliding-window RLS: giữ nghịch đảo
+            P = (X X^T + reg*I)^-1 và W, cập nhật rank-1 khi thêm/bỏ mẫu -> O(dim^2)/bước
+            thay vì dựng lại cả cửa sổ và nghịch đảo O(dim^3).
+            Với reg = 0 không tồn tại P nên vẫn dùng đường tính đầy đủ.
+        refresh_every: số bước tối đa giữa hai lần tính lại P, W từ ring buffer.
+        drift_tol: ngân sách sai số tương đối; mỗi downdate khuếch đại sai số của P khoảng
+            1 / (1 - x^T P x) lần, khi tích các hệ số này vượt drift_tol / eps thì tính lại sớm.
+        drift_check_every: tích trên nằm trên device và chỉ được đọc về host mỗi chừng này bước
+            (một lần đồng bộ thay vì một lần mỗi downdate).
+        precision: tên hoặc src.precision.Precision; nếu đặt, Gram/lời giải hệ được tính
+            ở accum dtype (vd. "fp64" cho reg = 0 gần suy biến) và W trả về ở storage dtype.
+            Chế độ incremental luôn giữ trạng thái ở float64.
+        solver: None (chọn theo shape bằng choose_solver) hoặc ép 'primal' / 'dual' (reg > 0),
+            'lstsq' / 'pinv' (reg = 0); xem ridge_solve.
+        """
+        if solver is not None and solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver!r}: choose one of {list(SOLVERS)}")
+        self.solver = solver
         self.window = window
+        self.precision = get_precision(precision) if precision is not None else None
         self.reg = reg
+        self.incremental = incremental and reg > 0
+        self.refresh_every = refresh_every
+        self.drift_tol = drift_tol
+        self.drift_check_every = max(1, drift_check_every)
         # Sử dụng deque để lưu trữ cửa sổ mẫu
         self.buffer_x = deque(maxlen=window)
         self.buffer_y = deque(maxlen=window)
+        # Trạng thái của chế độ incremental (khởi tạo lười khi biết kích thước)
+        self._ring_x = None
+        self._ring_y = None
+        self._pos = 0
+        self._count = 0
+        self._steps = 0
+        self._P = None
+        self._W = None
+        self._drift = None
 
     def update(self, memory, x, y):
         """
         Update memory (weight matrix) by solving ridge regression on buffered samples.
-        memory: current memory (unused here, được tính toán lại hoàn toàn)
+        memory: current memory (unused here, được tính toán lại hoàn toàn); nếu là LowRankMemory
+            thì trả về LowRankMemory dạng đối ngẫu (xem _solve_lowrank) thay cho ma trận dày
         x: current key (dim,)
         y: current value (mem_size,)
         """
+        if isinstance(memory, LowRankMemory):
+            if self.incremental:
+                raise ValueError("incremental không hỗ trợ LowRankMemory")
+            return self._solve_lowrank(memory, x, y)
+        if self.incremental:
+            # copy=True: trả về bản sao, không phải self._W mà các bước sau sửa tại chỗ
+            # (một lần copy, cũng là lần đổi dtype nếu memory không phải float64)
+            return self._update_incremental(x, y).to(dtype=memory.dtype, copy=True)
+        p = self.precision
         # Thêm mẫu hiện tại vào bộ đệm
-        self.buffer_x.append(x)
-        self.buffer_y.append(y)
+        self.buffer_x.append(x if p is None else x.to(p.accum))
+        self.buffer_y.append(y if p is None else y.to(p.accum))
         # Tạo ma trận X (dim x N) và Y (mem_size x N) từ buffer
         X = torch.stack(list(self.buffer_x), dim=1)  # dim x N
         Y = torch.stack(list(self.buffer_y), dim=1)  # mem_size x N
-        # Nếu có hệ số điều chuẩn, dùng công thức ridge regression
+        # ridge regression (reg > 0) hoặc Y pinv(X) (reg = 0), dạng rẻ nhất theo shape
+        W_new = ridge_solve(X, Y, self.reg, self.solver)  # (mem_size x dim)
+        return W_new if p is None else W_new.to(p.storage)
+
+    def _solve_lowrank(self, memory, x, y):
+        """
+        Dạng đối ngẫu của nghiệm ridge: Y X^T (X X^T + reg*I)^-1 = Y (X^T X + reg*I)^-1 X^T,
+        nên memory = U V^T với U = Y (mem_size x N), V = X (X^T X + reg*I)^-1 (dim x N).
+        Chỉ cần giải hệ N x N (N <= window), hạng <= window; reg = 0 dùng V = pinv(X)^T.
+        """
+        p = self.precision
+        dtype = p.accum if p is not None else memory.dtype
+        self.buffer_x.append(x.to(dtype))
+        self.buffer_y.append(y.to(dtype))
+        X = torch.stack(list(self.buffer_x), dim=1)  # dim x N
+        Y = torch.stack(list(self.buffer_y), dim=1)  # mem_size x N
+        if self.reg > 0:
+            G = X.t() @ X
+            G.diagonal().add_(self.reg)
+            V = spd_solve(G, X.t()).t()
+        else:
+            # pinv(X) = nghiệm chuẩn nhỏ nhất của X Z = I
+            V = torch.linalg.lstsq(X, torch.eye(X.shape[0], dtype=X.dtype, device=X.device)).solution.t()
+        return LowRankMemory(Y.to(memory.dtype), V.to(memory.dtype), memory.max_rank)
+
+    def _init_state(self, x, y):
+        # Trạng thái giữ ở float64: downdate rank-1 trên (XX^T + reg*I)^-1 rất nhạy với sai số
+        dim, mem_size = x.shape[0], y.shape[0]
+        opts = dict(dtype=torch.float64, device=x.device)
+        self._ring_x = torch.zeros(self.window, dim, **opts)
+        self._ring_y = torch.zeros(self.window, mem_size, **opts)
+        self._P = torch.eye(dim, **opts) / self.reg
+        self._W = torch.zeros(mem_size, dim, **opts)
+        self._drift = torch.ones((), **opts)
+
+    def _rank1(self, x, y, sign):
+        """Add (sign=+1) or remove (sign=-1) sample (x, y) from the window solution."""
+        Px = self._P @ x
+        denom = torch.dot(x, Px).mul_(sign).add_(1.0)
+        if sign < 0:
+            # giữ trên device: không đồng bộ host ở mỗi downdate
+            self._drift.div_(denom)
+        k = Px / denom
+        # W <- W + sign * (y - W x) k^T ; P <- P - sign * k (P x)^T
+        self._W.addr_(torch.addmv(y, self._W, x, alpha=-1.0), k, alpha=sign)
+        self._P.addr_(k, Px, alpha=-sign)
+
+    def _refresh(self):
+        X = self._ring_x[:self._count]  # N x dim
+        Y = self._ring_y[:self._count]  # N x mem_size
+        G = X.t() @ X
+        G.diagonal().add_(self.reg)
+        # RLS cần chính P; G xác định dương nên lấy nghịch đảo qua Cholesky (đối xứng, rẻ hơn LU),
+        # hoặc giải G P = I bằng LU nếu làm tròn làm G mất xác định dương
+        L, info = torch.linalg.cholesky_ex(G)
+        if info.item():
+            self._P = torch.linalg.solve(G, torch.eye(G.shape[0], dtype=G.dtype, device=G.device))
+        else:
+            self._P = torch.cholesky_inverse(L)
+        self._W = Y.t() @ X @ self._P
+        self._drift.fill_(1.0)
+
+    def _update_incremental(self, x, y):
+        if self._P is None:
+            self._init_state(x, y)
+        # Cửa sổ đầy: bỏ mẫu cũ nhất (đang nằm ở vị trí ghi tiếp theo của ring buffer)
+        if self._count == self.window:
+            self._rank1(self._ring_x[self._pos], self._ring_y[self._pos], -1.0)
+        else:
+            self._count += 1
+        # ghi vào ring buffer cũng là lần đổi sang float64; mẫu mới dùng luôn hàng vừa ghi
+        rx, ry = self._ring_x[self._pos], self._ring_y[self._pos]
+        rx.copy_(x)
+        ry.copy_(y)
+        self._pos = (self._pos + 1) % self.window
+        self._steps += 1
+        if ((self.refresh_every and self._steps % self.refresh_every == 0)
+                or (self._steps % self.drift_check_every == 0
+                    and self._drift.item() * torch.finfo(torch.float64).eps > self.drift_tol)):
+            self._refresh()
+        else:
+            self._rank1(rx, ry, 1.0)
+        return self._W
+
+
+class MultiWindowOmega:
+    def __init__(self, windows, reg=0.0, precision=None):
+        """
+        Omega cho nhiều kích thước cửa sổ cùng lúc, trên một ring buffer của cửa sổ lớn nhất.
+        windows: các kích thước cửa sổ (self.windows là bản đã sắp xếp tăng dần, không trùng).
+        Các cửa sổ lồng nhau (w mẫu gần nhất), nên Gram X^T X và Y^T X của cửa sổ w_k bằng của
+        w_{k-1} cộng phần của đoạn mẫu nằm giữa: mỗi bước chỉ tính một lượt trên max(windows)
+        mẫu rồi cộng dồn theo đoạn. reg > 0: một lần Cholesky batched cho mọi cửa sổ;
+        reg = 0: một lần ridge_solve batched (lstsq hoặc pinv theo choose_solver) cho mọi cửa sổ,
+        cửa sổ ngắn được đệm cột 0 (không đổi nghiệm chuẩn nhỏ nhất).
+        precision: như OmegaUpdater (giải ở accum dtype, trả về ở storage dtype).
+        """
+        self.windows = sorted(set(int(w) for w in windows))
+        if not self.windows or self.windows[0] < 1:
+            raise ValueError("windows phải là các số nguyên dương")
+        self.reg = reg
+        self.precision = get_precision(precision) if precision is not None else None
+        self._ring_x = None
+        self._ring_y = None
+        self._pos = 0
+        self._count = 0
+
+    def update(self, x, y):
+        """
+        Add sample (x, y) and return the memory of every window size:
+        Tensor (len(self.windows), mem_size, dim) in the order of self.windows.
+        """
+        p = self.precision
+        W_max = self.windows[-1]
+        if self._ring_x is None:
+            dtype = p.accum if p is not None else x.dtype
+            self._ring_x = torch.zeros(W_max, x.shape[0], dtype=dtype, device=x.device)
+            self._ring_y = torch.zeros(W_max, y.shape[0], dtype=dtype, device=y.device)
+        self._ring_x[self._pos] = x
+        self._ring_y[self._pos] = y
+        self._pos = (self._pos + 1) % W_max
+        self._count = min(self._count + 1, W_max)
+        n = self._count
+        # mẫu mới nhất trước: cửa sổ w là w hàng đầu
+        order = (self._pos - 1 - torch.arange(n, device=x.device)) % W_max
+        X = self._ring_x[order]  # n x dim
+        Y = self._ring_y[order]  # n x mem_size
+        ends = [min(w, n) for w in self.windows]
         if self.reg > 0:
-            XXT = X @ X.t()  # (dim x dim)
-            I = torch.eye(XXT.size(0), device=XXT.device)
-            inv = torch.inverse(XXT + self.reg * I)
-            W_new = Y @ X.t() @ inv  # (mem_size x dim)
+            starts = [0] + ends[:-1]
+            G = torch.stack([X[s:e].t() @ X[s:e] for s, e in zip(starts, ends)]).cumsum(dim=0)  # K x dim x dim
+            C = torch.stack([Y[s:e].t() @ X[s:e] for s, e in zip(starts, ends)]).cumsum(dim=0)  # K x mem_size x dim
+            G.diagonal(dim1=1, dim2=2).add_(self.reg)
+            # W G = C  <=>  G W^T = C^T (G đối xứng)
+            W = spd_solve(G, C.transpose(1, 2)).transpose(1, 2)
+        else:
+            mask = (torch.arange(n, device=x.device) < torch.tensor(ends, device=x.device).unsqueeze(1))
+            mask = mask.unsqueeze(1).to(X.dtype)  # K x 1 x n
+            W = ridge_solve(X.t() * mask, Y.t() * mask, 0.0)  # K x mem_size x dim
+        return W if p is None else W.to(p.storage)
+
+
+def omega_offline(keys, values, window, reg=0.0, chunk_size=1024, accum_dtype=None):
+    """
+    Omega predictions for a whole known stream without the sequential loop.
+    keys: (T, dim), values: (T, mem_size)
+    Returns (preds, memory): preds[t] = W_{t-1} @ keys[t], với W_{t-1} là nghiệm ridge trên
+    `window` mẫu kết thúc ở t-1 (preds[0] = 0 vì memory ban đầu bằng 0), và memory là W sau mẫu cuối,
+    giống hệt chuỗi OmegaUpdater.update.
+
+    reg > 0: Gram X X^T của mọi cửa sổ lấy bằng hiệu của tổng tích luỹ (float64, tích luỹ lại
+    trong mỗi chunk để không mất chính xác), rồi giải tất cả hệ bằng một lần cholesky +
+    cholesky_solve batched; dự đoán Y X^T z được tính qua view cửa sổ nên không cần tích luỹ Y X^T.
+    reg = 0: một ridge_solve batched trên các cửa sổ của chunk (lstsq hoặc pinv theo choose_solver).
+    chunk_size giới hạn số cửa sổ xử lý cùng lúc (bộ nhớ ~ chunk_size * dim^2).
+    accum_dtype: dtype của lời giải khi reg = 0 (mặc định dtype của keys); kết quả trả về ở dtype của keys.
+    """
+    T, dim = keys.shape
+    mem_size = values.shape[1]
+    out_dtype = keys.dtype
+    preds = torch.zeros(T, mem_size, dtype=out_dtype, device=keys.device)
+    memory = torch.zeros(mem_size, dim, dtype=out_dtype, device=keys.device)
+    compute_dtype = torch.float64 if reg > 0 else (accum_dtype or out_dtype)
+    # các cột 0 ở đầu chuỗi không đổi nghiệm (Gram và nghiệm chuẩn nhỏ nhất), nên mọi cửa sổ có cùng kích thước
+    pad_x = torch.cat([keys.new_zeros(window - 1, dim), keys]).to(compute_dtype)
+    pad_y = torch.cat([values.new_zeros(window - 1, mem_size), values]).to(compute_dtype)
+    Xw = pad_x.unfold(0, window, 1)  # (T, dim, window), Xw[e] = X của cửa sổ kết thúc ở e
+    Yw = pad_y.unfold(0, window, 1)  # (T, mem_size, window)
+    I = torch.eye(dim, dtype=compute_dtype, device=keys.device)
+    # cửa sổ kết thúc tại e dự đoán cho bước e + 1; e = T - 1 cho memory cuối
+    ends = torch.arange(T, device=keys.device)
+    for c0 in range(0, T, chunk_size):
+        e = ends[c0:c0 + chunk_size]
+        nxt = e[e + 1 < T]
+        last = int(e[-1]) == T - 1
+        if reg > 0:
+            lo = max(0, c0 - window + 1)
+            Xl = pad_x[lo + window - 1:int(e[-1]) + window]  # mẫu lo .. e[-1]
+            cum = torch.zeros(Xl.shape[0] + 1, dim, dim, dtype=compute_dtype, device=keys.device)
+            torch.cumsum(Xl.unsqueeze(2) * Xl.unsqueeze(1), dim=0, out=cum[1:])
+            G = cum[e + 1 - lo] - cum[(e - window + 1).clamp(min=0) - lo] + reg * I  # (n, dim, dim)
+            L = torch.linalg.cholesky(G)
+            if nxt.numel():
+                z = torch.cholesky_solve(pad_x[nxt + window].unsqueeze(2), L[:nxt.numel()])  # (n, dim, 1)
+                p = Yw[nxt] @ (Xw[nxt].transpose(1, 2) @ z)
+                preds[nxt + 1] = p.squeeze(2).to(out_dtype)
+            if last:
+                # W G = C  <=>  G W^T = C^T
+                C = Yw[-1] @ Xw[-1].t()
+                memory = torch.cholesky_solve(C.t(), L[-1]).t().to(out_dtype)
         else:
-            # Nếu không dùng điều chuẩn, dùng pseudo-inverse của X
-            X_pinv = torch.pinverse(X)
-            W_new = Y @ X_pinv
-        return W_new
+            W = ridge_solve(Xw[e], Yw[e], 0.0)  # (n, mem_size, dim)
+            if nxt.numel():
+                preds[nxt + 1] = (W[:nxt.numel()] @ pad_x[nxt + window].unsqueeze(2)).squeeze(2).to(out_dtype)
+            if last:
+                memory = W[-1].to(out_dtype)
+    return preds, memory
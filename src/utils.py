@@ -2,7 +2,6 @@
 Utility helpers for plotting and CSV post-processing.
 """
 import csv
-import matplotlib.pyplot as plt
 
 
 def read_csv(path):
@@ -14,11 +13,36 @@ def read_csv(path):
     return rows
 
 
+def read_results(path, columns=None, where=None):
+    """
+    Đọc kết quả từ CSV hoặc ResultsStore (SQLite), chỉ lấy các cột `columns`.
+    where: {cột: giá trị | list giá trị}; với store được lọc ngay trong SQLite.
+    Giá trị đọc từ CSV là chuỗi như read_csv.
+    """
+    if not path.endswith('.csv'):
+        from src.results_store import ResultsStore
+        store = ResultsStore(path, key_fields=())
+        try:
+            return store.query(columns=columns, where=where)
+        finally:
+            store.close()
+    wanted = {k: {str(x) for x in (v if isinstance(v, (list, tuple, set)) else [v])}
+              for k, v in (where or {}).items()}
+    rows = []
+    for r in read_csv(path):
+        if all(r.get(k) in vals for k, vals in wanted.items()):
+            rows.append({k: r.get(k) for k in columns} if columns else r)
+    return rows
+
+
 def plot_metric_vs_param(csv_path, metric='mse_mean', param='steps', out_png='results/plot.png'):
-    rows = read_csv(csv_path)
+    """csv_path: file CSV hoặc ResultsStore (.sqlite) của exp_runner."""
+    rows = read_results(csv_path, columns=[param, metric])
     # convert to floats
     xs = [float(r[param]) for r in rows]
     ys = [float(r.get(metric, 0.0)) for r in rows]
+    # import khi cần: process chỉ đọc kết quả (vd. worker) không phải trả chi phí matplotlib
+    import matplotlib.pyplot as plt
     plt.figure()
     plt.scatter(xs, ys)
     plt.xlabel(param)
@@ -0,0 +1,323 @@
+"""
+Long-lived local worker service: warm processes that import torch once and run configs on request.
+
+    python -m src.worker_pool serve --workers 4 &                 # start (socket results/worker.sock)
+    echo '{"mem_size": 20, "dim": 10, "window": 5, "steps": 1000, "lr": 0.01, "reg": 0.1,
+           "seed": 0, "updater": "Omega"}' | python -m src.worker_pool run --out results/exp_results.sqlite
+    python -m src.worker_pool stop
+
+The server listens on a Unix socket (multiprocessing.connection) that only its owner can open
+(mode 0600). Each serve generates a random authkey and writes it to <socket>.key (mode 0600),
+where clients of the same user read it; the transport unpickles what clients send, so both
+checks matter. A serve refuses to start while another pool answers on the same socket. It
+runs every task on one ProcessPoolExecutor created at startup, through exp_runner.run_task, so
+a task costs the same as inside run_experiments. Messages are plain dicts:
+
+    {"op": "run", "configs": [cfg, ...], "out": path|None, "train_kwargs": {...}, "profile": None,
+     "record": None}   (profile / record: as in exp_runner.run_task)
+      -> {"rows": [{field: value}, ...]} for each finished config,
+         {"error": str, "config": cfg} for each failed one, then {"done": True, "ran": n, "skipped": k}
+    {"op": "ping"} -> {"ok": True, "pid": ..., "workers": ...}
+    {"op": "shutdown"} -> {"ok": True}
+
+When "out" is set the server appends the rows to that results file (see exp_runner.open_sink) and
+skips configs it already holds. This module imports neither torch nor the experiment code at
+import time, so the client side starts as fast as a bare interpreter.
+"""
+import argparse
+import json
+import os
+import secrets
+import stat
+import sys
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+DEFAULT_SOCKET = os.environ.get("KV_WORKER_SOCKET", os.path.join("results", "worker.sock"))
+
+
+def authkey_path(address):
+    return address + ".key"
+
+
+def _write_authkey(address):
+    """Sinh authkey ngẫu nhiên cho lần serve này và ghi vào <socket>.key (chỉ chủ sở hữu đọc được)."""
+    authkey = secrets.token_hex(32).encode()
+    path = authkey_path(address)
+    if os.path.lexists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+
+def read_authkey(address):
+    """Authkey của pool đang chạy trên address (đọc từ <socket>.key)."""
+    try:
+        with open(authkey_path(address), "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise ValueError(f"no key file {authkey_path(address)}: is a pool serving on {address}?") from None
+
+
+def _warm(_):
+    return os.getpid()
+
+
+class _Server:
+    def __init__(self, address, workers, threads_per_worker, use_cache):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from src import exp_runner
+        self.exp_runner = exp_runner
+        self.workers = workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        ctx = multiprocessing.get_context("spawn")
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                        initializer=exp_runner._init_worker,
+                                        initargs=(threads_per_worker, use_cache))
+        # khởi động mọi worker ngay (import torch một lần) thay vì ở task đầu tiên
+        list(self.pool.map(_warm, range(self.workers)))
+        self.address = address
+        # key được ghi trước khi socket xuất hiện, để client thấy socket là đọc được key
+        self.authkey = _write_authkey(address)
+        self.listener = Listener(address, family="AF_UNIX", authkey=self.authkey)
+        os.chmod(address, 0o600)
+        self.stopping = threading.Event()
+
+    def serve_forever(self):
+        print(f"worker pool: {self.workers} workers on {self.address} (pid {os.getpid()})", flush=True)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    conn = self.listener.accept()
+                except Exception as exc:
+                    # handshake authkey sai, client ngắt giữa chừng...
+                    print(f"worker pool: rejected connection: {exc}", file=sys.stderr, flush=True)
+                    continue
+                if self.stopping.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        self.stopping.set()
+        try:
+            self.listener.close()
+        except OSError:
+            pass
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        for path in (self.address, authkey_path(self.address)):
+            if os.path.lexists(path):
+                os.unlink(path)
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                op = msg.get("op") if isinstance(msg, dict) else None
+                try:
+                    if op == "ping":
+                        conn.send({"ok": True, "pid": os.getpid(), "workers": self.workers})
+                    elif op == "run":
+                        self._run(conn, msg)
+                    elif op == "shutdown":
+                        conn.send({"ok": True})
+                        self.stopping.set()
+                        # accept() đang chặn ở thread chính không tỉnh dậy khi đóng socket: kết nối vào để đánh thức
+                        Client(self.address, family="AF_UNIX", authkey=self.authkey).close()
+                        return
+                    else:
+                        conn.send({"error": f"unknown op {op!r}"})
+                except (EOFError, OSError, BrokenPipeError):
+                    return
+                except Exception as exc:
+                    conn.send({"error": f"{type(exc).__name__}: {exc}"})
+
+    def _run(self, conn, msg):
+        from concurrent.futures import as_completed
+        er = self.exp_runner
+        profile = msg.get("profile")
+        record = msg.get("record")
+        train_kwargs = msg.get("train_kwargs") or {}
+        fields = er.result_fields(profile, record)
+        configs = []
+        for cfg in msg.get("configs", []):
+            cfg = dict(cfg)
+            cfg.setdefault("precision", "fp32")
+            missing = [k for k in er.CONFIG_FIELDS if k not in cfg]
+            if missing:
+                conn.send({"error": f"missing config fields {missing}", "config": cfg})
+                continue
+            configs.append(cfg)
+        # sink riêng cho mỗi request (kết nối SQLite gắn với thread); các request ghi song song
+        # cùng một store vẫn an toàn nhờ WAL và INSERT OR IGNORE
+        sink = er.open_sink(msg["out"], fields, resume=True) if msg.get("out") else None
+        skipped = 0
+        try:
+            if sink is not None:
+                todo = [c for c in configs if er.config_key(*(c[k] for k in er.CONFIG_FIELDS)) not in sink.done]
+                skipped = len(configs) - len(todo)
+                configs = todo
+            futures = {self.pool.submit(er.run_task, [cfg], None, train_kwargs, profile, record): cfg for cfg in configs}
+            ran = 0
+            for fut in as_completed(futures):
+                cfg = futures[fut]
+                try:
+                    rows = fut.result()
+                except Exception as exc:
+                    conn.send({"error": f"{type(exc).__name__}: {exc}", "config": cfg})
+                    continue
+                if sink is not None:
+                    sink.append(rows)
+                ran += 1
+                conn.send({"rows": [dict(zip(fields, r)) for r in rows]})
+        finally:
+            if sink is not None:
+                sink.close()
+        conn.send({"done": True, "ran": ran, "skipped": skipped})
+
+
+def _claim_socket(address):
+    """
+    Chuẩn bị address cho một pool mới: raise ValueError nếu một pool khác còn trả lời ở đó hoặc
+    đường dẫn không phải socket; socket cũ của một pool đã chết thì xoá.
+    """
+    if not os.path.lexists(address):
+        os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+        return
+    if not stat.S_ISSOCK(os.lstat(address).st_mode):
+        raise ValueError(f"{address} exists and is not a socket; pick another --socket")
+    if is_alive(address):
+        raise ValueError(f"a worker pool is already serving on {address}; stop it first or pick another --socket")
+    os.unlink(address)
+
+
+def serve(address=DEFAULT_SOCKET, workers=None, threads_per_worker=1, use_cache=True):
+    """Start the worker processes and serve requests until a shutdown message arrives."""
+    _claim_socket(address)
+    _Server(address, workers, threads_per_worker, use_cache).serve_forever()
+
+
+class WorkerClient:
+    def __init__(self, address=DEFAULT_SOCKET, authkey=None):
+        """authkey: mặc định đọc từ <address>.key do serve ghi."""
+        self.conn = Client(address, family="AF_UNIX",
+                           authkey=authkey if authkey is not None else read_authkey(address))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.conn.close()
+
+    def _call(self, msg):
+        self.conn.send(msg)
+        return self.conn.recv()
+
+    def ping(self):
+        return self._call({"op": "ping"})
+
+    def shutdown(self):
+        return self._call({"op": "shutdown"})
+
+    def run(self, configs, out=None, train_kwargs=None, profile=None, record=None):
+        """
+        Submit configs (dicts with the exp_runner.CONFIG_FIELDS keys; precision defaults to fp32)
+        and yield the server's reply messages as they arrive, ending with the {"done": True, ...} one.
+        """
+        self.conn.send({"op": "run", "configs": list(configs), "out": out,
+                        "train_kwargs": train_kwargs or {}, "profile": profile, "record": record})
+        while True:
+            reply = self.conn.recv()
+            yield reply
+            if reply.get("done") or ("error" in reply and "config" not in reply):
+                return
+
+
+def is_alive(address=DEFAULT_SOCKET, authkey=None):
+    """True nếu một pool trả lời trên address (kể cả pool có authkey khác với key file hiện tại)."""
+    if not os.path.lexists(address):
+        return False
+    try:
+        authkey = authkey if authkey is not None else read_authkey(address)
+    except ValueError:
+        # chưa có key file: vẫn bắt tay để biết có ai đang nghe không
+        authkey = b""
+    try:
+        with WorkerClient(address, authkey) as client:
+            return bool(client.ping().get("ok"))
+    except AuthenticationError:
+        return True
+    except (OSError, EOFError):
+        return False
+
+
+def _read_configs(path):
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        return [json.loads(line) for line in f if line.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Persistent worker pool for experiment runs")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", help="start the pool and listen on the socket")
+    p_serve.add_argument("--workers", type=int, default=None)
+    p_serve.add_argument("--threads_per_worker", type=int, default=1)
+    p_serve.add_argument("--no_cache", action="store_true")
+    p_run = sub.add_parser("run", help="run configs (JSON lines) on the pool, print result rows as JSON lines")
+    p_run.add_argument("--configs", default="-", help="file with one JSON config per line ('-' = stdin)")
+    p_run.add_argument("--out", default=None, help="also append rows to this results file (.sqlite or .csv)")
+    p_run.add_argument("--deferred_metrics", action="store_true")
+    p_run.add_argument("--fused", choices=["auto", "script", "compile", "eager"], default=None)
+    p_run.add_argument("--backend", choices=["auto", "torch", "numpy"], default="torch")
+    p_run.add_argument("--latency", action="store_true", help="add update_p50/p90/p99/max to each row")
+    sub.add_parser("ping", help="exit 0 if a pool is listening")
+    sub.add_parser("stop", help="ask the pool to shut down")
+    for p in (p_serve, p_run) + tuple(sub.choices[c] for c in ("ping", "stop")):
+        p.add_argument("--socket", default=DEFAULT_SOCKET)
+    args = parser.parse_args(argv)
+    if args.cmd == "run" and args.latency and args.fused:
+        p_run.error("--latency cannot be combined with --fused")
+
+    if args.cmd == "serve":
+        serve(args.socket, args.workers, args.threads_per_worker, use_cache=not args.no_cache)
+        return 0
+    if args.cmd == "ping":
+        return 0 if is_alive(args.socket) else 1
+    with WorkerClient(args.socket) as client:
+        if args.cmd == "stop":
+            client.shutdown()
+            return 0
+        status = 0
+        train_kwargs = {"deferred_metrics": args.deferred_metrics, "fused": args.fused, "backend": args.backend}
+        record = {"trace_dir": None} if args.latency else None
+        for reply in client.run(_read_configs(args.configs), out=args.out, train_kwargs=train_kwargs,
+                                record=record):
+            if "rows" in reply:
+                for row in reply["rows"]:
+                    print(json.dumps(row), flush=True)
+            elif "error" in reply:
+                print(f"error: {reply['error']} {json.dumps(reply.get('config'))}", file=sys.stderr, flush=True)
+                status = 1
+            elif reply.get("done"):
+                print(f"ran {reply['ran']}, skipped {reply['skipped']} already stored", file=sys.stderr)
+        return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
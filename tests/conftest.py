@@ -0,0 +1,7 @@
+import os
+import sys
+
+# chạy được cả `pytest` lẫn `python -m pytest` từ project root: `import src.*` cần root trong sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
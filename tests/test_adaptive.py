@@ -0,0 +1,28 @@
+"""Arm grid and CLI guards of the adaptive sweep (exp_runner.run_adaptive)."""
+import sys
+
+import pytest
+
+from src.exp_runner import DEFAULT_GRID, adaptive_arms, main
+
+
+def test_omega_arms_collapse_lr():
+    params = dict(DEFAULT_GRID, updaters=['Omega', 'Delta'], windows=[5, 10], lrs=[0.01, 0.1, 1.0],
+                  regs=[0.0, 1e-3])
+    arms = adaptive_arms(params, mem_size=20, dim=10, precision='fp32')
+    omega = [a for a in arms if a['updater'] == 'Omega']
+    delta = [a for a in arms if a['updater'] == 'Delta']
+    # Omega không dùng lr: một arm cho mỗi (window, reg)
+    assert len(omega) == 2 * 2 and {a['lr'] for a in omega} == {0.01}
+    assert len(delta) == 2 * 3 * 2
+    keys = [tuple(sorted(a.items())) for a in arms]
+    assert len(set(keys)) == len(keys)
+    assert all(a['mem_size'] == 20 and a['dim'] == 10 and a['precision'] == 'fp32' for a in arms)
+
+
+@pytest.mark.parametrize("flags", [["--adaptive", "--fused", "eager"], ["--hyperband", "--fused", "auto"],
+                                   ["--adaptive", "--batched"]])
+def test_adaptive_rejects_loops_without_early_stop(monkeypatch, tmp_path, flags):
+    monkeypatch.setattr(sys, 'argv', ['exp_runner', '--out', str(tmp_path / 'r.csv')] + flags)
+    with pytest.raises(SystemExit):
+        main()
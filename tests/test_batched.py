@@ -0,0 +1,33 @@
+"""train_model_batched against one scalar train_model per stream."""
+import pytest
+
+from src.train import train_model, train_model_batched
+
+# cùng phép tính cho từng stream; chỉ thứ tự cộng của bmm khác mv nên fp32 lệch ở mức làm tròn
+TOLERANCE = {'fp64': 1e-12, 'fp32': 1e-5}
+
+
+@pytest.mark.parametrize("precision", ['fp32', 'fp64'])
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+@pytest.mark.parametrize("updater", ['Delta', 'Omega'])
+def test_batched_matches_scalar(updater, reg, precision):
+    # lr/seed khác nhau giữa các stream, hai stream cùng seed
+    lrs, regs, seeds = [0.01, 0.05, 0.01], [reg, reg, reg / 2], [0, 0, 1]
+    batched = train_model_batched(20, 10, 5, 300, lrs, regs, seeds, updater, precision=precision)
+    assert len(batched) == len(seeds)
+    for row, lr, r, seed in zip(batched, lrs, regs, seeds):
+        single = train_model(20, 10, 5, 300, lr, r, seed, updater, precision=precision)
+        for i in (0, 1, 3):
+            assert row[i] == pytest.approx(single[i], rel=TOLERANCE[precision])
+
+
+@pytest.mark.parametrize("updater", ['Delta', 'Omega'])
+def test_batched_checkpoints_match_scalar(updater):
+    cps = [50, 120, 300]
+    lrs, regs, seeds = [0.01, 0.02], [0.0, 1e-3], [3, 4]
+    batched = train_model_batched(20, 10, 5, 300, lrs, regs, seeds, updater, precision='fp64', checkpoints=cps)
+    for s, (lr, reg, seed) in enumerate(zip(lrs, regs, seeds)):
+        single = train_model(20, 10, 5, 300, lr, reg, seed, updater, precision='fp64', checkpoints=cps)
+        for per_cp, ref in zip(batched, single):
+            for i in (0, 1, 3):
+                assert per_cp[s][i] == pytest.approx(ref[i], rel=1e-12)
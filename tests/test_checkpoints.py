@@ -0,0 +1,49 @@
+"""Prefix-stable data (version=3) and checkpointed metrics against separate runs."""
+import pytest
+import torch
+
+from src.data import STREAM_BLOCK, generate_data
+from src.train import train_model, train_model_batched
+
+NS = [1, 37, 200, 450]
+
+
+@pytest.mark.parametrize("dependency", ["ar", "mix", "patterns"])
+def test_version3_prefix_stable(dependency):
+    N = STREAM_BLOCK + 50
+    keys, values = generate_data(dim=12, steps=N, mem_size=9, dependency=dependency, window=5, seed=1, version=3)
+    for n in (1, 100, STREAM_BLOCK, STREAM_BLOCK + 1):
+        k, v = generate_data(dim=12, steps=n, mem_size=9, dependency=dependency, window=5, seed=1, version=3)
+        assert torch.equal(k, keys[:n])
+        assert torch.equal(v, values[:n])
+
+
+def _without_time(row):
+    mse_mean, cos_mean, _, mem_norm_change = row
+    return mse_mean, cos_mean, mem_norm_change
+
+
+@pytest.mark.parametrize("updater", ["Delta", "Omega"])
+@pytest.mark.parametrize("deferred", [False, True])
+def test_checkpoints_equal_separate_runs(updater, deferred):
+    marks = train_model(20, 10, 5, None, 0.01, 0.1, 0, updater, checkpoints=NS, data_version=3,
+                        deferred_metrics=deferred)
+    for n, row in zip(NS, marks):
+        single = train_model(20, 10, 5, n, 0.01, 0.1, 0, updater, data_version=3, deferred_metrics=deferred)
+        assert _without_time(row) == _without_time(single)
+
+
+@pytest.mark.parametrize("updater", ["Delta", "Omega"])
+def test_batched_checkpoints_equal_separate_runs(updater):
+    lrs, regs, seeds = [0.01, 0.1], [0.1, 0.0], [0, 1]
+    marks = train_model_batched(20, 10, 5, None, lrs, regs, seeds, updater, checkpoints=NS, data_version=3)
+    for n, rows in zip(NS, marks):
+        single = train_model_batched(20, 10, 5, n, lrs, regs, seeds, updater, data_version=3)
+        assert [_without_time(r) for r in rows] == [_without_time(r) for r in single]
+
+
+def test_chunked_delta_checkpoints():
+    marks = train_model(20, 10, 5, None, 0.01, 0.1, 0, 'Delta', checkpoints=NS, data_version=3, chunk_size=64)
+    for n, row in zip(NS, marks):
+        single = train_model(20, 10, 5, n, 0.01, 0.1, 0, 'Delta', data_version=3)
+        assert _without_time(row) == pytest.approx(_without_time(single), rel=1e-4)
@@ -0,0 +1,61 @@
+"""Chunkwise Delta (delta_chunk / update_chunk / chunk_size) against the sequential Delta rule."""
+import pytest
+import torch
+
+from src.models.delta_updater import DeltaUpdater as ModelDeltaUpdater
+from src.train import train_model
+from src.updaters import DeltaUpdater, delta_chunk
+
+
+def _stream(steps, dim, mem_size, dtype=torch.float64, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    # keys chuẩn hoá về chuẩn ~1 để lr * ||x||^2 < 2 (luật Delta ổn định)
+    keys = torch.randn(steps, dim, generator=g, dtype=dtype) / dim ** 0.5
+    values = torch.randn(steps, mem_size, generator=g, dtype=dtype)
+    return keys, values
+
+
+@pytest.mark.parametrize("lr, reg", [(0.1, 0.0), (0.5, 0.0), (0.1, 0.05)])
+@pytest.mark.parametrize("chunk", [1, 7, 64])
+def test_delta_chunk_matches_sequential(lr, reg, chunk):
+    keys, values = _stream(128, 10, 20)
+    updater = DeltaUpdater(lr=lr, reg=reg)
+    seq = torch.randn(20, 10, generator=torch.Generator().manual_seed(1), dtype=torch.float64)
+    memory = seq.clone()
+    seq_preds = []
+    for x, y in zip(keys, values):
+        seq_preds.append(seq @ x)
+        seq = updater.update(seq, x, y)
+    preds = []
+    for s in range(0, 128, chunk):
+        memory, p = delta_chunk(memory, keys[s:s + chunk], values[s:s + chunk], lr, reg)
+        preds.append(p)
+    torch.testing.assert_close(memory, seq, rtol=1e-10, atol=1e-10)
+    torch.testing.assert_close(torch.cat(preds), torch.stack(seq_preds), rtol=1e-10, atol=1e-10)
+
+
+def test_update_chunk_precision():
+    keys, values = _stream(64, 10, 20, dtype=torch.float32)
+    updater = DeltaUpdater(lr=0.1, precision='fp32')
+    memory, preds = updater.update_chunk(torch.zeros(20, 10), keys, values)
+    seq = torch.zeros(20, 10)
+    for x, y in zip(keys, values):
+        seq = updater.update(seq, x, y)
+    assert memory.dtype == torch.float32 and preds.shape == (64, 20)
+    torch.testing.assert_close(memory, seq, rtol=1e-4, atol=1e-5)
+
+
+def test_model_updater_chunk_size():
+    keys, values = _stream(50, 8, 8, dtype=torch.float32)
+    kv_pairs = list(zip(keys, values))
+    seq = ModelDeltaUpdater(8, 8, lr=0.1).update(kv_pairs)
+    chunked = ModelDeltaUpdater(8, 8, lr=0.1).update(kv_pairs, chunk_size=16)
+    torch.testing.assert_close(chunked, seq, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_train_model_chunk_size(reg):
+    base = train_model(20, 10, 5, 500, 0.01, reg, 0, 'Delta')
+    chunked = train_model(20, 10, 5, 500, 0.01, reg, 0, 'Delta', chunk_size=64)
+    for i in (0, 1, 3):
+        assert chunked[i] == pytest.approx(base[i], rel=1e-4)
@@ -0,0 +1,41 @@
+"""Fused step kernels (src.fused) against the unfused training loop."""
+import pytest
+
+from src.fused import get_scan
+from src.train import train_model
+
+# 'compile' cần trình biên dịch C++ và tốn vài giây mỗi shape; script và eager đủ cho phép so sánh
+BACKENDS = ["script", "eager"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_fused_delta_equal(backend, reg):
+    base = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Delta')
+    fused = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Delta', fused=backend)
+    for i in (0, 1, 3):
+        assert fused[i] == base[i]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("window, reg", [(5, 0.0), (5, 0.1), (20, 1e-3)])
+def test_fused_omega_close(backend, window, reg):
+    # ring cố định đệm 0 thay cho cửa sổ đang lớn dần: bằng nhau tới sai số làm tròn
+    base = train_model(20, 10, window, 300, 0.01, reg, 0, 'Omega')
+    fused = train_model(20, 10, window, 300, 0.01, reg, 0, 'Omega', fused=backend)
+    for i in (0, 1, 3):
+        assert fused[i] == pytest.approx(base[i], rel=1e-4)
+
+
+def test_fused_checkpoints():
+    marks = train_model(20, 10, 5, None, 0.01, 0.1, 0, 'Delta', fused='eager', checkpoints=[50, 300], data_version=3)
+    for n, row in zip([50, 300], marks):
+        single = train_model(20, 10, 5, n, 0.01, 0.1, 0, 'Delta', data_version=3)
+        assert (row[0], row[1], row[3]) == (single[0], single[1], single[3])
+
+
+def test_kernel_cache_keyed_on_shape():
+    a = get_scan('Delta', 20, 10, backend='eager')
+    assert get_scan('Delta', 20, 10, backend='eager') is a
+    assert get_scan('Omega', 20, 10, window=5, reg=0.1, backend='eager') is \
+        get_scan('Omega', 20, 10, window=5, reg=0.5, backend='eager')
@@ -0,0 +1,40 @@
+"""DeltaUpdater(inplace=True) against the default out-of-place step."""
+import pytest
+import torch
+
+from src.train import train_model
+from src.updaters import DeltaUpdater
+
+# mul_ + addr_ làm tròn khác memory - lr * (ger + reg * memory) ở bit cuối
+TOLERANCE = {torch.float32: dict(rtol=1e-5, atol=1e-6), torch.float64: dict(rtol=1e-12, atol=1e-13)}
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_inplace_matches_default(dtype, reg):
+    g = torch.Generator().manual_seed(0)
+    keys = torch.randn(50, 10, generator=g, dtype=dtype)
+    values = torch.randn(50, 20, generator=g, dtype=dtype)
+    ref, mem = torch.zeros(20, 10, dtype=dtype), torch.zeros(20, 10, dtype=dtype)
+    default, inplace = DeltaUpdater(lr=0.05, reg=reg), DeltaUpdater(lr=0.05, reg=reg, inplace=True)
+    for x, y in zip(keys, values):
+        ref = default.update(ref, x, y)
+        out = inplace.update(mem, x, y)
+        # ghi đè lên chính memory được truyền vào
+        assert out is mem
+        torch.testing.assert_close(mem, ref, **TOLERANCE[dtype])
+
+
+@pytest.mark.parametrize("precision", ['fp32', 'fp64'])
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_train_model_inplace(precision, reg):
+    base = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Delta', precision=precision)
+    inplace = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Delta', precision=precision,
+                          updater_kwargs={'inplace': True})
+    for i in (0, 1, 3):
+        assert inplace[i] == pytest.approx(base[i], rel=1e-4)
+
+
+def test_inplace_rejects_mixed_precision():
+    with pytest.raises(ValueError):
+        DeltaUpdater(inplace=True, precision='bf16_fp32')
@@ -0,0 +1,62 @@
+"""LowRankMemory (U V^T) and the rank= path of train_model against dense memory."""
+import math
+
+import pytest
+import torch
+
+from src.lowrank import LowRankMemory
+from src.train import train_model
+
+
+def test_exact_when_rank_covers_true_rank():
+    # 30 số hạng rank-1 trong một không gian con 4 chiều: hạng thật 4 <= max_rank, nén không mất gì
+    g = torch.Generator().manual_seed(0)
+    A = torch.randn(20, 4, generator=g, dtype=torch.float64)
+    B = torch.randn(10, 4, generator=g, dtype=torch.float64)
+    memory = LowRankMemory.zeros(20, 10, max_rank=5, dtype=torch.float64)
+    dense = torch.zeros(20, 10, dtype=torch.float64)
+    for _ in range(30):
+        u = A @ torch.randn(4, generator=g, dtype=torch.float64)
+        v = B @ torch.randn(4, generator=g, dtype=torch.float64)
+        memory.add_rank1_(u, v, alpha=-0.1)
+        dense.add_(torch.outer(u, v), alpha=-0.1)
+    assert memory.rank <= 10
+    torch.testing.assert_close(memory.to_dense(), dense, rtol=1e-10, atol=1e-10)
+    x = torch.randn(10, generator=g, dtype=torch.float64)
+    torch.testing.assert_close(memory @ x, dense @ x, rtol=1e-10, atol=1e-10)
+    assert memory.norm().item() == pytest.approx(dense.norm().item(), rel=1e-10)
+
+
+def test_compress_keeps_best_approximation():
+    g = torch.Generator().manual_seed(1)
+    M = torch.randn(20, 10, generator=g, dtype=torch.float64)
+    low = LowRankMemory(M, torch.eye(10, dtype=torch.float64), max_rank=3)
+    U, S, Vh = torch.linalg.svd(M, full_matrices=False)
+    torch.testing.assert_close(low.to_dense(), (U[:, :3] * S[:3]) @ Vh[:3], rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_delta_full_rank_matches_dense(reg):
+    dense = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Delta')
+    low = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Delta', rank=10)
+    for i in (0, 1, 3):
+        assert low[i] == pytest.approx(dense[i], rel=1e-4)
+
+
+@pytest.mark.parametrize("window, reg", [(5, 0.0), (5, 0.1), (8, 1e-3)])
+def test_omega_window_within_rank_matches_dense(window, reg):
+    dense = train_model(20, 10, window, 300, 0.01, reg, 0, 'Omega')
+    low = train_model(20, 10, window, 300, 0.01, reg, 0, 'Omega', rank=8)
+    for i in (0, 1, 3):
+        assert low[i] == pytest.approx(dense[i], rel=1e-3)
+
+
+@pytest.mark.parametrize("precision", ["bf16", "bf16_fp32"])
+@pytest.mark.parametrize("updater", ["Delta", "Omega"])
+@pytest.mark.parametrize("deferred", [False, True])
+def test_bf16_recompression(precision, updater, deferred):
+    # rank 4 < số bước: buffer đầy và phải nén lại nhiều lần ở storage bf16
+    out = train_model(20, 10, 5, 200, 0.01, 0.1, 0, updater, rank=4, precision=precision, deferred_metrics=deferred)
+    assert all(math.isfinite(v) for v in out)
+    ref = train_model(20, 10, 5, 200, 0.01, 0.1, 0, updater, rank=4, precision='fp32', deferred_metrics=deferred)
+    assert out[0] == pytest.approx(ref[0], rel=0.1)
@@ -0,0 +1,32 @@
+"""MultiWindowOmega (every window in one pass) against one OmegaUpdater per window."""
+import pytest
+import torch
+
+from src.train import train_model, train_model_multiwindow
+from src.updaters import MultiWindowOmega, OmegaUpdater
+
+WINDOWS = [1, 4, 6, 20]
+
+
+@pytest.mark.parametrize("reg", [0.0, 1e-3, 0.1])
+def test_multiwindow_matches_per_window(reg):
+    g = torch.Generator().manual_seed(0)
+    keys = torch.randn(80, 10, generator=g, dtype=torch.float64)
+    values = torch.randn(80, 15, generator=g, dtype=torch.float64)
+    multi = MultiWindowOmega(WINDOWS[::-1] + [4], reg=reg)
+    assert multi.windows == WINDOWS
+    singles = [OmegaUpdater(window=w, reg=reg) for w in WINDOWS]
+    memory = torch.zeros(15, 10, dtype=torch.float64)
+    for x, y in zip(keys, values):
+        W = multi.update(x, y)
+        for k, updater in enumerate(singles):
+            torch.testing.assert_close(W[k], updater.update(memory, x, y), rtol=1e-8, atol=1e-8)
+
+
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_train_model_multiwindow(reg):
+    out = train_model_multiwindow(20, 10, WINDOWS, 300, reg, 0, data_window=5)
+    for w in WINDOWS:
+        single = train_model(20, 10, w, 300, 0.01, reg, 0, 'Omega', data_window=5)
+        for i in (0, 1, 3):
+            assert out[w][i] == pytest.approx(single[i], rel=1e-4)
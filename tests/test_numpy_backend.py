@@ -0,0 +1,84 @@
+"""NumPy step-loop backend (src.numpy_backend) against the torch path."""
+import inspect
+
+import numpy as np
+import pytest
+import torch
+
+from src import numpy_backend
+from src.data import generate_data
+from src.train import train_model
+from src.updaters import DeltaUpdater, ridge_solve
+
+
+@pytest.mark.parametrize("version", [1, 2, 3])
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_numpy_data_equal(version, dtype):
+    keys, values = generate_data(dim=10, steps=200, mem_size=20, seed=0, version=version, dtype=dtype)
+    np_keys, np_values = generate_data(dim=10, steps=200, mem_size=20, seed=0, version=version, dtype=dtype,
+                                       backend="numpy")
+    assert np.array_equal(np_keys, keys.numpy()) and np_keys.dtype == keys.numpy().dtype
+    assert np.array_equal(np_values, values.numpy())
+
+
+@pytest.mark.parametrize("dim, n, reg", [(10, 5, 0.1), (10, 30, 0.1), (10, 5, 0.0), (10, 30, 0.0)])
+def test_ridge_solve_matches_torch(dim, n, reg):
+    g = torch.Generator().manual_seed(0)
+    X = torch.randn(dim, n, generator=g, dtype=torch.float64)
+    Y = torch.randn(20, n, generator=g, dtype=torch.float64)
+    np.testing.assert_allclose(numpy_backend.ridge_solve(X.numpy(), Y.numpy(), reg),
+                               ridge_solve(X, Y, reg).numpy(), rtol=1e-8, atol=1e-10)
+
+
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_delta_updater_matches_torch(reg):
+    g = torch.Generator().manual_seed(0)
+    keys = torch.randn(100, 10, generator=g, dtype=torch.float64)
+    values = torch.randn(100, 20, generator=g, dtype=torch.float64)
+    memory = torch.zeros(20, 10, dtype=torch.float64)
+    np_memory = memory.numpy().copy()
+    updater, np_updater = DeltaUpdater(lr=0.01, reg=reg), numpy_backend.NumpyDeltaUpdater(lr=0.01, reg=reg)
+    for x, y in zip(keys, values):
+        memory = updater.update(memory, x, y)
+        np_memory = np_updater.update(np_memory, x.numpy(), y.numpy())
+    np.testing.assert_allclose(np_memory, memory.numpy(), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("updater", ["Delta", "Omega"])
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+@pytest.mark.parametrize("precision", ["fp32", "fp64"])
+def test_train_model_numpy_matches_torch(updater, reg, precision):
+    # khác BLAS (thứ tự cộng của matvec) nên chỉ bằng nhau tới sai số làm tròn
+    torch_run = train_model(20, 10, 5, 400, 0.01, reg, 0, updater, precision=precision)
+    np_run = train_model(20, 10, 5, 400, 0.01, reg, 0, updater, precision=precision, backend='numpy')
+    for i in (0, 1, 3):
+        assert np_run[i] == pytest.approx(torch_run[i], rel=1e-5)
+
+
+def test_checkpoints_match_torch():
+    torch_marks = train_model(20, 10, 5, None, 0.01, 0.1, 0, 'Omega', checkpoints=[10, 200], data_version=3)
+    np_marks = train_model(20, 10, 5, None, 0.01, 0.1, 0, 'Omega', checkpoints=[10, 200], data_version=3,
+                           backend='numpy')
+    for t, n in zip(torch_marks, np_marks):
+        for i in (0, 1, 3):
+            assert n[i] == pytest.approx(t[i], rel=1e-5)
+
+
+def test_select_backend():
+    assert numpy_backend.select_backend('auto', 20, 10) == 'numpy'
+    assert numpy_backend.select_backend('auto', 256, 256) == 'torch'
+    assert numpy_backend.select_backend('torch', 20, 10) == 'torch'
+    with pytest.raises(ValueError):
+        numpy_backend.select_backend('jax', 20, 10)
+
+
+def test_torch_is_default():
+    # mặc định không đổi kết quả của các caller cũ: 'auto' / 'numpy' phải được yêu cầu
+    assert inspect.signature(train_model).parameters['backend'].default == 'torch'
+
+
+def test_forced_numpy_rejects_torch_only_options():
+    with pytest.raises(ValueError):
+        train_model(20, 10, 5, 100, 0.01, 0.1, 0, 'Delta', backend='numpy', chunk_size=16)
+    with pytest.raises(ValueError):
+        train_model(20, 10, 5, 100, 0.01, 0.1, 0, 'Delta', backend='numpy', precision='bf16')
@@ -0,0 +1,36 @@
+"""omega_offline (all windows at once) against the sequential OmegaUpdater loop."""
+import pytest
+import torch
+
+from src.train import train_model
+from src.updaters import OmegaUpdater, omega_offline
+
+
+def _loop(keys, values, window, reg):
+    updater = OmegaUpdater(window=window, reg=reg)
+    memory = torch.zeros(values.shape[1], keys.shape[1], dtype=keys.dtype)
+    preds = []
+    for x, y in zip(keys, values):
+        preds.append(memory @ x)
+        memory = updater.update(memory, x, y)
+    return torch.stack(preds), memory
+
+
+@pytest.mark.parametrize("window, reg", [(1, 0.1), (5, 1e-3), (12, 0.1), (4, 0.0), (16, 0.0)])
+@pytest.mark.parametrize("chunk_size", [7, 1024])
+def test_offline_matches_loop(window, reg, chunk_size):
+    g = torch.Generator().manual_seed(0)
+    keys = torch.randn(120, 8, generator=g, dtype=torch.float64)
+    values = torch.randn(120, 15, generator=g, dtype=torch.float64)
+    preds, memory = omega_offline(keys, values, window, reg, chunk_size=chunk_size)
+    ref_preds, ref_memory = _loop(keys, values, window, reg)
+    torch.testing.assert_close(preds, ref_preds, rtol=1e-8, atol=1e-8)
+    torch.testing.assert_close(memory, ref_memory, rtol=1e-8, atol=1e-8)
+
+
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_train_model_offline(reg):
+    base = train_model(20, 10, 5, 400, 0.01, reg, 0, 'Omega')
+    offline = train_model(20, 10, 5, 400, 0.01, reg, 0, 'Omega', offline=True, chunk_size=128)
+    for i in (0, 1, 3):
+        assert offline[i] == pytest.approx(base[i], rel=1e-4)
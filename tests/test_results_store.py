@@ -0,0 +1,65 @@
+"""ResultsStore: deduplication by config_hash, persistence and SQLite-side queries."""
+import pytest
+
+from src.exp_runner import CONFIG_FIELDS
+from src.results_store import ResultsStore
+
+
+def _row(updater='Omega', window=5, seed=0, mse_mean=0.5, **extra):
+    row = dict(mem_size=20, dim=10, window=window, steps=300, lr=0.01, reg=0.0, seed=seed,
+               updater=updater, precision='fp32', mse_mean=mse_mean)
+    row.update(extra)
+    return row
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ResultsStore(str(tmp_path / "results.sqlite"), key_fields=CONFIG_FIELDS)
+    yield s
+    s.close()
+
+
+def test_same_row_twice_is_stored_once(store):
+    assert store.add([_row()]) == 1
+    assert store.add([_row()]) == 0
+    assert len(store) == 1
+    # cùng config, metric khác: vẫn bị bỏ qua (INSERT OR IGNORE)
+    assert store.add([_row(mse_mean=9.0), _row()]) == 0
+    assert store.query(columns=['updater', 'window', 'mse_mean']) == [
+        {'updater': 'Omega', 'window': 5, 'mse_mean': 0.5}]
+    assert store.done() == {tuple(_row()[k] for k in CONFIG_FIELDS)}
+
+
+def test_rows_persist_across_reopen(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    s = ResultsStore(path, key_fields=CONFIG_FIELDS)
+    s.add([_row(seed=0), _row(seed=1)])
+    s.close()
+    s = ResultsStore(path, key_fields=CONFIG_FIELDS)
+    assert len(s) == 2
+    assert s.add([_row(seed=1)]) == 0
+    s.close()
+
+
+def test_query_where_group_by_agg(store):
+    rows = [_row('Omega', 5, 0, 0.1), _row('Omega', 5, 1, 0.3), _row('Omega', 10, 0, 0.5),
+            _row('Delta', 5, 0, 1.0), _row('Delta', 10, 0, 2.0, phase_update=0.25)]
+    assert store.add(rows) == 5
+    got = store.query(columns=['seed', 'mse_mean'], where={'updater': 'Omega', 'window': [5]}, order_by=['seed'])
+    assert got == [{'seed': 0, 'mse_mean': 0.1}, {'seed': 1, 'mse_mean': 0.3}]
+    got = store.query(group_by=['updater'], agg={'mse_mean': 'avg', 'seed': 'count'}, order_by=['updater'])
+    assert got == [{'updater': 'Delta', 'mse_mean_avg': pytest.approx(1.5), 'seed_count': 2},
+                   {'updater': 'Omega', 'mse_mean_avg': pytest.approx(0.3), 'seed_count': 3}]
+    # cột thêm về sau (profile) được tạo khi ghi, dòng cũ nhận NULL
+    assert store.query(columns=['phase_update'], where={'updater': 'Delta'}, order_by=['window']) == [
+        {'phase_update': None}, {'phase_update': 0.25}]
+    assert store.query(columns=['mse_mean'], where={'missing_column': 1}) == []
+    with pytest.raises(ValueError):
+        store.query(group_by=['updater'], agg={'mse_mean': 'median'})
+
+
+def test_clear(store):
+    store.add([_row(seed=s) for s in range(3)])
+    store.clear()
+    assert len(store) == 0
+    assert store.add([_row()]) == 1
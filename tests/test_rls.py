@@ -0,0 +1,80 @@
+"""OmegaUpdater(incremental=True) (sliding-window RLS) against the full window solve."""
+import pytest
+import torch
+
+from src.train import train_model
+from src.updaters import OmegaUpdater
+
+
+def _stream(steps, dim, mem_size, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    keys = torch.randn(steps, dim, generator=g, dtype=torch.float64)
+    values = torch.randn(steps, mem_size, generator=g, dtype=torch.float64)
+    return keys, values
+
+
+@pytest.mark.parametrize("window, reg", [(5, 1e-3), (20, 1e-2), (8, 1.0)])
+@pytest.mark.parametrize("refresh_every, drift_tol", [(256, 1e-4), (3, 1e-4), (0, 1e-4), (0, 1e-12)])
+def test_incremental_matches_full_solve(window, reg, refresh_every, drift_tol):
+    keys, values = _stream(150, 10, 20)
+    memory = torch.zeros(20, 10, dtype=torch.float64)
+    full = OmegaUpdater(window=window, reg=reg)
+    rls = OmegaUpdater(window=window, reg=reg, incremental=True, refresh_every=refresh_every, drift_tol=drift_tol)
+    for x, y in zip(keys, values):
+        # sai số tương đối của P được giữ dưới drift_tol (1e-4) trước khi khuếch đại bởi cond(G)
+        torch.testing.assert_close(rls.update(memory, x, y), full.update(memory, x, y), rtol=1e-5, atol=1e-7)
+
+
+def test_drift_triggers_refresh(monkeypatch):
+    # refresh_every=0 tắt refresh định kỳ: mọi lần tính lại đều do drift vượt drift_tol
+    keys, values = _stream(100, 10, 20)
+    rls = OmegaUpdater(window=5, reg=1e-3, incremental=True, refresh_every=0, drift_tol=1e-12)
+    calls = []
+    refresh = rls._refresh
+    monkeypatch.setattr(rls, "_refresh", lambda: (calls.append(1), refresh()))
+    memory = torch.zeros(20, 10, dtype=torch.float64)
+    for x, y in zip(keys, values):
+        rls.update(memory, x, y)
+    assert calls
+
+
+def test_reg0_keeps_full_path():
+    keys, values = _stream(30, 10, 20)
+    memory = torch.zeros(20, 10, dtype=torch.float64)
+    full = OmegaUpdater(window=5)
+    rls = OmegaUpdater(window=5, incremental=True)
+    assert not rls.incremental
+    for x, y in zip(keys, values):
+        assert torch.equal(rls.update(memory, x, y), full.update(memory, x, y))
+
+
+def test_train_model_incremental():
+    base = train_model(20, 10, 8, 300, 0.01, 1e-3, 0, 'Omega')
+    rls = train_model(20, 10, 8, 300, 0.01, 1e-3, 0, 'Omega', updater_kwargs={'incremental': True})
+    # trạng thái RLS ở float64, vòng lặp gốc ở float32
+    assert rls[0] == pytest.approx(base[0], rel=1e-4)
+    assert rls[1] == pytest.approx(base[1], rel=1e-4)
+    assert rls[3] == pytest.approx(base[3], rel=1e-4)
+
+
+def test_returns_copy_not_state():
+    # W trả về không được là self._W: các bước sau sửa trạng thái tại chỗ
+    keys, values = _stream(20, 10, 20)
+    memory = torch.zeros(20, 10, dtype=torch.float64)
+    rls = OmegaUpdater(window=5, reg=1e-2, incremental=True)
+    W = rls.update(memory, keys[0], values[0])
+    before = W.clone()
+    for x, y in zip(keys[1:], values[1:]):
+        rls.update(memory, x, y)
+    assert torch.equal(W, before)
+
+
+@pytest.mark.parametrize("drift_check_every", [1, 7, 64])
+def test_drift_check_period(drift_check_every):
+    keys, values = _stream(150, 10, 20)
+    memory = torch.zeros(20, 10, dtype=torch.float64)
+    full = OmegaUpdater(window=8, reg=1e-3)
+    rls = OmegaUpdater(window=8, reg=1e-3, incremental=True, refresh_every=0, drift_tol=1e-8,
+                       drift_check_every=drift_check_every)
+    for x, y in zip(keys, values):
+        torch.testing.assert_close(rls.update(memory, x, y), full.update(memory, x, y), rtol=1e-5, atol=1e-7)
@@ -0,0 +1,83 @@
+"""Shape-based Omega solver dispatch (choose_solver / ridge_solve) against the explicit formula."""
+import pytest
+import torch
+
+from src.train import train_model, train_model_batched
+from src.updaters import OmegaUpdater, choose_solver, ridge_solve, spd_solve
+
+
+def _reference(X, Y, reg):
+    if reg > 0:
+        I = torch.eye(X.shape[0], dtype=X.dtype)
+        return Y @ X.t() @ torch.inverse(X @ X.t() + reg * I)
+    return Y @ torch.linalg.pinv(X)
+
+
+def _window(dim, n, mem_size, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    return (torch.randn(dim, n, generator=g, dtype=torch.float64),
+            torch.randn(mem_size, n, generator=g, dtype=torch.float64))
+
+
+@pytest.mark.parametrize("dim, n", [(10, 3), (10, 25), (64, 8), (8, 64)])
+@pytest.mark.parametrize("solver, reg", [("primal", 1e-3), ("dual", 1e-3), ("primal", 1.0), ("dual", 1.0),
+                                         ("lstsq", 0.0), ("pinv", 0.0), (None, 0.1), (None, 0.0)])
+def test_solvers_match_formula(dim, n, solver, reg):
+    X, Y = _window(dim, n, 20)
+    torch.testing.assert_close(ridge_solve(X, Y, reg, solver), _reference(X, Y, reg), rtol=1e-8, atol=1e-8)
+
+
+@pytest.mark.parametrize("reg", [0.0, 0.1])
+def test_batched_matches_single(reg):
+    g = torch.Generator().manual_seed(1)
+    X = torch.randn(4, 10, 6, generator=g, dtype=torch.float64)
+    Y = torch.randn(4, 20, 6, generator=g, dtype=torch.float64)
+    W = ridge_solve(X, Y, reg)
+    for b in range(4):
+        torch.testing.assert_close(W[b], _reference(X[b], Y[b], reg), rtol=1e-8, atol=1e-8)
+    if reg > 0:
+        regs = torch.tensor([[0.1], [0.2], [0.5], [1.0]], dtype=torch.float64)
+        W = ridge_solve(X, Y, regs)
+        for b in range(4):
+            torch.testing.assert_close(W[b], _reference(X[b], Y[b], regs[b, 0].item()), rtol=1e-8, atol=1e-8)
+
+
+def test_choose_solver_follows_shape():
+    assert choose_solver(256, 10, 256, True) == 'dual'
+    assert choose_solver(10, 256, 20, True) == 'primal'
+    assert choose_solver(64, 64, 64, False) == 'lstsq'
+    assert choose_solver(256, 10, 256, False) == 'pinv'
+
+
+def test_solver_reg_mismatch_raises():
+    X, Y = _window(10, 5, 20)
+    with pytest.raises(ValueError):
+        ridge_solve(X, Y, 0.1, 'lstsq')
+    with pytest.raises(ValueError):
+        ridge_solve(X, Y, 0.0, 'dual')
+    with pytest.raises(ValueError):
+        OmegaUpdater(solver='qr')
+
+
+def test_spd_solve_falls_back_when_indefinite():
+    G = torch.tensor([[1.0, 2.0], [2.0, 1.0]], dtype=torch.float64)  # không xác định dương
+    B = torch.tensor([[1.0], [0.0]], dtype=torch.float64)
+    torch.testing.assert_close(spd_solve(G, B), torch.linalg.solve(G, B))
+
+
+@pytest.mark.parametrize("solver, reg", [("primal", 0.1), ("dual", 0.1), ("lstsq", 0.0), ("pinv", 0.0)])
+def test_train_model_forced_solver(solver, reg):
+    base = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Omega')
+    forced = train_model(20, 10, 5, 300, 0.01, reg, 0, 'Omega', updater_kwargs={'solver': solver})
+    for i in (0, 1, 3):
+        assert forced[i] == pytest.approx(base[i], rel=1e-4)
+
+
+@pytest.mark.parametrize("window", [5, 20])
+def test_train_model_batched_omega(window):
+    lrs, regs, seeds = [0.01] * 4, [0.0, 0.1, 0.0, 1e-3], [0, 1, 2, 3]
+    batched = train_model_batched(20, 10, window, 300, lrs, regs, seeds, 'Omega')
+    for row, lr, reg, seed in zip(batched, lrs, regs, seeds):
+        single = train_model(20, 10, window, 300, lr, reg, seed, 'Omega')
+        for i in (0, 1, 3):
+            assert row[i] == pytest.approx(single[i], rel=1e-4)